@@ -6,18 +6,43 @@
 import os
 import uuid
 import json
-import base64
+import hashlib
+import queue
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from celery import Celery
+from celery import Celery, chain, group
+from celery.exceptions import Ignore
 import redis
 from supabase import create_client, Client
-import requests
 from werkzeug.utils import secure_filename
 
+from services.http_transport import HTTPTransport, get_transport, get_transport_stats
+from services.ai_service import (
+    AIGenerationResult, DashScopeAIService,
+    SKETCH_TO_IMAGE_MODEL, SKETCH_TO_IMAGE_SIZE, IMAGE_TO_VIDEO_MODEL
+)
+from services.generation_cache import GenerationCache, derive_seed, generation_cache_key, sketch_digest
+from services.single_flight import SingleFlight
+from services.creation_store import CreationTaskStore
+from services.progress_events import ProgressEventHub, TERMINAL_STATUSES
+from services.io_overlap import IOTimeline, TimingStats
+from services.checkpoints import StageCheckpoints
+from services.brush_ledger import BrushLedger
+from services.pagination import InvalidCursorError, encode_cursor, keyset_params
+from services.task_poller import DashScopeTaskPoller, PollEntry
+from services.resilience import CircuitBreaker, get_circuit_breaker, get_hedged_caller
+from services.payload_encoding import Base64JSONBody
+from services.rate_limiter import (
+    DistributedRateLimiter, IMAGE_SYNTHESIS, IMAGE_TO_VIDEO, TASK_POLLING, get_rate_limiter
+)
+from services.sketch_normalizer import NormalizationStats, NormalizeConfig, normalize_sketch
+from services.sketch_storage import (
+    SketchStream, SketchUploadError, StorageConfig, create_sketch_storage, iter_multipart_file
+)
+
 # 配置
 class Config:
     # Supabase配置
@@ -27,7 +52,7 @@ class Config:
     
     # 阿里云百炼API配置
     DASHSCOPE_API_KEY = "sk-070725ebe68c4c9d9cbb9392f23fbbe5"
-    DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/api/v1"
+    DASHSCOPE_BASE_URL = os.getenv('DASHSCOPE_BASE_URL', "https://dashscope.aliyuncs.com/api/v1")
     
     # Redis配置
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -35,6 +60,46 @@ class Config:
     # Celery配置
     CELERY_BROKER_URL = REDIS_URL
     CELERY_RESULT_BACKEND = REDIS_URL
+    
+    # 百炼异步任务轮询周期（秒）
+    DASHSCOPE_POLL_TICK = float(os.getenv('DASHSCOPE_POLL_TICK', 2))
+    
+    # 创作流水线各阶段队列（worker并发在各队列的启动参数中配置）
+    CREATION_IO_QUEUE = os.getenv('CREATION_IO_QUEUE', 'creation_io')
+    CREATION_IMAGE_QUEUE = os.getenv('CREATION_IMAGE_QUEUE', 'creation_image')
+    CREATION_VIDEO_QUEUE = os.getenv('CREATION_VIDEO_QUEUE', 'creation_video')
+    DASHSCOPE_POLL_QUEUE = os.getenv('DASHSCOPE_POLL_QUEUE', 'dashscope_poll')
+    
+    # 草图在阶段之间暂存于Redis的时长（秒）
+    SKETCH_STAGING_TTL = int(os.getenv('SKETCH_STAGING_TTL', 3600))
+    
+    # 上传草图内容哈希的保留时长（秒），需覆盖上传到发起创作的间隔
+    SKETCH_META_TTL = int(os.getenv('SKETCH_META_TTL', 7 * 24 * 3600))
+    
+    # 同一用户重复提交相同创作请求的合并窗口（秒）
+    START_DEDUPE_TTL = int(os.getenv('START_DEDUPE_TTL', 60))
+    
+    # 中间进度批量落库周期（秒）
+    PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 5))
+    
+    # 画笔账本：增量批量落库周期（秒）/ 余额镜像过期时间 / 预留最长保留时间（秒）
+    BRUSH_FLUSH_INTERVAL = float(os.getenv('BRUSH_FLUSH_INTERVAL', 10))
+    BRUSH_BALANCE_TTL = int(os.getenv('BRUSH_BALANCE_TTL', 86400))
+    BRUSH_RESERVATION_TTL = int(os.getenv('BRUSH_RESERVATION_TTL', 86400))
+    
+    # 任务状态投影过期时间（秒）：进行中 / 已完成或失败
+    CREATION_STATUS_TTL = int(os.getenv('CREATION_STATUS_TTL', 3600))
+    CREATION_STATUS_TERMINAL_TTL = int(os.getenv('CREATION_STATUS_TERMINAL_TTL', 86400))
+    
+    # 批量创作：单批最多任务数 / 批次任务列表保留时间（秒）
+    CREATION_BATCH_MAX = int(os.getenv('CREATION_BATCH_MAX', 100))
+    CREATION_BATCH_TTL = int(os.getenv('CREATION_BATCH_TTL', 7 * 24 * 3600))
+    
+    # 流水线阶段检查点保留时间（秒），在此期间失败的任务可以从中断的阶段继续
+    CREATION_CHECKPOINT_TTL = int(os.getenv('CREATION_CHECKPOINT_TTL', 7 * 24 * 3600))
+    
+    # SSE心跳间隔（秒）
+    SSE_KEEPALIVE_INTERVAL = float(os.getenv('SSE_KEEPALIVE_INTERVAL', 15))
 
 # 初始化Flask应用
 app = Flask(__name__)
@@ -46,40 +111,122 @@ supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KE
 
 # 初始化Celery
 celery = Celery(app.name, broker=Config.CELERY_BROKER_URL)
-celery.conf.update(result_backend=Config.CELERY_RESULT_BACKEND)
+celery.conf.update(
+    result_backend=Config.CELERY_RESULT_BACKEND,
+    task_routes={
+        'creation.download_sketch': {'queue': Config.CREATION_IO_QUEUE},
+        'creation.generate_image': {'queue': Config.CREATION_IMAGE_QUEUE},
+        'creation.generate_video': {'queue': Config.CREATION_VIDEO_QUEUE},
+        'creation.finalize': {'queue': Config.CREATION_IO_QUEUE},
+        'creation.flush_progress': {'queue': Config.CREATION_IO_QUEUE},
+        'brush.flush_ledger': {'queue': Config.CREATION_IO_QUEUE},
+        'app.poll_dashscope_tasks': {'queue': Config.DASHSCOPE_POLL_QUEUE}
+    },
+    # 长耗时阶段不预取，避免排队任务被单个worker囤积
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    beat_schedule={
+        'poll-dashscope-tasks': {
+            'task': 'app.poll_dashscope_tasks',
+            'schedule': Config.DASHSCOPE_POLL_TICK,
+            'options': {'expires': Config.DASHSCOPE_POLL_TICK}
+        },
+        'flush-creation-progress': {
+            'task': 'creation.flush_progress',
+            'schedule': Config.PROGRESS_FLUSH_INTERVAL,
+            'options': {'expires': Config.PROGRESS_FLUSH_INTERVAL}
+        },
+        'flush-brush-ledger': {
+            'task': 'brush.flush_ledger',
+            'schedule': Config.BRUSH_FLUSH_INTERVAL,
+            'options': {'expires': Config.BRUSH_FLUSH_INTERVAL}
+        }
+    }
+)
 
 # 初始化Redis
 redis_client = redis.from_url(Config.REDIS_URL)
 
+# 生成结果缓存
+generation_cache = GenerationCache(redis_client)
+
+# 相同生成请求的单飞锁
+creation_flight = SingleFlight(redis_client, namespace='singleflight:creation')
+
+# 创作任务状态存储
+creation_store = CreationTaskStore(
+    supabase,
+    redis_client,
+    status_ttl=Config.CREATION_STATUS_TTL,
+    terminal_status_ttl=Config.CREATION_STATUS_TERMINAL_TTL
+)
+
+# 草图存储（Supabase Storage或本地替身）
+sketch_storage_config = StorageConfig.from_env()
+sketch_storage = create_sketch_storage(sketch_storage_config, Config.SUPABASE_URL, Config.SUPABASE_SERVICE_KEY)
+
+# 草图预处理：缩放到模型工作分辨率并重新编码
+sketch_normalize_config = NormalizeConfig.from_size(SKETCH_TO_IMAGE_SIZE)
+sketch_normalize_stats = NormalizationStats(redis_client)
+
+# 创作进度事件分发（每个Web进程一个订阅连接）
+progress_hub = ProgressEventHub(redis_client)
+
+# 画笔账本：开始创作时预留，完成时确认，增量批量落库
+brush_ledger = BrushLedger(
+    supabase,
+    redis_client,
+    balance_ttl=Config.BRUSH_BALANCE_TTL,
+    reservation_ttl=Config.BRUSH_RESERVATION_TTL
+)
+
+# 流水线各阶段I/O耗时统计
+creation_timing_stats = TimingStats(redis_client)
+
 class DashScopeAPI:
     """阿里云百炼API封装类"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, transport: Optional[HTTPTransport] = None,
+                 rate_limiter: Optional[DistributedRateLimiter] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         self.api_key = api_key
         self.base_url = Config.DASHSCOPE_BASE_URL
         self.headers = {
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json'
         }
+        # 生成类接口以异步方式提交，立即返回百炼任务ID
+        self.async_headers = {**self.headers, 'X-DashScope-Async': 'enable'}
+        self.transport = transport or get_transport()
+        # 与DashScopeAIService共享同一组令牌桶，拿不到令牌时等待而不是被限流后整轮重试
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # 与DashScopeAIService共享熔断状态，百炼降级时阶段任务快速失败进入重试
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker()
     
-    def sketch_to_image(self, sketch_image_base64: str, prompt: str = "", style: str = "anime") -> Dict[str, Any]:
-        """涂鸦作画 - 将手绘草图转换为精美图片"""
+    def sketch_to_image(self, sketch_image: bytes, prompt: str = "", style: str = "anime",
+                        seed: Optional[int] = None) -> Dict[str, Any]:
+        """涂鸦作画 - 将手绘草图转换为精美图片（草图在发送时流式Base64编码）"""
         url = f"{self.base_url}/services/aigc/text2image/image-synthesis"
         
         payload = {
-            "model": "wanx-sketch-to-image-lite",
+            "model": SKETCH_TO_IMAGE_MODEL,
             "input": {
-                "sketch_image": sketch_image_base64,
                 "prompt": prompt,
                 "style": style
             },
             "parameters": {
-                "size": "1024*1024",
+                "size": SKETCH_TO_IMAGE_SIZE,
                 "n": 1
             }
         }
+        if seed is not None:
+            payload["parameters"]["seed"] = seed
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        body = Base64JSONBody(payload, ('input', 'sketch_image'), sketch_image)
+        self.rate_limiter.acquire(IMAGE_SYNTHESIS)
+        response = self.circuit_breaker.call(
+            IMAGE_SYNTHESIS, lambda: self.transport.post(url, headers=self.async_headers, data=body)
+        )
         return response.json()
     
     def image_to_video(self, image_url: str, duration: int = 10) -> Dict[str, Any]:
@@ -87,7 +234,7 @@ class DashScopeAPI:
         url = f"{self.base_url}/services/aigc/image2video/generation"
         
         payload = {
-            "model": "wanx2.1-i2v-turbo",
+            "model": IMAGE_TO_VIDEO_MODEL,
             "input": {
                 "image_url": image_url
             },
@@ -97,108 +244,469 @@ class DashScopeAPI:
             }
         }
         
-        response = requests.post(url, headers=self.headers, json=payload)
+        self.rate_limiter.acquire(IMAGE_TO_VIDEO)
+        response = self.circuit_breaker.call(
+            IMAGE_TO_VIDEO, lambda: self.transport.post(url, headers=self.async_headers, json=payload)
+        )
         return response.json()
     
     def get_task_status(self, task_id: str) -> Dict[str, Any]:
         """获取任务状态"""
         url = f"{self.base_url}/tasks/{task_id}"
-        response = requests.get(url, headers=self.headers)
+        self.rate_limiter.acquire(TASK_POLLING)
+        response = self.circuit_breaker.call(
+            TASK_POLLING, lambda: self.transport.get(url, headers=self.headers, read_timeout=10)
+        )
         return response.json()
 
 # 初始化DashScope API
 dashscope_api = DashScopeAPI(Config.DASHSCOPE_API_KEY)
 
-@celery.task(bind=True)
-def process_creation_task(self, task_id: str):
-    """异步处理创作任务"""
+def _dashscope_task_state(result: Dict[str, Any]) -> str:
+    """解析百炼提交接口返回的任务状态"""
+    return result.get('output', {}).get('task_status', 'UNKNOWN')
+
+def _mark_task_failed(task_id: str, error_message: str):
+    """更新任务最终失败状态，并写入最终失败标记供用户重新发起"""
+    creation_store.mark_failed(task_id, error_message)
+    creation_checkpoints.mark_failed(task_id)
+
+def _progress_reporter(stage, task_id: str, progress: int, step: str) -> Callable[[], None]:
+    """
+    记录当前阶段的Celery任务ID和进度，供状态查询使用；数据库中的进度批量写回
+    
+    Celery的请求上下文是线程局部的，这里先取出任务ID，返回的调用可以在I/O线程中执行。
+    """
+    request_id = stage.request.id
+    
+    def report():
+        redis_client.set(f"task:{task_id}", request_id, ex=3600)
+        stage.update_state(task_id=request_id, state='PROGRESS', meta={'progress': progress, 'step': step})
+        creation_store.buffer_progress(task_id, progress, step)
+    return report
+
+def _record_timeline(ctx: Dict[str, Any], stage_name: str, timeline: IOTimeline):
+    """把阶段耗时明细写入上下文并累计到共享统计"""
+    breakdown = timeline.breakdown()
+    ctx.setdefault('timings', {})[stage_name] = breakdown
+    try:
+        creation_timing_stats.record(stage_name, breakdown)
+    except redis.exceptions.RedisError:
+        pass
+
+def _park_stage(ctx: Dict[str, Any], kind: str, next_stage: str, dashscope_task_id: str):
+    """
+    把等待百炼结果的阶段交给轮询器
+    
+    当前阶段以Ignore结束，链上后续阶段不会执行；轮询器拿到结果后
+    从 next_stage 开始重新构建流水线。
+    """
+    task_poller.track(dashscope_task_id, kind, {'ctx': ctx, 'next_stage': next_stage})
+    raise Ignore()
+
+def _checkpoint(ctx: Dict[str, Any], stage_name: str):
+    """保存阶段检查点；写入失败只影响重试能否跳过该阶段，不影响本次结果"""
+    try:
+        creation_checkpoints.save(ctx['task_id'], stage_name, ctx)
+    except redis.exceptions.RedisError as e:
+        app.logger.warning(f"保存检查点失败 {ctx['task_id']}/{stage_name}: {e}")
+
+def _submit_once(task_id: str, kind: str, owner: str, submit: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    以 (任务, 阶段) 为幂等键提交百炼任务
+    
+    提交前先原子地认领提交权：之前已提交过的阶段（重试、消息重投）不重复提交，
+    返回原任务的进行中状态，由调用方交给轮询器等待原任务的结果；
+    另一条流水线正在提交同一阶段时以Ignore结束当前流水线，由对方继续。
+    
+    Args:
+        task_id: 创作任务ID
+        kind: 阶段名 image / video
+        owner: 认领者ID（当前阶段的Celery任务ID，重试与消息重投时不变）
+        submit: 提交百炼任务的调用
+    
+    Returns:
+        Dict[str, Any]: 百炼提交接口的响应
+    """
+    claimed, submitted = creation_checkpoints.claim_submission(task_id, kind, owner)
+    if not claimed:
+        if submitted:
+            return {'output': {'task_id': submitted, 'task_status': 'PENDING'}}
+        raise Ignore()
+    
+    try:
+        result = submit()
+    except Exception:
+        # 提交失败时放弃认领，重试时重新认领并提交
+        creation_checkpoints.clear_submission(task_id, kind)
+        raise
+    if _dashscope_task_state(result) in ('PENDING', 'RUNNING'):
+        creation_checkpoints.record_submission(task_id, kind, result['output']['task_id'])
+    else:
+        creation_checkpoints.clear_submission(task_id, kind)
+    return result
+
+def _sketch_meta_key(path: str) -> str:
+    """上传时计算的草图内容哈希"""
+    return f"sketch:meta:{path}"
+
+def _sketch_key(task_id: str) -> str:
+    return f"creation:sketch:{task_id}"
+
+def _record_generated_image(ctx: Dict[str, Any], image_url: str):
+    """记录生成的图片，写入生成结果缓存并唤醒等待同一结果的跟随者"""
+    ctx['generated_image_url'] = image_url
+    generation_cache.set(ctx['image_cache_key'], {
+        'image_url': image_url,
+        'created_at': datetime.utcnow().isoformat()
+    })
+    
+    _checkpoint(ctx, 'image')
+    
+    for waiter in creation_flight.complete(ctx['image_cache_key'], {'image_url': image_url}):
+        follower_ctx = waiter['ctx']
+        follower_ctx['generated_image_url'] = image_url
+        _checkpoint(follower_ctx, 'image')
+        build_creation_pipeline(follower_ctx, 'video').apply_async()
+
+def _fail_image_flight(ctx: Dict[str, Any], error_message: str):
+    """领导者最终失败时释放单飞锁（错误不缓存，后续请求重新生成），并把失败同步给已挂起的跟随者"""
+    if not ctx.get('image_cache_key'):
+        return
+    for waiter in creation_flight.fail(ctx['image_cache_key'], error_message):
+        _mark_task_failed(waiter['ctx']['task_id'], error_message)
+        brush_ledger.release(waiter['ctx']['task_id'])
+
+def _handle_stage_failure(stage, task_id: str, error_message: str) -> bool:
+    """
+    阶段异常处理：重试次数用尽时标记最终失败并退回预留的画笔；
+    否则只推送非终态的重试中事件，SSE连接不会因稍后会自动重试的错误而关闭
+    
+    Returns:
+        bool: 是否为最终失败
+    """
+    if stage.request.retries >= 3:
+        _mark_task_failed(task_id, error_message)
+        brush_ledger.release(task_id)
+        return True
+    creation_store.mark_retrying(task_id, error_message, stage.request.retries + 1)
+    return False
+
+@celery.task(bind=True, name='creation.download_sketch')
+def download_sketch_stage(self, task_id: str) -> Dict[str, Any]:
+    """阶段1: 标记处理中并下载草图"""
+    ctx = {'task_id': task_id}
     try:
-        # 更新任务状态为处理中
-        supabase.table('creation_tasks').update({
-            'status': 'processing',
-            'progress': 10
-        }).eq('id', task_id).execute()
-        
-        # 获取任务详情
-        task_result = supabase.table('creation_tasks').select('*').eq('id', task_id).execute()
-        if not task_result.data:
-            raise Exception("任务不存在")
-        
-        task = task_result.data[0]
-        
-        # 步骤1: 涂鸦作画
-        self.update_state(state='PROGRESS', meta={'progress': 30, 'step': '正在生成图片...'})
-        
-        # 从Supabase Storage获取草图
-        sketch_response = supabase.storage.from_('sketches').download(task['sketch_image_url'])
-        sketch_base64 = base64.b64encode(sketch_response).decode('utf-8')
-        
-        # 调用涂鸦作画API
-        image_result = dashscope_api.sketch_to_image(
-            sketch_base64, 
-            task.get('voice_description', ''), 
-            task.get('style_preference', 'anime')
+        # 消息重投或从检查点恢复时，草图仍在暂存中则跳过下载
+        saved = creation_checkpoints.completed(task_id, 'download')
+        if saved is not None and redis_client.exists(_sketch_key(task_id)):
+            return saved
+        
+        timeline = IOTimeline()
+        request_id = self.request.id
+        
+        def track():
+            redis_client.set(f"task:{task_id}", request_id, ex=3600)
+            self.update_state(task_id=request_id, state='PROGRESS', meta={'progress': 10, 'step': '正在读取草图...'})
+        
+        def sketch_reads(path: str) -> Dict[str, Callable[[], Any]]:
+            # 草图内容与上传时计算的哈希（经上传接口写入的草图已在服务端算过）
+            return {
+                'sketch_read': lambda: sketch_storage.read(path),
+                'sketch_meta': lambda: redis_client.get(_sketch_meta_key(path))
+            }
+        
+        # 创建任务时已写入状态投影，草图路径可以先于数据库更新拿到，
+        # 标记处理中与下载草图同时进行；投影过期时退回先取任务详情
+        sketch_path = creation_store.cached_field(task_id, 'sketch_image_url')
+        calls = {'claim': lambda: creation_store.claim(task_id), 'track': track}
+        if sketch_path:
+            calls.update(sketch_reads(sketch_path))
+        io = timeline.run(**calls)
+        task = io['claim']
+        if not sketch_path:
+            io.update(timeline.run(**sketch_reads(task['sketch_image_url'])))
+        sketch_response = io['sketch_read']
+        
+        # 预处理后暂存到Redis供生成阶段读取
+        with timeline.span('normalize'):
+            normalized = normalize_sketch(sketch_response, sketch_normalize_config)
+        timeline.run(
+            stage_sketch=lambda: redis_client.set(_sketch_key(task_id), normalized.data, ex=Config.SKETCH_STAGING_TTL),
+            normalize_stats=lambda: sketch_normalize_stats.record(normalized)
         )
         
-        if image_result.get('output', {}).get('task_status') != 'SUCCEEDED':
-            raise Exception(f"图片生成失败: {image_result}")
+        sketch_sha256 = io['sketch_meta']
+        ctx.update({
+            'sketch_sha256': sketch_sha256.decode() if sketch_sha256 else sketch_digest(sketch_response),
+            'user_id': task['user_id'],
+            'voice_description': task.get('voice_description') or '',
+            'style_preference': task.get('style_preference') or 'anime',
+            'process_duration': task.get('process_duration') or 10,
+            'brush_consumed': task.get('brush_consumed') or 1,
+            'sketch_normalization': normalized.to_dict()
+        })
+        _record_timeline(ctx, 'download', timeline)
+        _checkpoint(ctx, 'download')
+        return ctx
         
-        generated_image_url = image_result['output']['results'][0]['url']
+    except Exception as e:
+        _handle_stage_failure(self, task_id, str(e))
+        raise self.retry(exc=e, countdown=60, max_retries=3)
+
+@celery.task(bind=True, name='creation.generate_image')
+def generate_image_stage(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """阶段2: 涂鸦作画"""
+    task_id = ctx['task_id']
+    try:
+        saved = creation_checkpoints.completed(task_id, 'image')
+        if saved is not None:
+            return saved
         
-        # 更新进度
-        self.update_state(state='PROGRESS', meta={'progress': 60, 'step': '图片生成完成，正在生成视频...'})
+        timeline = IOTimeline()
         
-        # 步骤2: 图生视频
-        video_result = dashscope_api.image_to_video(
-            generated_image_url, 
-            task.get('process_duration', 10)
+        # 相同草图、描述、风格和模型的结果直接复用；缓存查询与进度上报同时进行
+        cache_key = generation_cache_key(
+            ctx['sketch_sha256'], ctx['voice_description'], ctx['style_preference'],
+            SKETCH_TO_IMAGE_MODEL, {'size': SKETCH_TO_IMAGE_SIZE}
         )
+        cached = timeline.run(
+            progress=_progress_reporter(self, task_id, 30, '正在生成图片...'),
+            cache=lambda: generation_cache.get(cache_key)
+        )['cache']
+        if cached:
+            ctx['generated_image_url'] = cached['image_url']
+            ctx['image_cache_hit'] = True
+            _record_timeline(ctx, 'image', timeline)
+            _checkpoint(ctx, 'image')
+            return ctx
+        ctx['image_cache_key'] = cache_key
         
-        if video_result.get('output', {}).get('task_status') != 'SUCCEEDED':
-            raise Exception(f"视频生成失败: {video_result}")
+        # 相同生成正在进行时挂到领导者上等待结果，不重复提交百炼任务
+        role, payload = creation_flight.join(cache_key, member=task_id, waiter={'ctx': ctx})
+        if role == SingleFlight.RESULT:
+            ctx['generated_image_url'] = payload['image_url']
+            _checkpoint(ctx, 'image')
+            return ctx
+        if role == SingleFlight.FOLLOWER:
+            # 领导者完成时续作；领导者失去租约时由轮询周期任务重新派发
+            raise Ignore()
         
-        generated_video_url = video_result['output']['results'][0]['url']
+        sketch_bytes = redis_client.get(_sketch_key(task_id))
+        if sketch_bytes is None:
+            raise Exception("草图暂存已过期")
         
-        # 更新任务完成状态
-        supabase.table('creation_tasks').update({
-            'status': 'completed',
-            'progress': 100,
-            'generated_image_url': generated_image_url,
-            'generated_video_url': generated_video_url,
-            'completed_at': datetime.utcnow().isoformat()
-        }).eq('id', task_id).execute()
+        # 调用涂鸦作画API，种子由缓存键派生，保证缓存结果可复用；已提交过的不再重复提交
+        with timeline.span('submit_image'):
+            image_result = _submit_once(task_id, 'image', self.request.id, lambda: dashscope_api.sketch_to_image(
+                sketch_bytes, 
+                ctx['voice_description'], 
+                ctx['style_preference'],
+                seed=derive_seed(cache_key)
+            ))
+        _record_timeline(ctx, 'image', timeline)
         
-        # 记录创作步骤
+        image_state = _dashscope_task_state(image_result)
+        if image_state in ('PENDING', 'RUNNING'):
+            # 交给轮询器等待结果，释放当前worker
+            _park_stage(ctx, 'image', 'video', image_result['output']['task_id'])
+        
+        if image_state != 'SUCCEEDED':
+            raise Exception(f"图片生成失败: {image_result}")
+        
+        _record_generated_image(ctx, image_result['output']['results'][0]['url'])
+        return ctx
+        
+    except Ignore:
+        raise
+    except Exception as e:
+        if _handle_stage_failure(self, task_id, str(e)):
+            _fail_image_flight(ctx, str(e))
+        raise self.retry(exc=e, countdown=60, max_retries=3)
+
+@celery.task(bind=True, name='creation.generate_video')
+def generate_video_stage(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """阶段3: 图生视频"""
+    task_id = ctx['task_id']
+    try:
+        saved = creation_checkpoints.completed(task_id, 'video')
+        if saved is not None:
+            return saved
+        
+        # 进度上报不影响提交，两者同时进行；请求上下文是线程局部的，先取出任务ID
+        timeline = IOTimeline()
+        owner = self.request.id
+        video_result = timeline.run(
+            progress=_progress_reporter(self, task_id, 60, '图片生成完成，正在生成视频...'),
+            submit_video=lambda: _submit_once(task_id, 'video', owner, lambda: dashscope_api.image_to_video(
+                ctx['generated_image_url'], 
+                ctx['process_duration']
+            ))
+        )['submit_video']
+        _record_timeline(ctx, 'video', timeline)
+        
+        video_state = _dashscope_task_state(video_result)
+        if video_state in ('PENDING', 'RUNNING'):
+            _park_stage(ctx, 'video', 'finalize', video_result['output']['task_id'])
+        
+        if video_state != 'SUCCEEDED':
+            raise Exception(f"视频生成失败: {video_result}")
+        
+        output = video_result['output']
+        ctx['generated_video_url'] = output.get('video_url') or output['results'][0]['url']
+        _checkpoint(ctx, 'video')
+        return ctx
+        
+    except Ignore:
+        raise
+    except Exception as e:
+        _handle_stage_failure(self, task_id, str(e))
+        raise self.retry(exc=e, countdown=60, max_retries=3)
+
+@celery.task(bind=True, name='creation.finalize')
+def finalize_stage(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """阶段4: 在一个事务中写入完成状态和创作步骤，并确认扣除画笔"""
+    task_id = ctx['task_id']
+    try:
         steps = [
-            {'task_id': task_id, 'step_type': 'ai_generation', 'step_name': '图片生成完成'},
-            {'task_id': task_id, 'step_type': 'video_generation', 'step_name': '视频生成完成'}
+            {'step_type': 'ai_generation', 'step_name': '图片生成完成'},
+            {'step_type': 'video_generation', 'step_name': '视频生成完成'}
         ]
-        supabase.table('creation_steps').insert(steps).execute()
-        
-        # 扣除用户画笔
-        user_id = task['user_id']
-        supabase.rpc('consume_user_brush', {'user_id': user_id, 'count': task.get('brush_consumed', 1)}).execute()
+        # 开始时预留过画笔的任务由账本确认扣除、批量落库；
+        # 没有预留的任务（账本不可用时放行的）仍在完成事务中直接扣除
+        timeline = IOTimeline()
+        io = timeline.run(
+            reserved=lambda: brush_ledger.has_reservation(task_id),
+            drop_sketch=lambda: redis_client.delete(_sketch_key(task_id))
+        )
+        with timeline.span('finalize'):
+            creation_store.finalize(
+                task_id,
+                ctx['generated_image_url'],
+                ctx['generated_video_url'],
+                steps,
+                0 if io['reserved'] else ctx['brush_consumed']
+            )
+        if io['reserved']:
+            with timeline.span('commit_brush'):
+                brush_ledger.commit(task_id)
+        _record_timeline(ctx, 'finalize', timeline)
+        creation_checkpoints.clear(task_id)
         
         return {
             'status': 'completed',
-            'generated_image_url': generated_image_url,
-            'generated_video_url': generated_video_url
+            'generated_image_url': ctx['generated_image_url'],
+            'generated_video_url': ctx['generated_video_url'],
+            'timings': ctx['timings']
         }
         
     except Exception as e:
-        # 更新任务失败状态
-        supabase.table('creation_tasks').update({
-            'status': 'failed',
-            'error_message': str(e)
-        }).eq('id', task_id).execute()
-        
+        _handle_stage_failure(self, task_id, str(e))
         raise self.retry(exc=e, countdown=60, max_retries=3)
 
+@celery.task(name='brush.flush_ledger', ignore_result=True)
+def flush_brush_ledger():
+    """周期任务：把确认扣除的画笔批量写回数据库并校准余额镜像"""
+    return brush_ledger.flush()
+
+@celery.task(name='creation.flush_progress', ignore_result=True)
+def flush_creation_progress():
+    """周期任务：把缓冲的中间进度批量写入数据库"""
+    return creation_store.flush_progress()
+
+# 流水线阶段顺序
+CREATION_STAGES = {
+    'download': download_sketch_stage,
+    'image': generate_image_stage,
+    'video': generate_video_stage,
+    'finalize': finalize_stage
+}
+
+def build_creation_pipeline(first_arg: Any, start_stage: str = 'download'):
+    """
+    构建从 start_stage 开始的创作流水线
+    
+    Args:
+        first_arg: 首个阶段的参数（download阶段为task_id，其余阶段为上下文）
+        start_stage: 起始阶段名
+    
+    Returns:
+        celery.chain: 阶段链
+    """
+    names = list(CREATION_STAGES)
+    stages = [CREATION_STAGES[name] for name in names[names.index(start_stage):]]
+    return chain(stages[0].s(first_arg), *[stage.s() for stage in stages[1:]])
+
+# 阶段检查点：重试和重新发起时从第一个未完成的阶段继续
+creation_checkpoints = StageCheckpoints(redis_client, list(CREATION_STAGES), ttl=Config.CREATION_CHECKPOINT_TTL)
+
+def _on_dashscope_task_done(entry: PollEntry, result: AIGenerationResult):
+    """轮询器回调：把百炼任务结果交回创作流水线"""
+    ctx = entry.callback['ctx']
+    task_id = ctx['task_id']
+    
+    if not result.success:
+        error_message = f"{'图片' if entry.kind == 'image' else '视频'}生成失败: {result.error_message}"
+        _mark_task_failed(task_id, error_message)
+        # 百炼任务已失败，清除提交记录，重试时重新提交；退回预留的画笔
+        creation_checkpoints.clear_submission(task_id, entry.kind)
+        brush_ledger.release(task_id)
+        if entry.kind == 'image':
+            _fail_image_flight(ctx, error_message)
+        return
+    
+    if entry.kind == 'image':
+        _record_generated_image(ctx, result.image_url)
+    else:
+        ctx['generated_video_url'] = result.video_url
+        _checkpoint(ctx, 'video')
+    
+    build_creation_pipeline(ctx, entry.callback['next_stage']).apply_async()
+
+# 百炼异步任务轮询器
+task_poller = DashScopeTaskPoller(
+    redis_client,
+    fetch_status=DashScopeAIService(Config.DASHSCOPE_API_KEY, base_url=Config.DASHSCOPE_BASE_URL).get_task_status,
+    on_complete=_on_dashscope_task_done
+)
+
+def _resume_orphaned_followers():
+    """重新派发领导者已失去租约的跟随者，第一个重新加入的成为新的领导者"""
+    for waiter in creation_flight.reclaim_orphans():
+        build_creation_pipeline(waiter['ctx'], 'image').apply_async()
+
+@celery.task(name='app.poll_dashscope_tasks', ignore_result=True)
+def poll_dashscope_tasks():
+    """周期任务：重新派发挂起的孤儿跟随者，并批量轮询进行中的百炼任务"""
+    _resume_orphaned_followers()
+    return task_poller.run(max_seconds=Config.DASHSCOPE_POLL_TICK)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
     return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus指标"""
+    sections = {
+        'huatuer_dashscope_http': get_transport_stats(),
+        'huatuer_generation_cache': generation_cache.stats(),
+        'huatuer_sketch_normalize': sketch_normalize_stats.stats(),
+        'huatuer_creation_io': creation_timing_stats.stats(),
+        'huatuer_brush_ledger': brush_ledger.stats(),
+        'huatuer_dashscope_ratelimit': get_rate_limiter().stats(),
+        'huatuer_dashscope_circuit': get_circuit_breaker().stats(),
+        'huatuer_dashscope_hedge': get_hedged_caller().stats(),
+        'huatuer_progress_stream': {'subscribers': progress_hub.subscriber_count()}
+    }
+    lines = [
+        f"{prefix}_{name} {value}"
+        for prefix, stats in sections.items()
+        for name, value in stats.items()
+    ]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/auth/profile', methods=['GET'])
 def get_user_profile():
     """获取用户资料"""
@@ -222,6 +730,47 @@ def get_user_profile():
     except Exception as e:
         return jsonify({'error': str(e)}), 401
 
+@app.route('/api/upload', methods=['POST'])
+def upload_sketch():
+    """
+    流式上传草图
+    
+    请求体为multipart/form-data，草图放在file字段；边读边校验大小和图片类型并直接写入存储。
+    返回的path作为创建任务时的sketch_image_url。
+    """
+    user_id = request.args.get('user_id')
+    if not user_id:
+        return jsonify({'error': '缺少user_id'}), 400
+    
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        return jsonify({'error': '请使用multipart/form-data上传'}), 400
+    
+    # 声明了长度的请求在读取前直接拒绝（留出multipart头部的余量）
+    if request.content_length and request.content_length > sketch_storage_config.max_bytes + 64 * 1024:
+        return jsonify({'error': '草图超过大小上限'}), 413
+    
+    try:
+        chunks = iter_multipart_file(
+            request.stream, boundary.encode('latin-1'), chunk_size=sketch_storage_config.chunk_size
+        )
+        sketch = SketchStream(chunks, sketch_storage_config.max_bytes)
+        path = f"{secure_filename(user_id)}/{uuid.uuid4().hex}.{sketch.extension}"
+        sketch_storage.save(path, sketch, sketch.content_type)
+    except SketchUploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    redis_client.set(_sketch_meta_key(path), sketch.sha256, ex=Config.SKETCH_META_TTL)
+    
+    return jsonify({
+        'path': path,
+        'sha256': sketch.sha256,
+        'size': sketch.size,
+        'content_type': sketch.content_type
+    })
+
 @app.route('/api/creation/start', methods=['POST'])
 def start_creation():
     """开始创作任务"""
@@ -234,18 +783,51 @@ def start_creation():
             'user_id': data['user_id'],
             'title': data.get('title', ''),
             'description': data.get('description', ''),
+            'sketch_image_url': data.get('sketch_image_url'),
             'voice_description': data.get('voice_description', ''),
             'style_preference': data.get('style_preference', 'anime'),
             'process_duration': data.get('process_duration', 10),
             'status': 'pending'
         }
         
+        # 同一用户重复提交（如连点）时挂到进行中的任务上；经上传接口的草图按内容判重
+        sketch_identity = None
+        if task_data['sketch_image_url']:
+            sketch_identity = redis_client.get(_sketch_meta_key(task_data['sketch_image_url']))
+        sketch_identity = sketch_identity.decode() if sketch_identity else task_data['sketch_image_url']
+        dedupe_key = 'creation:start:' + hashlib.sha256(json.dumps([
+            task_data['user_id'], sketch_identity, task_data['voice_description'],
+            task_data['style_preference'], task_data['process_duration']
+        ], ensure_ascii=False).encode('utf-8')).hexdigest()
+        
+        if not redis_client.set(dedupe_key, task_data['id'], nx=True, ex=Config.START_DEDUPE_TTL):
+            existing_task_id = redis_client.get(dedupe_key)
+            if existing_task_id:
+                existing_task_id = existing_task_id.decode()
+                celery_task_id = redis_client.get(f"task:{existing_task_id}")
+                return jsonify({
+                    'task_id': existing_task_id,
+                    'celery_task_id': celery_task_id.decode() if celery_task_id else None,
+                    'status': 'attached'
+                })
+        
+        # 在Redis中预留画笔，余额不足的用户不占用生成资源
+        if not brush_ledger.reserve(task_data['user_id'], [task_data['id']]):
+            redis_client.delete(dedupe_key)
+            return jsonify({'error': '画笔不足'}), 402
+        
         # 插入任务记录
-        result = supabase.table('creation_tasks').insert(task_data).execute()
+        try:
+            result = supabase.table('creation_tasks').insert(task_data).execute()
+        except Exception:
+            redis_client.delete(dedupe_key)
+            brush_ledger.release(task_data['id'])
+            raise
         task_id = result.data[0]['id']
+        creation_store.cache_task(result.data[0])
         
-        # 启动异步处理任务
-        celery_task = process_creation_task.delay(task_id)
+        # 启动创作流水线
+        celery_task = build_creation_pipeline(task_id).apply_async()
         
         # 存储Celery任务ID
         redis_client.set(f"task:{task_id}", celery_task.id, ex=3600)
@@ -259,54 +841,290 @@ def start_creation():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _batch_key(batch_id: str) -> str:
+    return f"creation:batch:{batch_id}"
+
+@app.route('/api/creation/batch', methods=['POST'])
+def start_creation_batch():
+    """批量开始创作任务：一次批量插入、一次Redis pipeline、一个Celery group"""
+    try:
+        data = request.get_json() or {}
+        user_id = data.get('user_id')
+        tasks = data.get('tasks')
+        
+        if not user_id:
+            return jsonify({'error': '缺少user_id'}), 400
+        if not isinstance(tasks, list) or not tasks:
+            return jsonify({'error': 'tasks必须是非空列表'}), 400
+        if len(tasks) > Config.CREATION_BATCH_MAX:
+            return jsonify({'error': f'单批最多{Config.CREATION_BATCH_MAX}个任务'}), 400
+        
+        batch_id = str(uuid.uuid4())
+        rows = []
+        for index, item in enumerate(tasks):
+            if not isinstance(item, dict) or not item.get('sketch_image_url'):
+                return jsonify({'error': f'第{index + 1}个任务缺少sketch_image_url'}), 400
+            rows.append({
+                'id': str(uuid.uuid4()),
+                'user_id': user_id,
+                'batch_id': batch_id,
+                'title': item.get('title', ''),
+                'description': item.get('description', ''),
+                'sketch_image_url': item['sketch_image_url'],
+                'voice_description': item.get('voice_description', ''),
+                'style_preference': item.get('style_preference', 'anime'),
+                'process_duration': item.get('process_duration', 10),
+                'status': 'pending'
+            })
+        
+        # 整批预留画笔，余额不够整批时一个都不开始
+        if not brush_ledger.reserve(user_id, [row['id'] for row in rows]):
+            return jsonify({'error': f'画笔不足，本批需要{len(rows)}个画笔'}), 402
+        
+        # 一次往返插入全部任务，状态投影、Celery任务ID和批次列表在同一个pipeline中写入
+        pipe = redis_client.pipeline(transaction=False)
+        try:
+            inserted = creation_store.insert_tasks(rows, pipe=pipe)
+        except Exception:
+            brush_ledger.release(*[row['id'] for row in rows])
+            raise
+        task_ids = [row['id'] for row in inserted]
+        
+        # 先冻结group拿到各子任务ID，pipeline写完投影后再投递：
+        # 下载阶段开始时投影已存在，认领写入的处理中状态也不会被随后的投影写入覆盖
+        pipelines = group(build_creation_pipeline(task_id) for task_id in task_ids)
+        group_result = pipelines.freeze()
+        for task_id, child in zip(task_ids, group_result.results):
+            pipe.set(f"task:{task_id}", child.id, ex=3600)
+        pipe.rpush(_batch_key(batch_id), *task_ids)
+        pipe.expire(_batch_key(batch_id), Config.CREATION_BATCH_TTL)
+        pipe.execute()
+        
+        try:
+            pipelines.apply_async()
+        except Exception:
+            brush_ledger.release(*task_ids)
+            raise
+        
+        return jsonify({
+            'batch_id': batch_id,
+            'task_ids': task_ids,
+            'celery_group_id': group_result.id,
+            'total': len(task_ids),
+            'status': 'started'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/creation/batch/<batch_id>', methods=['GET'])
+def get_creation_batch_status(batch_id: str):
+    """获取批量创作的汇总进度"""
+    try:
+        task_ids = [task_id.decode() for task_id in redis_client.lrange(_batch_key(batch_id), 0, -1)]
+        if not task_ids:
+            result = supabase.table('creation_tasks').select('id').eq('batch_id', batch_id).execute()
+            task_ids = [row['id'] for row in result.data]
+        
+        if not task_ids:
+            return jsonify({'error': '批次不存在'}), 404
+        
+        counts = {'pending': 0, 'processing': 0, 'retrying': 0, 'completed': 0, 'failed': 0}
+        summaries = []
+        total_progress = 0
+        for task_id, task in zip(task_ids, creation_store.get_statuses(task_ids)):
+            if task is None:
+                continue
+            status = task.get('status', 'pending')
+            progress = 100 if status in TERMINAL_STATUSES else (task.get('progress') or 0)
+            counts[status] = counts.get(status, 0) + 1
+            total_progress += progress
+            summaries.append({
+                'id': task_id,
+                'status': status,
+                'progress': task.get('progress') or 0,
+                'generated_image_url': task.get('generated_image_url'),
+                'error_message': task.get('error_message')
+            })
+        
+        done = sum(counts.get(status, 0) for status in TERMINAL_STATUSES)
+        return jsonify({
+            'batch_id': batch_id,
+            'total': len(summaries),
+            'counts': counts,
+            'progress': round(total_progress / len(summaries)) if summaries else 0,
+            'finished': done == len(summaries),
+            'tasks': summaries
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 从检查点恢复时各阶段的起始进度
+RESUME_PROGRESS = {'image': 30, 'video': 60, 'finalize': 90}
+
+@app.route('/api/creation/retry/<task_id>', methods=['POST'])
+def retry_creation(task_id: str):
+    """重新发起失败的创作任务，从第一个未完成的阶段继续"""
+    try:
+        task = creation_store.get_status(task_id)
+        if task is None:
+            return jsonify({'error': '任务不存在'}), 404
+        if task.get('status') != 'failed':
+            return jsonify({'error': '只有失败的任务可以重试'}), 409
+        # 只有自动重试已用尽的任务可以重新发起；取走标记是原子的，重复请求只有一个能成功
+        if not creation_checkpoints.take_failed(task_id):
+            return jsonify({'error': '任务仍在自动重试中或已重新发起'}), 409
+        
+        try:
+            stage, first_arg = creation_checkpoints.resume_point(task_id)
+            if stage is None:
+                return jsonify({'error': '任务已完成全部阶段'}), 409
+            # 草图暂存已过期时生成阶段无法继续，从下载重新开始
+            if stage == 'image' and not redis_client.exists(_sketch_key(task_id)):
+                stage, first_arg = 'download', task_id
+            
+            # 失败时预留已退回，重新发起需要重新预留
+            if not brush_ledger.reserve(task['user_id'], [task_id], task.get('brush_consumed') or 1):
+                creation_checkpoints.mark_failed(task_id)
+                return jsonify({'error': '画笔不足'}), 402
+            
+            # 下载阶段自己会标记处理中
+            if stage != 'download':
+                creation_store.claim(task_id, RESUME_PROGRESS[stage], '正在从中断处继续...')
+        except Exception:
+            # 没能重新发起时恢复标记，用户可以再次重试
+            creation_checkpoints.mark_failed(task_id)
+            raise
+        
+        celery_task = build_creation_pipeline(first_arg, stage).apply_async()
+        redis_client.set(f"task:{task_id}", celery_task.id, ex=3600)
+        
+        return jsonify({
+            'task_id': task_id,
+            'celery_task_id': celery_task.id,
+            'resumed_from': stage,
+            'status': 'resumed'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/creation/status/<task_id>', methods=['GET'])
 def get_creation_status(task_id: str):
     """获取创作任务状态"""
     try:
-        # 从数据库获取任务状态
-        result = supabase.table('creation_tasks').select('*').eq('id', task_id).execute()
+        # 流水线随进度维护Redis状态投影，未命中时才回源数据库
+        task = creation_store.get_status(task_id)
         
-        if not result.data:
+        if task is None:
             return jsonify({'error': '任务不存在'}), 404
         
-        task = result.data[0]
-        
-        # 如果任务还在处理中，获取Celery任务进度
-        if task['status'] == 'processing':
-            celery_task_id = redis_client.get(f"task:{task_id}")
-            if celery_task_id:
-                celery_task = celery.AsyncResult(celery_task_id.decode())
-                if celery_task.state == 'PROGRESS':
-                    task['progress'] = celery_task.info.get('progress', task['progress'])
-                    task['current_step'] = celery_task.info.get('step', '')
-        
         return jsonify(task)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _sse_message(event: Dict[str, Any], event_type: str = 'progress') -> str:
+    """格式化SSE消息"""
+    return f"event: {event_type}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.route('/api/creation/stream/<task_id>', methods=['GET'])
+def stream_creation_progress(task_id: str):
+    """以Server-Sent Events推送创作任务进度"""
+    # 先订阅再读取快照，避免错过两者之间发布的事件
+    events = progress_hub.subscribe(task_id)
+    
+    try:
+        task = creation_store.get_status(task_id)
+    except Exception as e:
+        progress_hub.unsubscribe(task_id, events)
+        return jsonify({'error': str(e)}), 500
+    
+    if task is None:
+        progress_hub.unsubscribe(task_id, events)
+        return jsonify({'error': '任务不存在'}), 404
+    
+    snapshot = {
+        'task_id': task_id,
+        'status': task['status'],
+        'progress': task.get('progress'),
+        'step': task.get('current_step', ''),
+        'generated_image_url': task.get('generated_image_url'),
+        'generated_video_url': task.get('generated_video_url'),
+        'error_message': task.get('error_message')
+    }
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            yield _sse_message(snapshot, 'snapshot')
+            if snapshot['status'] in TERMINAL_STATUSES:
+                return
+            
+            while True:
+                try:
+                    event = events.get(timeout=Config.SSE_KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    # 心跳，防止代理关闭空闲连接
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                yield _sse_message(event)
+                if event.get('status') in TERMINAL_STATUSES:
+                    return
+        finally:
+            progress_hub.unsubscribe(task_id, events)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+HISTORY_MAX_LIMIT = 100
+
 @app.route('/api/creation/history/<user_id>', methods=['GET'])
 def get_creation_history(user_id: str):
-    """获取用户创作历史"""
+    """
+    获取用户创作历史（游标分页）
+    
+    查询参数:
+        cursor: 上一页返回的next_cursor，为空时取第一页
+        limit: 每页条数，最多100
+        expand: 传steps时附带创作步骤
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 20, type=int)
+        cursor = request.args.get('cursor')
+        limit = max(1, min(request.args.get('limit', 20, type=int), HISTORY_MAX_LIMIT))
+        expand = set(filter(None, request.args.get('expand', '').split(',')))
+        
+        try:
+            after = keyset_params(cursor)
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # 计算偏移量
-        offset = (page - 1) * limit
+        # 键集条件、(created_at, id) 倒序和列表的轻量列都在 creation_history_page 中，
+        # 走 idx_creation_tasks_user_created 索引；多取一行判断是否还有下一页
+        result = supabase.rpc('creation_history_page', {
+            'p_user_id': user_id,
+            **after,
+            'p_limit': limit + 1,
+            'p_include_steps': 'steps' in expand
+        }).execute()
+        if 'steps' not in expand:
+            for row in result.data:
+                row.pop('creation_steps', None)
         
-        # 获取创作历史
-        result = supabase.table('creation_tasks')\
-            .select('*, creation_steps(*)')\
-            .eq('user_id', user_id)\
-            .order('created_at', desc=True)\
-            .range(offset, offset + limit - 1)\
-            .execute()
+        tasks = result.data[:limit]
+        has_more = len(result.data) > limit
+        next_cursor = encode_cursor(tasks[-1]['created_at'], tasks[-1]['id']) if has_more else None
         
         return jsonify({
-            'tasks': result.data,
-            'page': page,
-            'limit': limit
+            'tasks': tasks,
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_more': has_more
         })
         
     except Exception as e:
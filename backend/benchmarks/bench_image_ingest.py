@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 作品图片解码基准测试
+对比先按原图解码再缩小与按分析分辨率解码（JPEG draft模式）的耗时和峰值内存
+
+每次测量在新的Python进程中进行，峰值内存取首次解码时常驻内存峰值（VmHWM）相对解码前的增量，
+需要Linux的/proc；Pillow的解码缓冲区不经过tracemalloc，因此不用tracemalloc统计
+
+运行: python backend/benchmarks/bench_image_ingest.py
+"""
+
+import io
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.image_ingest import analysis_size, decode_image
+
+MAX_SIDE = 1024
+ROUNDS = 5
+SIZES = ((2000, 1500), (4000, 3000), (6000, 4000))
+
+
+def _photo(size, image_format: str) -> bytes:
+    """带噪声的渐变图（照片类上传）"""
+    width, height = size
+    rng = np.random.default_rng(width)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=2)
+    pixels = np.clip(base + rng.normal(0, 10, base.shape).astype(np.float32), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+
+def _full_decode(data: bytes):
+    """原路径：按原图解码、转RGB后再缩小"""
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    return np.asarray(image.resize(analysis_size(image.size, MAX_SIDE), Image.BILINEAR, reducing_gap=2.0))
+
+
+def _target_decode(data: bytes):
+    """当前路径：按分析分辨率解码"""
+    return np.asarray(decode_image(data, MAX_SIDE).image)
+
+
+def _rss_kb(field: str) -> int:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return 0
+
+
+MODES = {
+    'full': _full_decode,
+    'target': _target_decode
+}
+
+
+def _child(mode: str, path: str):
+    """子进程：首次解码测峰值内存，之后多轮测耗时"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    fn = MODES[mode]
+    before = _rss_kb('VmRSS')
+    fn(data)
+    peak = _rss_kb('VmHWM') - before
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(data)
+    print((time.perf_counter() - start) / ROUNDS * 1000, peak / 1024)
+
+
+def _measure(mode: str, path: str):
+    """在新进程中测量，返回 (平均耗时ms, 峰值内存增量MB)"""
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, path],
+                            capture_output=True, text=True, check=True).stdout
+    elapsed, peak = output.split()
+    return float(elapsed), float(peak)
+
+
+def main():
+    print(f"{'格式':<5} | {'尺寸':>10} | {'原图解码':>9} | {'目标分辨率':>9} | {'原图峰值':>8} | {'目标峰值':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for image_format in ('JPEG', 'PNG'):
+            for size in SIZES:
+                path = os.path.join(workdir, f"{size[0]}x{size[1]}.{image_format.lower()}")
+                with open(path, 'wb') as f:
+                    f.write(_photo(size, image_format))
+                full_ms, full_mb = _measure('full', path)
+                target_ms, target_mb = _measure('target', path)
+                print(f"{image_format:<5} | {size[0]:>5}x{size[1]:<4} | {full_ms:>7.1f}ms | {target_ms:>7.1f}ms | "
+                      f"{full_mb:>6.1f}MB | {target_mb:>6.1f}MB")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        _child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 绘画分析基准测试
+对比各分析器各自转换灰度/HSV、各自做边缘检测和主色聚类（原路径）
+与共用同一份DrawingFeatures时的单张作品分析耗时，
+以及按原图分析与按分析分辨率（MENTOR_ANALYSIS_MAX_SIDE）分析的耗时和峰值内存
+
+运行: python backend/benchmarks/bench_mentor_analysis.py
+"""
+
+import io
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+from PIL import Image, ImageDraw
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.ai_mentor_service import AIArtMentorService, DrawingFeatures
+
+SIZES = (512, 1024, 2048, 4096)
+ROUNDS = 5
+
+
+def _drawing(size: int) -> bytes:
+    """生成带线条和色块的测试作品"""
+    rng = random.Random(size)
+    image = Image.new('RGB', (size, size), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size), rng.randrange(size)
+        r = rng.randrange(size // 40, size // 6)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+        else:
+            draw.line((x, y, rng.randrange(size), rng.randrange(size)), fill=(20, 20, 20), width=max(2, size // 200))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _legacy(service: AIArtMentorService, image_data: bytes):
+    """原路径：每个分析器拿到一份新的原图特征，各自重新计算"""
+    image = Image.open(io.BytesIO(image_data))
+    fresh = lambda: DrawingFeatures(image)
+    service._analyze_complexity(fresh())
+    service._analyze_color_harmony(fresh())
+    service._analyze_composition(fresh())
+    service._analyze_stroke_confidence(fresh())
+    service._analyze_style_consistency(fresh())
+    service._extract_dominant_colors(fresh())
+    service._detect_objects(fresh())
+    service._classify_artistic_style(fresh())
+
+
+def _shared(service: AIArtMentorService, image_data: bytes):
+    """analyze_drawing 内共用一份特征（分析分辨率由service决定）"""
+    service.analyze_drawing(image_data)
+
+
+def _peak_mb(service: AIArtMentorService, image_data: bytes) -> float:
+    """单次分析的峰值内存（NumPy与Pillow经tracemalloc统计的分配）"""
+    tracemalloc.start()
+    service.analyze_drawing(image_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def _measure(fn, service, image_data: bytes) -> float:
+    fn(service, image_data)  # 预热
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn(service, image_data)
+    return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    full = AIArtMentorService('sk-benchmark', analysis_max_side=0)
+    tiered = AIArtMentorService('sk-benchmark')
+    print(f"{'尺寸':>6} | {'原路径':>10} | {'共用特征':>10} | {'分析分辨率':>10} | {'原图峰值':>9} | {'分析分辨率峰值':>9}")
+    for size in SIZES:
+        image_data = _drawing(size)
+        legacy = _measure(_legacy, full, image_data)
+        shared = _measure(_shared, full, image_data)
+        reduced = _measure(_shared, tiered, image_data)
+        print(f"{size:>6} | {legacy:>8.1f}ms | {shared:>8.1f}ms | {reduced:>8.1f}ms | "
+              f"{_peak_mb(full, image_data):>7.1f}MB | {_peak_mb(tiered, image_data):>7.1f}MB")
+
+if __name__ == '__main__':
+    main()
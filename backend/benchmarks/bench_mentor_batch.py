@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 绘画批量分析基准测试
+对比逐张调用 analyze_drawing 与不同进程数下 analyze_drawings_batch 的吞吐
+
+运行: python backend/benchmarks/bench_mentor_batch.py [图片数]
+"""
+
+import io
+import os
+import sys
+import time
+import random
+
+from PIL import Image, ImageDraw
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.ai_mentor_service import AIArtMentorService
+
+SIZE = 2048
+
+
+def _drawing(seed: int) -> bytes:
+    """生成带线条和色块的测试作品（JPEG，接近相册中的上传）"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (SIZE, SIZE), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(SIZE), rng.randrange(SIZE)
+        r = rng.randrange(SIZE // 40, SIZE // 6)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    images = [_drawing(seed) for seed in range(count)]
+    service = AIArtMentorService('sk-benchmark')
+    cores = os.cpu_count() or 1
+
+    start = time.perf_counter()
+    for image_data in images:
+        service.analyze_drawing(image_data)
+    serial = time.perf_counter() - start
+    print(f"CPU核数: {cores}, 图片数: {count}, {SIZE}px JPEG")
+    print(f"{'方式':<10} | {'耗时':>8} | {'张/秒':>7} | {'加速':>6}")
+    print(f"{'逐张':<10} | {serial:>7.2f}s | {count / serial:>7.1f} | {1:>5.2f}x")
+
+    workers = 2
+    while True:
+        start = time.perf_counter()
+        for _ in service.analyze_drawings_batch(images, workers=workers):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"{f'{workers}进程':<10} | {elapsed:>7.2f}s | {count / elapsed:>7.1f} | {serial / elapsed:>5.2f}x")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 主色提取基准测试
+对比原先的 np.unique + sklearn KMeans 与NumPy分桶量化的耗时和精度
+
+精度指标：
+- 量化误差：每个像素映射到调色板中最近颜色后的RGB均方根误差，越小越好
+- 调色板距离：两组调色板按最近颜色配对后的平均RGB距离
+
+运行: python backend/benchmarks/bench_palette.py（精度对比需要安装scikit-learn）
+"""
+
+import os
+import sys
+import time
+import random
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.palette import extract_palette
+
+ROUNDS = 10
+NUM_COLORS = 5
+
+
+def _flat_drawing(seed: int) -> Image.Image:
+    """色块与线条（儿童涂色）"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (600, 600), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    palette = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(4)]
+    for _ in range(25):
+        x, y, r = rng.randrange(600), rng.randrange(600), rng.randrange(20, 120)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=rng.choice(palette))
+    for _ in range(10):
+        draw.line((rng.randrange(600), rng.randrange(600), rng.randrange(600), rng.randrange(600)),
+                  fill=(20, 20, 20), width=4)
+    return image
+
+
+def _soft_drawing(seed: int) -> Image.Image:
+    """模糊后的渐变色块（水彩/抗锯齿）"""
+    return _flat_drawing(seed).filter(ImageFilter.GaussianBlur(8))
+
+
+def _noisy_photo(seed: int) -> Image.Image:
+    """平滑渐变加噪声（照片类输入）"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:600, 0:600] / 600.0
+    base = np.stack([x * 255, y * 200 + 30, (1 - x) * 180 + 40], axis=2)
+    noisy = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    return Image.fromarray(noisy)
+
+
+CASES = {
+    '色块线稿': _flat_drawing,
+    '模糊色块': _soft_drawing,
+    '渐变噪声': _noisy_photo
+}
+
+
+def _pixels(image: Image.Image) -> np.ndarray:
+    # 与导师服务一致：缩小到150x150后取RGB像素
+    return np.array(image.resize((150, 150))).reshape(-1, 3)
+
+
+def _kmeans(pixels: np.ndarray):
+    from sklearn.cluster import KMeans
+    kmeans = KMeans(n_clusters=min(NUM_COLORS, len(np.unique(pixels, axis=0))), random_state=42)
+    kmeans.fit(pixels)
+    return [tuple(int(v) for v in color) for color in kmeans.cluster_centers_]
+
+
+def _quantization_rmse(pixels: np.ndarray, palette) -> float:
+    centers = np.array(palette, dtype=np.float64)
+    distances = ((pixels[:, None, :].astype(np.float64) - centers[None]) ** 2).sum(axis=2)
+    return float(np.sqrt(distances.min(axis=1).mean()))
+
+
+def _palette_distance(a, b) -> float:
+    a, b = np.array(a, dtype=np.float64), np.array(b, dtype=np.float64)
+    distances = np.sqrt(((a[:, None] - b[None]) ** 2).sum(axis=2))
+    return float((distances.min(axis=1).mean() + distances.min(axis=0).mean()) / 2)
+
+
+def _timed(fn, pixels):
+    fn(pixels)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = fn(pixels)
+    return result, (time.perf_counter() - start) / ROUNDS * 1000
+
+
+def main():
+    try:
+        import sklearn  # noqa: F401
+        has_sklearn = True
+    except ImportError:
+        has_sklearn = False
+        print("未安装scikit-learn，只输出NumPy量化的耗时和误差")
+
+    print(f"{'样本':<8} | {'KMeans耗时':>10} | {'量化耗时':>8} | {'KMeans误差':>10} | {'量化误差':>8} | {'调色板距离':>8}")
+    for name, make in CASES.items():
+        for seed in (1, 2):
+            pixels = _pixels(make(seed))
+            ours, ours_ms = _timed(lambda p: extract_palette(p, NUM_COLORS), pixels)
+            ours_err = _quantization_rmse(pixels, ours)
+            if has_sklearn:
+                theirs, theirs_ms = _timed(_kmeans, pixels)
+                theirs_err = _quantization_rmse(pixels, theirs)
+                print(f"{name + str(seed):<8} | {theirs_ms:>8.1f}ms | {ours_ms:>6.2f}ms | "
+                      f"{theirs_err:>10.2f} | {ours_err:>8.2f} | {_palette_distance(ours, theirs):>8.2f}")
+            else:
+                print(f"{name + str(seed):<8} | {'-':>10} | {ours_ms:>6.2f}ms | {'-':>10} | {ours_err:>8.2f} | {'-':>8}")
+
+
+if __name__ == '__main__':
+    main()
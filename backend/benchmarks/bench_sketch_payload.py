@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 草图请求体编码基准测试
+对比原路径（b64encode + decode + data URI拼接 + json序列化）与流式Base64JSONBody
+在不同草图大小下的峰值内存增量和编码耗时
+
+运行: python backend/benchmarks/bench_sketch_payload.py
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import resource
+import multiprocessing
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.services.payload_encoding import Base64JSONBody
+
+SIZES_MB = (1, 4, 16)
+SEND_BLOCK = 16 * 1024  # 与urllib3写socket的块大小一致
+
+
+def _payload():
+    return {
+        "model": "wanx-sketch-to-image-lite",
+        "input": {"prompt": "一幅精美的艺术作品", "style": "anime"},
+        "parameters": {"size": "1024*1024", "n": 1, "seed": 42}
+    }
+
+
+def _legacy(raw: bytes) -> int:
+    """原路径：生成完整的Base64字符串、data URI和JSON文本后再发送"""
+    sketch_base64 = base64.b64encode(raw).decode('utf-8')
+    payload = _payload()
+    payload["input"]["sketch"] = f"data:image/png;base64,{sketch_base64}"
+    body = json.dumps(payload).encode('utf-8')
+    view = memoryview(body)
+    sent = 0
+    for offset in range(0, len(body), SEND_BLOCK):
+        sent += len(view[offset:offset + SEND_BLOCK])
+    return sent
+
+
+def _streaming(raw: bytes) -> int:
+    """新路径：按发送进度逐块编码"""
+    body = Base64JSONBody(_payload(), ('input', 'sketch'), raw, value_prefix="data:image/png;base64,")
+    sent = 0
+    while True:
+        chunk = body.read(SEND_BLOCK)
+        if not chunk:
+            return sent
+        sent += len(chunk)
+
+
+def _measure(name: str, size_mb: int, results):
+    # 每次测量在独立进程中进行，峰值RSS互不干扰
+    raw = os.urandom(size_mb * 1024 * 1024)
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    sent = {'legacy': _legacy, 'streaming': _streaming}[name](raw)
+    elapsed = time.perf_counter() - start
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((sent, elapsed, (peak_kb - baseline_kb) / 1024))
+
+
+def run(name: str, size_mb: int):
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(name, size_mb, results))
+    process.start()
+    outcome = results.get()
+    process.join()
+    return outcome
+
+
+def main():
+    print(f"{'大小':>6} {'路径':>10} {'请求体(MB)':>12} {'编码耗时(ms)':>14} {'峰值内存增量(MB)':>18}")
+    for size_mb in SIZES_MB:
+        for name in ('legacy', 'streaming'):
+            sent, elapsed, peak_mb = run(name, size_mb)
+            print(f"{size_mb:>4}MB {name:>10} {sent / 1024 / 1024:>12.2f} {elapsed * 1000:>14.1f} {peak_mb:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 本地百炼替身服务
+实现应用用到的百炼接口（涂鸦作画、图生视频、任务查询），支持同步/异步任务模式、
+延迟分布、429限流和错误注入，用于离线压测整条创作流水线
+
+运行: python backend/benchmarks/dashscope_standin.py --port 8089 --profile realistic
+然后设置 DASHSCOPE_BASE_URL=http://127.0.0.1:8089/api/v1 启动应用和worker；
+GET /stats 返回请求、限流、错误和任务计数
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+from dataclasses import dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+API_PREFIX = '/api/v1'
+IMAGE_SYNTHESIS_PATH = f'{API_PREFIX}/services/aigc/text2image/image-synthesis'
+IMAGE_TO_VIDEO_PATH = f'{API_PREFIX}/services/aigc/image2video/generation'
+TASKS_PATH = f'{API_PREFIX}/tasks/'
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    解析延迟分布（秒）
+
+    支持 fixed:0.2、uniform:0.1,0.5、exp:0.3（均值）、lognormal:0.3,0.5（中位数, sigma）
+
+    Args:
+        spec: 分布描述
+
+    Returns:
+        Callable[[random.Random], float]: 采样函数
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'fixed' and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == 'uniform' and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'exp' and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0]) if values[0] > 0 else 0.0
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"无法解析的延迟分布: {spec}")
+
+
+@dataclass
+class StandinProfile:
+    """替身服务的行为配置"""
+    task_mode: str = 'auto'                # auto按X-DashScope-Async请求头，sync/async强制
+    submit_latency: str = 'fixed:0'        # 提交接口的响应延迟
+    poll_latency: str = 'fixed:0'          # 任务查询接口的响应延迟
+    image_duration: str = 'fixed:0.2'      # 涂鸦作画任务的执行时间
+    video_duration: str = 'fixed:0.5'      # 图生视频任务的执行时间
+    queue_delay: str = 'fixed:0'           # 任务从PENDING到RUNNING的排队时间
+    image_qps: float = 0.0                 # 各接口的限流QPS，0为不限流，超出返回429
+    video_qps: float = 0.0
+    poll_qps: float = 0.0
+    error_rate: float = 0.0                # 请求直接返回500的比例
+    failure_rate: float = 0.0              # 任务最终FAILED的比例
+    seed: Optional[int] = None             # 随机种子，便于复现
+
+    @classmethod
+    def from_env(cls) -> 'StandinProfile':
+        """从环境变量读取配置（DASHSCOPE_STANDIN_<字段名大写>）"""
+        values = {}
+        for name, current in cls().__dict__.items():
+            raw = os.getenv(f'DASHSCOPE_STANDIN_{name.upper()}')
+            if raw is None:
+                continue
+            if name == 'seed':
+                values[name] = int(raw)
+            else:
+                values[name] = type(current)(raw)
+        return cls(**values)
+
+
+# 预置配置
+PROFILES: Dict[str, StandinProfile] = {
+    # 几乎无延迟，用于功能验证
+    'fast': StandinProfile(image_duration='fixed:0.05', video_duration='fixed:0.1'),
+    # 接近线上的延迟分布
+    'realistic': StandinProfile(
+        submit_latency='lognormal:0.3,0.4', poll_latency='lognormal:0.08,0.5',
+        queue_delay='exp:1', image_duration='lognormal:8,0.3', video_duration='lognormal:40,0.3',
+        image_qps=2, video_qps=2, poll_qps=20
+    ),
+    # 在realistic基础上注入错误和任务失败
+    'flaky': StandinProfile(
+        submit_latency='lognormal:0.3,0.8', poll_latency='lognormal:0.08,1.0',
+        queue_delay='exp:2', image_duration='lognormal:8,0.5', video_duration='lognormal:40,0.5',
+        image_qps=2, video_qps=2, poll_qps=20, error_rate=0.05, failure_rate=0.05
+    )
+}
+
+
+class _TokenBucket:
+    """进程内令牌桶，模拟百炼按接口的QPS配额"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+@dataclass
+class _Task:
+    task_id: str
+    kind: str
+    submitted_at: float
+    starts_at: float
+    ends_at: float
+    fails: bool
+    result_url: str
+
+
+@dataclass
+class _State:
+    profile: StandinProfile
+    rng: random.Random
+    buckets: Dict[str, _TokenBucket]
+    samplers: Dict[str, Callable[[random.Random], float]]
+    tasks: Dict[str, _Task] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def sample(self, name: str) -> float:
+        with self.lock:
+            return max(0.0, self.samplers[name](self.rng))
+
+    def chance(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.rng.random() < rate
+
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+
+def _make_state(profile: StandinProfile) -> _State:
+    return _State(
+        profile=profile,
+        rng=random.Random(profile.seed),
+        buckets={
+            'image_synthesis': _TokenBucket(profile.image_qps),
+            'image2video': _TokenBucket(profile.video_qps),
+            'task_polling': _TokenBucket(profile.poll_qps)
+        },
+        samplers={
+            name: parse_latency(getattr(profile, name))
+            for name in ('submit_latency', 'poll_latency', 'image_duration', 'video_duration', 'queue_delay')
+        }
+    )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    state: _State = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, code: str, message: str):
+        self.state.count(f'http_{status}')
+        self._reply(status, {'request_id': str(uuid.uuid4()), 'code': code, 'message': message})
+
+    def _admit(self, bucket: str) -> bool:
+        """鉴权、限流与错误注入；不放行时已写出错误响应"""
+        if not (self.headers.get('Authorization') or '').startswith('Bearer '):
+            self._error(401, 'InvalidApiKey', 'Invalid API-key provided.')
+            return False
+        if not self.state.buckets[bucket].take():
+            self._error(429, 'Throttling.RateQuota', 'Requests rate limit exceeded, please try again later.')
+            return False
+        if self.state.chance(self.state.profile.error_rate):
+            self._error(500, 'InternalError', 'An internal error has occured, please try again later.')
+            return False
+        return True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path == IMAGE_SYNTHESIS_PATH:
+            kind, bucket = 'image', 'image_synthesis'
+        elif self.path == IMAGE_TO_VIDEO_PATH:
+            kind, bucket = 'video', 'image2video'
+        else:
+            self._error(404, 'NotFound', f'{self.path} not found')
+            return
+
+        self.state.count(f'{bucket}_requests')
+        if not self._admit(bucket):
+            return
+
+        try:
+            request = json.loads(body)
+            params = request['input']
+            if kind == 'image' and not (params.get('sketch_image') or params.get('sketch')):
+                raise KeyError('sketch_image')
+            if kind == 'video' and not params.get('image_url'):
+                raise KeyError('image_url')
+        except (ValueError, KeyError, TypeError) as e:
+            self._error(400, 'InvalidParameter', f'Invalid request body: {e}')
+            return
+
+        time.sleep(self.state.sample('submit_latency'))
+        task = self._create_task(kind)
+
+        profile = self.state.profile
+        asynchronous = profile.task_mode == 'async' or (
+            profile.task_mode == 'auto' and self.headers.get('X-DashScope-Async') == 'enable'
+        )
+        if not asynchronous:
+            # 同步模式：在请求内等待任务完成
+            time.sleep(max(0.0, task.ends_at - time.time()))
+        self._reply(200, {'request_id': str(uuid.uuid4()), 'output': self._task_output(task)})
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.state.lock:
+                stats = dict(self.state.counters, tasks_tracked=len(self.state.tasks))
+            self._reply(200, stats)
+            return
+        if not self.path.startswith(TASKS_PATH):
+            self._error(404, 'NotFound', f'{self.path} not found')
+            return
+
+        self.state.count('task_polling_requests')
+        if not self._admit('task_polling'):
+            return
+        time.sleep(self.state.sample('poll_latency'))
+
+        task_id = self.path[len(TASKS_PATH):]
+        with self.state.lock:
+            task = self.state.tasks.get(task_id)
+        if task is None:
+            self._reply(200, {'request_id': str(uuid.uuid4()), 'output': {'task_id': task_id, 'task_status': 'UNKNOWN'}})
+            return
+
+        output = self._task_output(task)
+        payload = {'request_id': str(uuid.uuid4()), 'output': output}
+        if output['task_status'] == 'RUNNING':
+            elapsed = time.time() - task.starts_at
+            payload['task_metrics'] = {'progress': int(100 * elapsed / max(task.ends_at - task.starts_at, 1e-6))}
+        self._reply(200, payload)
+
+    def _create_task(self, kind: str) -> _Task:
+        state = self.state
+        now = time.time()
+        starts_at = now + state.sample('queue_delay')
+        task_id = str(uuid.uuid4())
+        host = self.headers.get('Host') or f'127.0.0.1:{self.server.server_address[1]}'
+        task = _Task(
+            task_id=task_id,
+            kind=kind,
+            submitted_at=now,
+            starts_at=starts_at,
+            ends_at=starts_at + state.sample(f'{kind}_duration'),
+            fails=state.chance(state.profile.failure_rate),
+            result_url=f"http://{host}/results/{task_id}.{'png' if kind == 'image' else 'mp4'}"
+        )
+        with state.lock:
+            state.tasks[task_id] = task
+        state.count(f'{kind}_tasks')
+        return task
+
+    def _task_output(self, task: _Task) -> Dict[str, Any]:
+        now = time.time()
+        output = {'task_id': task.task_id}
+        if now < task.starts_at:
+            output['task_status'] = 'PENDING'
+        elif now < task.ends_at:
+            output['task_status'] = 'RUNNING'
+        elif task.fails:
+            output.update(task_status='FAILED', code='InternalError.Algo', message='Generation failed (injected).')
+        else:
+            output.update(task_status='SUCCEEDED', results=[{'url': task.result_url}])
+            if task.kind == 'video':
+                output['video_url'] = task.result_url
+        return output
+
+
+def create_server(profile: StandinProfile, host: str = '127.0.0.1', port: int = 8089) -> ThreadingHTTPServer:
+    """
+    创建替身服务（未启动）
+
+    Args:
+        profile: 行为配置
+        host: 监听地址
+        port: 监听端口，0为随机端口
+
+    Returns:
+        ThreadingHTTPServer: 服务实例，base URL为 http://host:port/api/v1
+    """
+    handler = type('DashScopeStandinHandler', (_Handler,), {'state': _make_state(profile)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(profile: StandinProfile, host: str = '127.0.0.1', port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    在后台线程中启动替身服务
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: (服务实例, 百炼base URL)
+    """
+    server = create_server(profile, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{API_PREFIX}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地百炼替身服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--profile', choices=sorted(PROFILES), help='预置配置，未指定时读取环境变量')
+    parser.add_argument('--set', action='append', default=[], metavar='字段=值',
+                        help='覆盖单个配置项，如 --set error_rate=0.1 --set task_mode=sync')
+    args = parser.parse_args()
+
+    profile = PROFILES[args.profile] if args.profile else StandinProfile.from_env()
+    overrides = {}
+    for item in args.set:
+        name, _, raw = item.partition('=')
+        if not hasattr(profile, name):
+            parser.error(f"未知配置项: {name}")
+        current = getattr(profile, name)
+        overrides[name] = int(raw) if name == 'seed' else type(current)(raw)
+    profile = replace(profile, **overrides)
+
+    server = create_server(profile, args.host, args.port)
+    print(f"百炼替身服务: http://{args.host}:{server.server_address[1]}{API_PREFIX}")
+    print(f"配置: {profile}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+华图儿AI创意绘画应用 - 测试公共夹具
+需要本地Redis服务 (REDIS_URL，默认使用15号库)，未启动时相关测试跳过
+"""
+
+import os
+import sys
+
+import pytest
+import redis
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _delete_keys(client, patterns):
+    """删除键，含通配符的按SCAN匹配删除"""
+    for pattern in patterns:
+        if any(char in pattern for char in '*?['):
+            keys = list(client.scan_iter(pattern))
+            if keys:
+                client.delete(*keys)
+        else:
+            client.delete(pattern)
+
+
+@pytest.fixture
+def redis_client():
+    """测试用Redis客户端，Redis未启动时跳过测试"""
+    client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/15'))
+    try:
+        client.ping()
+    except redis.exceptions.ConnectionError:
+        pytest.skip("Redis服务未启动")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def redis_cleanup(redis_client):
+    """
+    登记测试用到的Redis键（可含通配符），登记时和测试结束后各删除一次
+
+    用法: redis_cleanup(GenerationCache.INDEX_KEY, GenerationCache.ENTRY_PREFIX + '*')
+    """
+    registered = []
+
+    def register(*patterns):
+        registered.extend(patterns)
+        _delete_keys(redis_client, patterns)
+
+    yield register
+    _delete_keys(redis_client, registered)
+
+
+@pytest.fixture
+def redis_namespace(request, redis_cleanup):
+    """按测试名隔离的键前缀，前缀下的所有键在测试前后清理"""
+    namespace = f"test:{request.node.name}"
+    redis_cleanup(f"{namespace}:*")
+    return namespace
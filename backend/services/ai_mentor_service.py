@@ -3,16 +3,27 @@
 提供智能绘画分析和个性化指导建议
 """
 
+import os
 import json
 import base64
-import requests
-from typing import List, Dict, Any, Optional
+from functools import cached_property
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import cv2
 import numpy as np
 from PIL import Image
-import io
+
+from .palette import extract_palette, to_hex
+from .image_ingest import MAX_IMAGE_PIXELS, ImageRejectedError, analysis_size, decode_image
+
+# 分析分辨率：长边超过该值的作品先缩小再分析，内存占用与上传尺寸无关（0表示不缩小）
+MENTOR_ANALYSIS_MAX_SIDE = int(os.getenv('MENTOR_ANALYSIS_MAX_SIDE', 1024))
+
+# 批量分析的进程数（0表示按CPU核数）
+MENTOR_BATCH_WORKERS = int(os.getenv('MENTOR_BATCH_WORKERS', 0))
 
 
 class AdviceType(Enum):
@@ -55,11 +66,94 @@ class MentorAdvice:
     visual_example: Optional[str]  # 视觉示例URL
 
 
+class DrawingFeatures:
+    """
+    单张作品的图像特征（按需计算，每种最多计算一次）
+    
+    各分析器共用同一份连续的RGB数组及由它派生的灰度图、HSV、边缘、轮廓和主色，避免对同一张图重复转换和检测。
+    所有特征都在分析分辨率上计算：长边超过 max_side 的作品先缩小，scale 记录相对原图的缩小倍数。
+    """
+    
+    def __init__(self, image: Image.Image, max_side: Optional[int] = None,
+                 original_size: Optional[Tuple[int, int]] = None):
+        """
+        Args:
+            image: 作品图像（可以是已按分析分辨率解码的图像）
+            max_side: 分析分辨率的长边上限，None或0表示按原图分析
+            original_size: 原图尺寸，image已缩小解码时传入
+        """
+        self.image = image
+        self.max_side = max_side
+        self.original_size = original_size or image.size
+        self._palettes: Dict[int, List[str]] = {}
+    
+    @classmethod
+    def from_bytes(cls, image_data: bytes, max_side: Optional[int] = None,
+                   max_pixels: int = MAX_IMAGE_PIXELS) -> 'DrawingFeatures':
+        """按分析分辨率解码图片并构建特征（像素数超过max_pixels时抛出ImageRejectedError）"""
+        decoded = decode_image(image_data, max_side, max_pixels)
+        return cls(decoded.image, max_side, decoded.original_size)
+    
+    @cached_property
+    def scale(self) -> float:
+        """原图相对分析图的缩小倍数（不缩小时为1）"""
+        return max(self.original_size) / max(self.rgb.size)
+    
+    @cached_property
+    def rgb(self) -> Image.Image:
+        """分析分辨率的RGB图像"""
+        image = self.image
+        size = analysis_size(image.size, self.max_side)
+        if size != image.size:
+            # RGB/RGBA/灰度图直接缩小，避免先在原图尺寸上转换颜色
+            if image.mode not in ('RGB', 'RGBA', 'L'):
+                image = image.convert('RGB')
+            image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    
+    @cached_property
+    def pixels(self) -> np.ndarray:
+        """(H, W, 3) 的连续uint8 RGB数组"""
+        return np.ascontiguousarray(np.asarray(self.rgb, dtype=np.uint8))
+    
+    @cached_property
+    def gray(self) -> np.ndarray:
+        """灰度数组"""
+        return cv2.cvtColor(self.pixels, cv2.COLOR_RGB2GRAY)
+    
+    @cached_property
+    def hsv(self) -> np.ndarray:
+        """HSV数组（三个通道均为0-255）"""
+        return cv2.cvtColor(self.pixels, cv2.COLOR_RGB2HSV_FULL)
+    
+    @cached_property
+    def edges(self) -> np.ndarray:
+        """Canny边缘"""
+        return cv2.Canny(self.gray, 50, 150)
+    
+    @cached_property
+    def contours(self) -> List[np.ndarray]:
+        """边缘的外轮廓"""
+        contours, _ = cv2.findContours(self.edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return list(contours)
+    
+    def dominant_colors(self, num_colors: int = 5) -> List[str]:
+        """主要颜色（十六进制），相同数量只聚类一次"""
+        if num_colors not in self._palettes:
+            # 缩小图像以提高处理速度，按覆盖面积从大到小排列
+            pixels = cv2.resize(self.pixels, (150, 150), interpolation=cv2.INTER_AREA)
+            self._palettes[num_colors] = [to_hex(color) for color in extract_palette(pixels, num_colors)]
+        return self._palettes[num_colors]
+
+
 class AIArtMentorService:
     """AI艺术导师服务"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, analysis_max_side: int = MENTOR_ANALYSIS_MAX_SIDE,
+                 max_image_pixels: int = MAX_IMAGE_PIXELS):
         self.api_key = api_key
+        self.analysis_max_side = analysis_max_side
+        self.max_image_pixels = max_image_pixels
         self.base_url = "https://dashscope.aliyuncs.com/api/v1"
         self.headers = {
             "Authorization": f"Bearer {api_key}",
@@ -76,20 +170,23 @@ class AIArtMentorService:
         
         Returns:
             DrawingAnalysis: 分析结果
+        
+        Raises:
+            ImageRejectedError: 图片无法识别或像素数超限
         """
         try:
-            # 转换图片为PIL Image
-            image = Image.open(io.BytesIO(image_data))
+            # 直接按分析分辨率解码，各分析器共用同一份特征
+            features = DrawingFeatures.from_bytes(image_data, self.analysis_max_side, self.max_image_pixels)
             
             # 基础图像分析
-            complexity_score = self._analyze_complexity(image)
-            color_harmony = self._analyze_color_harmony(image)
-            composition_balance = self._analyze_composition(image)
-            stroke_confidence = self._analyze_stroke_confidence(image, drawing_history)
-            style_consistency = self._analyze_style_consistency(image)
-            dominant_colors = self._extract_dominant_colors(image)
-            detected_objects = self._detect_objects(image)
-            artistic_style = self._classify_artistic_style(image)
+            complexity_score = self._analyze_complexity(features)
+            color_harmony = self._analyze_color_harmony(features)
+            composition_balance = self._analyze_composition(features)
+            stroke_confidence = self._analyze_stroke_confidence(features, drawing_history)
+            style_consistency = self._analyze_style_consistency(features)
+            dominant_colors = self._extract_dominant_colors(features)
+            detected_objects = self._detect_objects(features)
+            artistic_style = self._classify_artistic_style(features)
             
             return DrawingAnalysis(
                 complexity_score=complexity_score,
@@ -102,6 +199,9 @@ class AIArtMentorService:
                 artistic_style=artistic_style
             )
             
+        except ImageRejectedError:
+            # 无法识别或尺寸超限的图片交给调用方处理，不返回默认结果
+            raise
         except Exception as e:
             # 返回默认分析结果
             return DrawingAnalysis(
@@ -115,6 +215,55 @@ class AIArtMentorService:
                 artistic_style="混合风格"
             )
     
+    def analyze_drawings_batch(self, images: Iterable[bytes], drawing_histories: Optional[List[List[Dict]]] = None,
+                               workers: Optional[int] = None) -> Iterator[Tuple[int, Optional[DrawingAnalysis]]]:
+        """
+        批量分析绘画作品（进程池并行，按完成顺序逐个返回）
+        
+        每张图片的原始字节写入一块共享内存，工作进程按名称读取，不经过pickle传输；
+        工作进程启动时各自创建一份导师服务并限制OpenCV为单线程，由进程数决定并行度。
+        同时在途的图片不超过进程数的两倍，images可以是逐张读取的生成器。
+        
+        Args:
+            images: 图片二进制数据序列
+            drawing_histories: 与images一一对应的绘画历史记录
+            workers: 进程数，默认取 MENTOR_BATCH_WORKERS，未配置时按CPU核数
+        
+        Returns:
+            Iterator[Tuple[int, Optional[DrawingAnalysis]]]: (图片序号, 分析结果)，
+            无法识别或尺寸超限的图片结果为None
+        """
+        workers = workers or MENTOR_BATCH_WORKERS or os.cpu_count() or 1
+        if workers == 1:
+            # 单进程时直接在当前进程分析，省去进程间开销
+            for index, image_data in enumerate(images):
+                history = drawing_histories[index] if drawing_histories else None
+                yield index, _analyze_or_none(self, image_data, history)
+            return
+        
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(self.api_key, self.analysis_max_side, self.max_image_pixels)
+        )
+        pending = {}
+        try:
+            for index, image_data in enumerate(images):
+                segment = shared_memory.SharedMemory(create=True, size=max(1, len(image_data)))
+                segment.buf[:len(image_data)] = image_data
+                history = drawing_histories[index] if drawing_histories else None
+                future = pool.submit(_analyze_shared, segment.name, len(image_data), history)
+                pending[future] = (index, segment)
+                if len(pending) >= workers * 2:
+                    yield from _drain_completed(pending)
+            while pending:
+                yield from _drain_completed(pending)
+        finally:
+            # 调用方提前停止迭代或出错时取消排队的任务，并释放所有共享内存
+            pool.shutdown(wait=True, cancel_futures=True)
+            for _, segment in pending.values():
+                _release_segment(segment)
+    
     def generate_mentor_advice(self, analysis: DrawingAnalysis, skill_level: str = "beginner") -> List[MentorAdvice]:
         """
         生成导师建议
@@ -196,22 +345,19 @@ class AIArtMentorService:
         
         return advices[:5]  # 最多返回5个建议
     
-    def _analyze_complexity(self, image: Image.Image) -> float:
+    def _analyze_complexity(self, features: DrawingFeatures) -> float:
         """分析图像复杂度"""
-        # 转换为灰度图
-        gray = image.convert('L')
-        gray_array = np.array(gray)
-        
-        # 计算边缘密度
-        edges = cv2.Canny(gray_array, 50, 150)
-        edge_density = np.sum(edges > 0) / edges.size
+        # 计算边缘密度；边缘像素随边长线性缩小、总像素随面积缩小，
+        # 除以缩小倍数换算回原图上的密度，缩小分析不改变评分尺度
+        edges = features.edges
+        edge_density = np.count_nonzero(edges) / edges.size / features.scale
         
         return min(edge_density * 10, 1.0)  # 归一化到0-1
     
-    def _analyze_color_harmony(self, image: Image.Image) -> float:
+    def _analyze_color_harmony(self, features: DrawingFeatures) -> float:
         """分析色彩和谐度"""
         # 获取主要颜色
-        colors = self._extract_dominant_colors(image, num_colors=5)
+        colors = self._extract_dominant_colors(features, num_colors=5)
         
         if len(colors) <= 2:
             return 0.8  # 单色或双色通常比较和谐
@@ -220,21 +366,21 @@ class AIArtMentorService:
         # 这里可以实现更复杂的色彩理论算法
         return 0.6  # 默认中等和谐度
     
-    def _analyze_composition(self, image: Image.Image) -> float:
+    def _analyze_composition(self, features: DrawingFeatures) -> float:
         """分析构图平衡度"""
-        # 转换为灰度图
-        gray = np.array(image.convert('L'))
+        gray = features.gray
         
-        # 计算重心
+        # 由图像矩计算灰度重心，不分配坐标数组
         h, w = gray.shape
-        y_indices, x_indices = np.indices((h, w))
+        moments = cv2.moments(gray)
         
-        total_weight = np.sum(gray)
+        total_weight = moments['m00']
         if total_weight == 0:
             return 0.5
         
-        center_x = np.sum(x_indices * gray) / total_weight
-        center_y = np.sum(y_indices * gray) / total_weight
+        # 矩以像素左上角为原点，与逐像素坐标加权一致
+        center_x = moments['m10'] / total_weight
+        center_y = moments['m01'] / total_weight
         
         # 计算偏离中心的程度
         deviation_x = abs(center_x - w/2) / (w/2)
@@ -246,7 +392,7 @@ class AIArtMentorService:
         
         return max(0, min(1, balance_score))
     
-    def _analyze_stroke_confidence(self, image: Image.Image, drawing_history: List[Dict] = None) -> float:
+    def _analyze_stroke_confidence(self, features: DrawingFeatures, drawing_history: List[Dict] = None) -> float:
         """分析笔触自信度"""
         if drawing_history:
             # 如果有绘画历史，分析笔触速度和长度
@@ -257,71 +403,42 @@ class AIArtMentorService:
             # 简化的自信度计算
             return min(0.5 + total_strokes * 0.1, 1.0)
         
-        # 基于图像的笔触分析
-        gray = np.array(image.convert('L'))
-        edges = cv2.Canny(gray, 50, 150)
-        
-        # 计算连续线条的长度
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # 基于图像的笔触分析：计算连续线条的长度
+        contours = features.contours
         
         if not contours:
             return 0.3
         
-        avg_contour_length = np.mean([cv2.arcLength(contour, False) for contour in contours])
+        # 轮廓长度换算回原图像素，缩小分析不改变评分尺度
+        avg_contour_length = np.mean([cv2.arcLength(contour, False) for contour in contours]) * features.scale
         confidence = min(avg_contour_length / 100, 1.0)  # 归一化
         
         return confidence
     
-    def _analyze_style_consistency(self, image: Image.Image) -> float:
+    def _analyze_style_consistency(self, features: DrawingFeatures) -> float:
         """分析风格一致性"""
         # 简化的风格一致性分析
         # 实际实现可以使用深度学习模型
         return 0.7  # 默认较高的一致性
     
-    def _extract_dominant_colors(self, image: Image.Image, num_colors: int = 5) -> List[str]:
+    def _extract_dominant_colors(self, features: DrawingFeatures, num_colors: int = 5) -> List[str]:
         """提取主要颜色"""
-        # 缩小图像以提高处理速度
-        image = image.resize((150, 150))
-        
-        # 转换为RGB数组
-        rgb_array = np.array(image.convert('RGB'))
-        pixels = rgb_array.reshape(-1, 3)
-        
-        # 使用K-means聚类找到主要颜色
-        from sklearn.cluster import KMeans
-        
-        kmeans = KMeans(n_clusters=min(num_colors, len(np.unique(pixels, axis=0))), random_state=42)
-        kmeans.fit(pixels)
-        
-        # 转换为十六进制颜色
-        colors = []
-        for color in kmeans.cluster_centers_:
-            hex_color = "#{:02x}{:02x}{:02x}".format(int(color[0]), int(color[1]), int(color[2]))
-            colors.append(hex_color)
-        
-        return colors
+        return features.dominant_colors(num_colors)
     
-    def _detect_objects(self, image: Image.Image) -> List[str]:
+    def _detect_objects(self, features: DrawingFeatures) -> List[str]:
         """检测图像中的物体"""
         # 简化的物体检测
         # 实际实现可以使用YOLO或其他目标检测模型
         return ["绘画元素", "艺术作品"]
     
-    def _classify_artistic_style(self, image: Image.Image) -> str:
+    def _classify_artistic_style(self, features: DrawingFeatures) -> str:
         """分类艺术风格"""
         # 简化的风格分类
         # 实际实现可以使用训练好的风格分类模型
         
         # 基于色彩饱和度和对比度的简单分类
-        rgb_array = np.array(image.convert('RGB'))
-        
-        # 计算饱和度
-        hsv_array = np.array(image.convert('HSV'))
-        avg_saturation = np.mean(hsv_array[:, :, 1])
-        
-        # 计算对比度
-        gray = np.array(image.convert('L'))
-        contrast = np.std(gray)
+        avg_saturation = np.mean(features.hsv[:, :, 1])
+        contrast = np.std(features.gray)
         
         if avg_saturation > 150 and contrast > 50:
             return "anime"
@@ -333,9 +450,54 @@ class AIArtMentorService:
             return "artistic"
 
 
+# 批量分析工作进程内的导师服务（进程启动时创建，之后复用）
+_batch_service: Optional[AIArtMentorService] = None
+
+
+def _init_batch_worker(api_key: str, analysis_max_side: int, max_image_pixels: int):
+    """工作进程初始化：并行度由进程数提供，OpenCV只用单线程以免超额占用CPU"""
+    global _batch_service
+    cv2.setNumThreads(1)
+    _batch_service = AIArtMentorService(api_key, analysis_max_side=analysis_max_side,
+                                        max_image_pixels=max_image_pixels)
+
+
+def _analyze_or_none(service: AIArtMentorService, image_data, drawing_history) -> Optional[DrawingAnalysis]:
+    try:
+        return service.analyze_drawing(image_data, drawing_history)
+    except ImageRejectedError:
+        return None
+
+
+def _analyze_shared(name: str, size: int, drawing_history) -> Optional[DrawingAnalysis]:
+    """工作进程：从共享内存读取图片并分析"""
+    segment = shared_memory.SharedMemory(name=name)
+    view = segment.buf[:size]
+    try:
+        return _analyze_or_none(_batch_service, view, drawing_history)
+    finally:
+        view.release()
+        segment.close()
+
+
+def _release_segment(segment: shared_memory.SharedMemory):
+    segment.close()
+    segment.unlink()
+
+
+def _drain_completed(pending: Dict) -> Iterator[Tuple[int, Optional[DrawingAnalysis]]]:
+    """等待至少一个任务完成，释放其共享内存并返回结果"""
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        index, segment = pending.pop(future)
+        _release_segment(segment)
+        yield index, future.result()
+
+
 # 导出主要类
 __all__ = [
     'AIArtMentorService',
+    'DrawingFeatures',
     'DrawingAnalysis',
     'MentorAdvice',
     'AdviceType',
@@ -7,11 +7,31 @@ import os
 import json
 import time
 import base64
-import requests
-from typing import Optional, Dict, Any
-from dataclasses import dataclass
+from typing import Callable, Optional, Dict, Any, Tuple, Union
+from dataclasses import dataclass, asdict
 from enum import Enum
 
+import redis
+
+from .http_transport import HTTPTransport, get_transport
+from .generation_cache import derive_seed, generation_cache_key, sketch_digest
+from .single_flight import SingleFlight
+from .payload_encoding import Base64JSONBody
+from .rate_limiter import (
+    DistributedRateLimiter, IMAGE_SYNTHESIS, IMAGE_TO_VIDEO, TASK_POLLING, get_rate_limiter
+)
+from .resilience import CircuitBreaker, HedgedCaller, get_circuit_breaker, get_hedged_caller
+
+
+# 百炼API地址
+# 可指向本地百炼替身服务（benchmarks/dashscope_standin.py）离线压测
+DASHSCOPE_BASE_URL = os.getenv('DASHSCOPE_BASE_URL', "https://dashscope.aliyuncs.com/api/v1")
+
+# 模型与默认生成参数
+SKETCH_TO_IMAGE_MODEL = "wanx-sketch-to-image-lite"
+SKETCH_TO_IMAGE_SIZE = "1024*1024"
+IMAGE_TO_VIDEO_MODEL = "wanx2.1-i2v-turbo"
+
 
 class TaskStatus(Enum):
     """任务状态枚举"""
@@ -30,82 +50,202 @@ class AIGenerationResult:
     video_url: Optional[str] = None
     progress: int = 0
     error_message: Optional[str] = None
+    status: Optional[TaskStatus] = None    # 异步任务状态，仅状态查询时填写
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['status'] = self.status.value if self.status else None
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AIGenerationResult':
+        status = data.get('status')
+        return cls(**{**data, 'status': TaskStatus(status) if status else None})
+
+
+def _parse_generation_response(result: Dict[str, Any], url_field: str) -> AIGenerationResult:
+    """解析百炼生成接口的响应（同步结果或异步任务ID）"""
+    if result.get("output") and result["output"].get("results"):
+        # 同步返回结果
+        return AIGenerationResult(success=True, **{url_field: result["output"]["results"][0]["url"]})
+    elif result.get("output") and result["output"].get("task_id"):
+        # 异步任务
+        return AIGenerationResult(success=True, task_id=result["output"]["task_id"])
+    else:
+        return AIGenerationResult(
+            success=False,
+            error_message=f"API返回格式错误: {result}"
+        )
+
+
+def _build_sketch_request(sketch_base64: Union[str, bytes], prompt: str, style: str,
+                          seed: Optional[int]) -> Tuple[str, int, Union[Dict[str, Any], Base64JSONBody]]:
+    """
+    构建涂鸦作画请求（同步与异步服务共用）
+
+    Returns:
+        Tuple: (缓存键, 随机种子, 请求体)。传入原始字节时请求体为流式编码的Base64JSONBody
+    """
+    prompt = prompt or "一幅精美的艺术作品"
+    if isinstance(sketch_base64, bytes):
+        sketch_bytes = sketch_base64
+    else:
+        # 去掉可能带有的data URL前缀，按解码后的原始字节计算摘要，与传入字节时的缓存键一致
+        sketch_base64 = sketch_base64.split(',', 1)[1] if sketch_base64.startswith('data:') else sketch_base64
+        sketch_bytes = base64.b64decode(sketch_base64)
+    cache_key = generation_cache_key(
+        sketch_digest(sketch_bytes), prompt, style, SKETCH_TO_IMAGE_MODEL, {'size': SKETCH_TO_IMAGE_SIZE}
+    )
+    if seed is None:
+        seed = derive_seed(cache_key)
+    
+    payload = {
+        "model": SKETCH_TO_IMAGE_MODEL,
+        "input": {
+            "prompt": prompt,
+            "style": style
+        },
+        "parameters": {
+            "size": SKETCH_TO_IMAGE_SIZE,
+            "n": 1,
+            "seed": seed
+        }
+    }
+    if isinstance(sketch_base64, bytes):
+        return cache_key, seed, Base64JSONBody(
+            payload, ('input', 'sketch'), sketch_base64, value_prefix="data:image/png;base64,"
+        )
+    payload["input"]["sketch"] = f"data:image/png;base64,{sketch_base64}"
+    return cache_key, seed, payload
+
+
+def _build_video_request(image_url: str, duration: int) -> Tuple[str, Dict[str, Any]]:
+    """构建图生视频请求，返回 (合并键, 请求体)"""
+    payload = {
+        "model": IMAGE_TO_VIDEO_MODEL,
+        "input": {
+            "image_url": image_url
+        },
+        "parameters": {
+            "duration": min(duration, 10),  # 最大10秒
+            "fps": 24,
+            "resolution": "1024x1024"
+        }
+    }
+    video_key = generation_cache_key(
+        sketch_digest(image_url.encode('utf-8')), '', '', IMAGE_TO_VIDEO_MODEL, payload["parameters"]
+    )
+    return video_key, payload
+
+
+def _parse_task_status(task_id: str, result: Dict[str, Any]) -> AIGenerationResult:
+    """解析百炼任务查询接口的响应"""
+    output = result.get("output", {})
+    
+    # 百炼在output中返回任务状态，兼容顶层字段
+    task_status = output.get("task_status", result.get("task_status", "UNKNOWN"))
+    
+    if task_status == "SUCCEEDED":
+        # 任务成功完成
+        if "results" in output and output["results"]:
+            # 图片生成结果
+            return AIGenerationResult(
+                success=True,
+                task_id=task_id,
+                image_url=output["results"][0].get("url"),
+                progress=100,
+                status=TaskStatus.SUCCESS
+            )
+        elif "video_url" in output:
+            # 视频生成结果
+            return AIGenerationResult(
+                success=True,
+                task_id=task_id,
+                video_url=output["video_url"],
+                progress=100,
+                status=TaskStatus.SUCCESS
+            )
+        else:
+            return AIGenerationResult(
+                success=False,
+                task_id=task_id,
+                error_message="任务完成但未找到结果",
+                status=TaskStatus.FAILED
+            )
+    
+    elif task_status == "RUNNING":
+        # 任务进行中
+        return AIGenerationResult(
+            success=True,
+            task_id=task_id,
+            progress=result.get("task_metrics", {}).get("progress", 0),
+            status=TaskStatus.RUNNING
+        )
+    
+    elif task_status in ("FAILED", "CANCELED", "UNKNOWN"):
+        # 任务失败、被取消或已过期
+        return AIGenerationResult(
+            success=False,
+            task_id=task_id,
+            error_message=output.get("message") or result.get("message", "任务执行失败"),
+            status=TaskStatus.FAILED
+        )
+    
+    # 任务等待中
+    return AIGenerationResult(
+        success=True,
+        task_id=task_id,
+        progress=0,
+        status=TaskStatus.PENDING
+    )
 
 
 class DashScopeAIService:
     """阿里云百炼AI服务"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, transport: Optional[HTTPTransport] = None,
+                 single_flight: Optional[SingleFlight] = None,
+                 rate_limiter: Optional[DistributedRateLimiter] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedger: Optional[HedgedCaller] = None,
+                 base_url: Optional[str] = None):
         self.api_key = api_key
-        self.base_url = "https://dashscope.aliyuncs.com/api/v1"
+        self.base_url = base_url or DASHSCOPE_BASE_URL
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self.transport = transport or get_transport()
+        # 相同请求并发到达时只提交一次
+        self.single_flight = single_flight
+        # 所有worker共享百炼配额，按接口分组限流
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # 百炼降级时按接口熔断快速失败；状态查询超过P95时对冲
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker()
+        self.hedger = hedger or get_hedged_caller()
     
-    def sketch_to_image(self, sketch_base64: str, prompt: str = "", style: str = "anime") -> AIGenerationResult:
+    def sketch_to_image(self, sketch_base64: Union[str, bytes], prompt: str = "", style: str = "anime",
+                        seed: Optional[int] = None) -> AIGenerationResult:
         """
         涂鸦作画 - 将用户涂鸦转换为精美图片
         
         Args:
-            sketch_base64: Base64编码的涂鸦图片
+            sketch_base64: Base64编码的涂鸦图片；也可直接传入原始字节，
+                           发送时流式编码，不生成完整的Base64副本
             prompt: 文字描述
             style: 艺术风格
+            seed: 随机种子，默认按输入内容派生，相同输入得到相同结果
         
         Returns:
             AIGenerationResult: 生成结果
         """
         try:
-            # 构建请求参数
-            payload = {
-                "model": "wanx-sketch-to-image-lite",
-                "input": {
-                    "sketch": f"data:image/png;base64,{sketch_base64}",
-                    "prompt": prompt or "一幅精美的艺术作品",
-                    "style": style
-                },
-                "parameters": {
-                    "size": "1024*1024",
-                    "n": 1,
-                    "seed": int(time.time())
-                }
-            }
+            cache_key, seed, payload = _build_sketch_request(sketch_base64, prompt, style, seed)
             
-            # 发送请求
-            response = requests.post(
-                f"{self.base_url}/services/aigc/text2image/image-synthesis",
-                headers=self.headers,
-                json=payload,
-                timeout=30
+            return self._coalesce(
+                f"image:{cache_key}:{seed}",
+                lambda: self._submit("/services/aigc/text2image/image-synthesis", payload, "image_url", IMAGE_SYNTHESIS)
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                if result.get("output") and result["output"].get("results"):
-                    # 同步返回结果
-                    image_url = result["output"]["results"][0]["url"]
-                    return AIGenerationResult(
-                        success=True,
-                        image_url=image_url
-                    )
-                elif result.get("output") and result["output"].get("task_id"):
-                    # 异步任务
-                    task_id = result["output"]["task_id"]
-                    return AIGenerationResult(
-                        success=True,
-                        task_id=task_id
-                    )
-                else:
-                    return AIGenerationResult(
-                        success=False,
-                        error_message=f"API返回格式错误: {result}"
-                    )
-            else:
-                return AIGenerationResult(
-                    success=False,
-                    error_message=f"API请求失败: {response.status_code} - {response.text}"
-                )
                 
         except Exception as e:
             return AIGenerationResult(
@@ -125,54 +265,11 @@ class DashScopeAIService:
             AIGenerationResult: 生成结果
         """
         try:
-            # 构建请求参数
-            payload = {
-                "model": "wanx2.1-i2v-turbo",
-                "input": {
-                    "image_url": image_url
-                },
-                "parameters": {
-                    "duration": min(duration, 10),  # 最大10秒
-                    "fps": 24,
-                    "resolution": "1024x1024"
-                }
-            }
-            
-            # 发送请求
-            response = requests.post(
-                f"{self.base_url}/services/aigc/image2video/generation",
-                headers=self.headers,
-                json=payload,
-                timeout=30
+            video_key, payload = _build_video_request(image_url, duration)
+            return self._coalesce(
+                f"video:{video_key}",
+                lambda: self._submit("/services/aigc/image2video/generation", payload, "video_url", IMAGE_TO_VIDEO)
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                
-                if result.get("output") and result["output"].get("results"):
-                    # 同步返回结果
-                    video_url = result["output"]["results"][0]["url"]
-                    return AIGenerationResult(
-                        success=True,
-                        video_url=video_url
-                    )
-                elif result.get("output") and result["output"].get("task_id"):
-                    # 异步任务
-                    task_id = result["output"]["task_id"]
-                    return AIGenerationResult(
-                        success=True,
-                        task_id=task_id
-                    )
-                else:
-                    return AIGenerationResult(
-                        success=False,
-                        error_message=f"API返回格式错误: {result}"
-                    )
-            else:
-                return AIGenerationResult(
-                    success=False,
-                    error_message=f"API请求失败: {response.status_code} - {response.text}"
-                )
                 
         except Exception as e:
             return AIGenerationResult(
@@ -180,6 +277,43 @@ class DashScopeAIService:
                 error_message=f"图生视频失败: {str(e)}"
             )
     
+    def _submit(self, path: str, payload: Union[Dict[str, Any], Base64JSONBody], url_field: str,
+                bucket: str) -> AIGenerationResult:
+        """发送生成请求并解析结果"""
+        self.rate_limiter.acquire(bucket)
+        
+        if isinstance(payload, Base64JSONBody):
+            # 流式请求体，每次提交前回到开头（单飞重试时会复用同一个请求体）
+            payload.seek(0)
+            body = {'data': payload}
+        else:
+            body = {'json': payload}
+        
+        response = self.circuit_breaker.call(bucket, lambda: self.transport.post(
+            f"{self.base_url}{path}",
+            headers=self.headers,
+            read_timeout=30,
+            **body
+        ))
+        
+        if response.status_code == 200:
+            return _parse_generation_response(response.json(), url_field)
+        
+        return AIGenerationResult(
+            success=False,
+            error_message=f"API请求失败: {response.status_code} - {response.text}"
+        )
+    
+    def _coalesce(self, key: str, fn: Callable[[], AIGenerationResult]) -> AIGenerationResult:
+        """通过单飞锁合并相同的并发请求"""
+        if self.single_flight is None:
+            return fn()
+        return self.single_flight.do(
+            key, fn,
+            encode=lambda result: result.to_dict(),
+            decode=AIGenerationResult.from_dict
+        )
+    
     def get_task_status(self, task_id: str) -> AIGenerationResult:
         """
         获取异步任务状态
@@ -191,67 +325,19 @@ class DashScopeAIService:
             AIGenerationResult: 任务状态和结果
         """
         try:
-            # 发送状态查询请求
-            response = requests.get(
-                f"{self.base_url}/tasks/{task_id}",
-                headers=self.headers,
-                timeout=10
-            )
+            # 发送状态查询请求，查询是幂等的，慢请求可以对冲（对冲请求只在有空闲令牌时发出）
+            def send():
+                return self.circuit_breaker.call(TASK_POLLING, lambda: self.transport.get(
+                    f"{self.base_url}/tasks/{task_id}",
+                    headers=self.headers,
+                    read_timeout=10
+                ))
+            
+            self.rate_limiter.acquire(TASK_POLLING)
+            response = self.hedger.call(send, allow_hedge=lambda: self.rate_limiter.try_acquire(TASK_POLLING))
             
             if response.status_code == 200:
-                result = response.json()
-                
-                task_status = result.get("task_status", "UNKNOWN")
-                
-                if task_status == "SUCCEEDED":
-                    # 任务成功完成
-                    output = result.get("output", {})
-                    
-                    if "results" in output and output["results"]:
-                        # 图片生成结果
-                        image_url = output["results"][0].get("url")
-                        return AIGenerationResult(
-                            success=True,
-                            image_url=image_url,
-                            progress=100
-                        )
-                    elif "video_url" in output:
-                        # 视频生成结果
-                        video_url = output["video_url"]
-                        return AIGenerationResult(
-                            success=True,
-                            video_url=video_url,
-                            progress=100
-                        )
-                    else:
-                        return AIGenerationResult(
-                            success=False,
-                            error_message="任务完成但未找到结果"
-                        )
-                        
-                elif task_status == "RUNNING":
-                    # 任务进行中
-                    progress = result.get("task_metrics", {}).get("progress", 0)
-                    return AIGenerationResult(
-                        success=True,
-                        progress=progress
-                    )
-                    
-                elif task_status == "FAILED":
-                    # 任务失败
-                    error_msg = result.get("message", "任务执行失败")
-                    return AIGenerationResult(
-                        success=False,
-                        error_message=error_msg
-                    )
-                    
-                else:
-                    # 任务等待中
-                    return AIGenerationResult(
-                        success=True,
-                        progress=0
-                    )
-                    
+                return _parse_task_status(task_id, response.json())
             else:
                 return AIGenerationResult(
                     success=False,
@@ -299,21 +385,31 @@ class MockAIService:
         )
 
 
-def get_ai_service() -> DashScopeAIService:
+def get_ai_service(async_mode: bool = False):
     """
     获取AI服务实例
     
+    Args:
+        async_mode: 返回asyncio版本（AsyncDashScopeAIService），供事件循环中调用
+    
     Returns:
         AI服务实例
     """
     api_key = os.getenv('DASHSCOPE_API_KEY', 'sk-070725ebe68c4c9d9cbb9392f23fbbe5')
     
+    if async_mode:
+        from .async_ai_service import AsyncDashScopeAIService, AsyncMockAIService
+    
     if not api_key or api_key.startswith('your_'):
         # 如果没有配置API密钥，返回模拟服务
         print("警告: 未配置DASHSCOPE_API_KEY，使用模拟AI服务")
-        return MockAIService()
+        return AsyncMockAIService() if async_mode else MockAIService()
+    
+    if async_mode:
+        return AsyncDashScopeAIService(api_key, rate_limiter=get_rate_limiter())
     
-    return DashScopeAIService(api_key)
+    redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    return DashScopeAIService(api_key, single_flight=SingleFlight(redis_client, namespace='singleflight:dashscope'))
 
 
 # 导出主要类和函数
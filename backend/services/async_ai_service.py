@@ -0,0 +1,281 @@
+"""
+华图儿AI创意绘画应用 - 异步AI服务
+DashScopeAIService的asyncio版本，供WebSocket服务和高并发批处理在事件循环中直接调用
+"""
+
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+import httpx
+
+from .ai_service import (
+    AIGenerationResult, TaskStatus, DASHSCOPE_BASE_URL,
+    _build_sketch_request, _build_video_request, _parse_generation_response, _parse_task_status
+)
+from .payload_encoding import Base64JSONBody
+from .rate_limiter import DistributedRateLimiter, IMAGE_SYNTHESIS, IMAGE_TO_VIDEO, TASK_POLLING
+
+
+@dataclass
+class AsyncClientConfig:
+    """异步客户端配置"""
+    max_concurrency: int = 32          # 同时在途的请求数
+    max_connections: int = 64          # 连接池上限
+    max_keepalive: int = 32            # 保持的空闲长连接数
+    connect_timeout: float = 5.0
+    read_timeout: float = 30.0
+    status_read_timeout: float = 10.0
+    stream_chunk_size: int = 64 * 1024  # 流式请求体的分块大小
+
+    @classmethod
+    def from_env(cls) -> 'AsyncClientConfig':
+        """从环境变量读取配置"""
+        return cls(
+            max_concurrency=int(os.getenv('DASHSCOPE_ASYNC_CONCURRENCY', cls.max_concurrency)),
+            max_connections=int(os.getenv('DASHSCOPE_ASYNC_MAX_CONNECTIONS', cls.max_connections)),
+            max_keepalive=int(os.getenv('DASHSCOPE_ASYNC_MAX_KEEPALIVE', cls.max_keepalive)),
+            connect_timeout=float(os.getenv('DASHSCOPE_CONNECT_TIMEOUT', cls.connect_timeout)),
+            read_timeout=float(os.getenv('DASHSCOPE_READ_TIMEOUT', cls.read_timeout))
+        )
+
+
+async def _stream_body(body: Base64JSONBody, chunk_size: int) -> AsyncIterator[bytes]:
+    """把流式请求体转换为异步分块，编码在发送时逐块进行"""
+    body.seek(0)
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class AsyncDashScopeAIService:
+    """阿里云百炼AI服务（asyncio版本）"""
+
+    def __init__(self, api_key: str, config: Optional[AsyncClientConfig] = None,
+                 base_url: str = DASHSCOPE_BASE_URL,
+                 client: Optional[httpx.AsyncClient] = None,
+                 rate_limiter: Optional[DistributedRateLimiter] = None):
+        """
+        初始化异步服务
+
+        Args:
+            api_key: 百炼API密钥
+            config: 客户端配置
+            base_url: 百炼API地址
+            client: 共享的httpx.AsyncClient，默认按配置创建连接池
+            rate_limiter: 可选的分布式限流器，令牌等待在线程中进行，不阻塞事件循环
+        """
+        self.api_key = api_key
+        self.config = config or AsyncClientConfig.from_env()
+        self.base_url = base_url
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self.client = client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive
+            ),
+            timeout=httpx.Timeout(self.config.read_timeout, connect=self.config.connect_timeout)
+        )
+        self.rate_limiter = rate_limiter
+        self.logger = logging.getLogger(__name__)
+        self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+
+    async def __aenter__(self) -> 'AsyncDashScopeAIService':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self.client.aclose()
+
+    async def _acquire(self, bucket: str):
+        if self.rate_limiter is not None:
+            await asyncio.to_thread(self.rate_limiter.acquire, bucket)
+
+    async def sketch_to_image(self, sketch_base64: Union[str, bytes], prompt: str = "", style: str = "anime",
+                              seed: Optional[int] = None) -> AIGenerationResult:
+        """
+        涂鸦作画 - 将用户涂鸦转换为精美图片
+
+        Args:
+            sketch_base64: Base64编码的涂鸦图片，或原始字节（发送时流式编码）
+            prompt: 文字描述
+            style: 艺术风格
+            seed: 随机种子，默认按输入内容派生
+
+        Returns:
+            AIGenerationResult: 生成结果
+        """
+        try:
+            _, _, payload = _build_sketch_request(sketch_base64, prompt, style, seed)
+            return await self._submit("/services/aigc/text2image/image-synthesis", payload, "image_url", IMAGE_SYNTHESIS)
+        except Exception as e:
+            return AIGenerationResult(
+                success=False,
+                error_message=f"涂鸦作画失败: {str(e)}"
+            )
+
+    async def image_to_video(self, image_url: str, duration: int = 10) -> AIGenerationResult:
+        """
+        图生视频 - 将图片转换为创作过程视频
+
+        Args:
+            image_url: 图片URL
+            duration: 视频时长（秒）
+
+        Returns:
+            AIGenerationResult: 生成结果
+        """
+        try:
+            _, payload = _build_video_request(image_url, duration)
+            return await self._submit("/services/aigc/image2video/generation", payload, "video_url", IMAGE_TO_VIDEO)
+        except Exception as e:
+            return AIGenerationResult(
+                success=False,
+                error_message=f"图生视频失败: {str(e)}"
+            )
+
+    async def _submit(self, path: str, payload: Union[Dict[str, Any], Base64JSONBody], url_field: str,
+                      bucket: str) -> AIGenerationResult:
+        """发送生成请求并解析结果"""
+        if isinstance(payload, Base64JSONBody):
+            body = {
+                'content': _stream_body(payload, self.config.stream_chunk_size),
+                'headers': {**self.headers, 'Content-Length': str(len(payload))}
+            }
+        else:
+            body = {'json': payload, 'headers': self.headers}
+
+        await self._acquire(bucket)
+        async with self._semaphore:
+            response = await self.client.post(f"{self.base_url}{path}", **body)
+
+        if response.status_code == 200:
+            return _parse_generation_response(response.json(), url_field)
+
+        return AIGenerationResult(
+            success=False,
+            error_message=f"API请求失败: {response.status_code} - {response.text}"
+        )
+
+    async def get_task_status(self, task_id: str) -> AIGenerationResult:
+        """
+        获取异步任务状态
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            AIGenerationResult: 任务状态和结果
+        """
+        try:
+            await self._acquire(TASK_POLLING)
+            async with self._semaphore:
+                response = await self.client.get(
+                    f"{self.base_url}/tasks/{task_id}",
+                    headers=self.headers,
+                    timeout=httpx.Timeout(self.config.status_read_timeout, connect=self.config.connect_timeout)
+                )
+
+            if response.status_code == 200:
+                return _parse_task_status(task_id, response.json())
+            return AIGenerationResult(
+                success=False,
+                error_message=f"状态查询失败: {response.status_code}"
+            )
+
+        except Exception as e:
+            return AIGenerationResult(
+                success=False,
+                error_message=f"状态查询异常: {str(e)}"
+            )
+
+    async def wait_for_result(self, task_id: str, interval: float = 2.0, max_interval: float = 15.0,
+                              backoff: float = 1.5, timeout: float = 900.0) -> AIGenerationResult:
+        """
+        轮询百炼任务直到完成
+
+        有进展时保持当前间隔，否则指数退避；查询本身失败（网络、限流）时继续重试直到超时。
+
+        Args:
+            task_id: 百炼任务ID
+            interval: 初始轮询间隔（秒）
+            max_interval: 最大轮询间隔（秒）
+            backoff: 无进展时的间隔放大倍数
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            AIGenerationResult: 最终结果；超时时返回失败结果
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last_progress = -1
+
+        while True:
+            result = await self.get_task_status(task_id)
+            if result.status in (TaskStatus.SUCCESS, TaskStatus.FAILED):
+                return result
+
+            if result.progress > last_progress:
+                last_progress = result.progress
+            else:
+                interval = min(interval * backoff, max_interval)
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return AIGenerationResult(
+                    success=False,
+                    task_id=task_id,
+                    error_message=f"百炼任务超时: 已等待{int(timeout)}秒",
+                    status=TaskStatus.FAILED
+                )
+            await asyncio.sleep(min(interval, remaining))
+
+
+class AsyncMockAIService:
+    """模拟异步AI服务（用于测试）"""
+
+    async def sketch_to_image(self, sketch_base64: Union[str, bytes], prompt: str = "", style: str = "anime",
+                              seed: Optional[int] = None) -> AIGenerationResult:
+        """模拟涂鸦作画"""
+        await asyncio.sleep(1)
+        return AIGenerationResult(success=True, image_url="https://example.com/generated_image.jpg")
+
+    async def image_to_video(self, image_url: str, duration: int = 10) -> AIGenerationResult:
+        """模拟图生视频"""
+        await asyncio.sleep(2)
+        return AIGenerationResult(success=True, video_url="https://example.com/generated_video.mp4")
+
+    async def get_task_status(self, task_id: str) -> AIGenerationResult:
+        """模拟任务状态查询"""
+        return AIGenerationResult(
+            success=True,
+            task_id=task_id,
+            progress=100,
+            image_url="https://example.com/generated_image.jpg",
+            status=TaskStatus.SUCCESS
+        )
+
+    async def wait_for_result(self, task_id: str, **kwargs) -> AIGenerationResult:
+        """模拟等待结果"""
+        return await self.get_task_status(task_id)
+
+    async def aclose(self):
+        pass
+
+
+# 导出主要类
+__all__ = [
+    'AsyncClientConfig',
+    'AsyncDashScopeAIService',
+    'AsyncMockAIService'
+]
@@ -0,0 +1,364 @@
+"""
+华图儿AI创意绘画应用 - 画笔账本
+用户画笔余额镜像在Redis中：开始创作时原子预留，完成时确认扣除，失败时释放；
+确认的扣除记为待落库增量，由周期任务批量写回 users.brush_count，
+并按数据库余额校准所有余额镜像（包括后台充值等账本之外的余额变动）
+"""
+
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+import redis
+
+
+# 预留画笔：余额未加载时返回-1，余额不足时返回0；已登记的任务不重复预留
+_RESERVE_SCRIPT = """
+local balance = redis.call('GET', KEYS[1])
+if not balance then
+    return {-1, 0}
+end
+balance = tonumber(balance)
+local amount = tonumber(ARGV[2])
+local fresh = {}
+for i = 5, #ARGV do
+    if redis.call('HEXISTS', KEYS[2], ARGV[i]) == 0 then
+        table.insert(fresh, ARGV[i])
+    end
+end
+local need = #fresh * amount
+if balance < need then
+    return {0, balance}
+end
+for _, task_id in ipairs(fresh) do
+    redis.call('HSET', KEYS[2], task_id, ARGV[1] .. '|' .. amount)
+    redis.call('ZADD', KEYS[3], ARGV[3], task_id)
+end
+if need > 0 then
+    redis.call('HINCRBY', KEYS[4], ARGV[1], need)
+    redis.call('DECRBY', KEYS[1], need)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {1, balance - need}
+"""
+
+# 确认扣除：预留转为待落库的负增量，余额在预留时已经扣过
+_COMMIT_SCRIPT = """
+local reservation = redis.call('HGET', KEYS[1], ARGV[1])
+if not reservation then
+    return 0
+end
+local user_id, amount = string.match(reservation, '^(.*)|(%d+)$')
+amount = tonumber(amount)
+redis.call('HDEL', KEYS[1], ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[1])
+if redis.call('HINCRBY', KEYS[3], user_id, -amount) <= 0 then
+    redis.call('HDEL', KEYS[3], user_id)
+end
+redis.call('HINCRBY', KEYS[4], user_id, -amount)
+return amount
+"""
+
+# 释放预留：画笔退回余额（余额镜像已过期时无需退回，重新加载时不再计入该预留）
+_RELEASE_SCRIPT = """
+local released = 0
+for i = 2, #ARGV do
+    local reservation = redis.call('HGET', KEYS[1], ARGV[i])
+    if reservation then
+        local user_id, amount = string.match(reservation, '^(.*)|(%d+)$')
+        amount = tonumber(amount)
+        redis.call('HDEL', KEYS[1], ARGV[i])
+        redis.call('ZREM', KEYS[2], ARGV[i])
+        if redis.call('HINCRBY', KEYS[3], user_id, -amount) <= 0 then
+            redis.call('HDEL', KEYS[3], user_id)
+        end
+        local balance_key = ARGV[1] .. user_id
+        if redis.call('EXISTS', balance_key) == 1 then
+            redis.call('INCRBY', balance_key, amount)
+        end
+        released = released + 1
+    end
+end
+return released
+"""
+
+# 加载余额镜像：数据库余额加上尚未落库的增量、减去进行中的预留；
+# 读取数据库期间发生过落库（纪元变化）时放弃，避免把已落库的增量重复计入
+_LOAD_SCRIPT = """
+if (redis.call('GET', KEYS[5]) or '0') ~= ARGV[2] then
+    return nil
+end
+local balance = redis.call('GET', KEYS[1])
+if balance then
+    return tonumber(balance)
+end
+balance = tonumber(ARGV[3])
+    + tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+    + tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+    - tonumber(redis.call('HGET', KEYS[4], ARGV[1]) or '0')
+redis.call('SET', KEYS[1], balance, 'EX', ARGV[4])
+return balance
+"""
+
+# 取出待落库的增量：上次落库失败残留的批次优先重试，否则把当前增量整体换出
+_TAKE_DELTAS_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# 落库完成：删除换出的批次并推进纪元（余额镜像随后由校准统一更新）
+_SETTLE_SCRIPT = """
+redis.call('DEL', KEYS[1])
+redis.call('INCR', KEYS[2])
+return 1
+"""
+
+# 校准余额镜像：数据库余额加上尚未落库的增量、减去进行中的预留，只覆盖仍存在的镜像；
+# 读取数据库期间发生过落库（纪元变化）时放弃，下次周期任务再校准
+_RECONCILE_SCRIPT = """
+if (redis.call('GET', KEYS[4]) or '0') ~= ARGV[2] then
+    return -1
+end
+local reconciled = 0
+for i = 3, #ARGV, 2 do
+    local balance_key = ARGV[1] .. ARGV[i]
+    if redis.call('EXISTS', balance_key) == 1 then
+        local balance = tonumber(ARGV[i + 1])
+            + tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+            + tonumber(redis.call('HGET', KEYS[2], ARGV[i]) or '0')
+            - tonumber(redis.call('HGET', KEYS[3], ARGV[i]) or '0')
+        redis.call('SET', balance_key, balance, 'KEEPTTL')
+        reconciled = reconciled + 1
+    end
+end
+return reconciled
+"""
+
+
+class BrushLedger:
+    """Redis画笔账本"""
+
+    # 余额镜像尚未加载时的预留结果
+    LOADING = -1
+    # 校准余额镜像时每次查询数据库的用户数
+    RECONCILE_BATCH = 500
+
+    def __init__(self, supabase_client, redis_client, namespace: str = 'brush',
+                 balance_ttl: int = 24 * 3600, reservation_ttl: int = 24 * 3600):
+        """
+        初始化画笔账本
+
+        Args:
+            supabase_client: Supabase客户端
+            redis_client: Redis客户端
+            namespace: Redis键前缀
+            balance_ttl: 余额镜像的过期时间（秒），每次预留时续期
+            reservation_ttl: 预留的最长保留时间（秒），超时未确认的预留在落库时释放
+        """
+        self.supabase = supabase_client
+        self.redis = redis_client
+        self.namespace = namespace
+        self.balance_ttl = balance_ttl
+        self.reservation_ttl = reservation_ttl
+        self.balance_prefix = f"{namespace}:balance:"
+        self.reservations_key = f"{namespace}:reservations"
+        self.deadlines_key = f"{namespace}:reservation_deadlines"
+        self.reserved_key = f"{namespace}:reserved"
+        self.deltas_key = f"{namespace}:deltas"
+        self.flushing_key = f"{namespace}:deltas:flushing"
+        self.epoch_key = f"{namespace}:flush_epoch"
+        self.stats_key = f"{namespace}:stats"
+        self.logger = logging.getLogger(__name__)
+        self._reserve = self.redis.register_script(_RESERVE_SCRIPT)
+        self._commit = self.redis.register_script(_COMMIT_SCRIPT)
+        self._release = self.redis.register_script(_RELEASE_SCRIPT)
+        self._load = self.redis.register_script(_LOAD_SCRIPT)
+        self._take_deltas = self.redis.register_script(_TAKE_DELTAS_SCRIPT)
+        self._settle = self.redis.register_script(_SETTLE_SCRIPT)
+        self._reconcile = self.redis.register_script(_RECONCILE_SCRIPT)
+
+    def _balance_key(self, user_id: str) -> str:
+        return f"{self.balance_prefix}{user_id}"
+
+    def _load_balance(self, user_id: str) -> Optional[int]:
+        """从数据库加载余额镜像，读取期间发生落库时返回None"""
+        epoch = self.redis.get(self.epoch_key)
+        epoch = epoch.decode() if epoch else '0'
+        result = self.supabase.table('users').select('brush_count').eq('id', user_id).execute()
+        if not result.data:
+            raise Exception("用户不存在")
+        balance = self._load(
+            keys=[self._balance_key(user_id), self.deltas_key, self.flushing_key, self.reserved_key, self.epoch_key],
+            args=[user_id, epoch, result.data[0]['brush_count'] or 0, self.balance_ttl]
+        )
+        return int(balance) if balance is not None else None
+
+    def reserve(self, user_id: str, task_ids: List[str], amount: int = 1) -> bool:
+        """
+        为一个或多个任务预留画笔（全部成功或全部失败）
+
+        余额已在Redis中时不访问数据库；Redis不可用时放行，完成时由数据库直接扣除。
+
+        Args:
+            user_id: 用户ID
+            task_ids: 创作任务ID列表
+            amount: 每个任务消耗的画笔数量
+
+        Returns:
+            bool: 是否预留成功；余额不足时返回False
+        """
+        deadline = time.time() + self.reservation_ttl
+        try:
+            for _ in range(3):
+                allowed, _ = self._reserve(
+                    keys=[self._balance_key(user_id), self.reservations_key, self.deadlines_key, self.reserved_key],
+                    args=[user_id, amount, deadline, self.balance_ttl, *task_ids]
+                )
+                if allowed != self.LOADING:
+                    break
+                self._load_balance(user_id)
+            else:
+                raise redis.exceptions.RedisError("余额镜像加载冲突")
+        except redis.exceptions.RedisError as e:
+            self.logger.warning(f"画笔账本不可用，直接放行: {e}")
+            return True
+
+        if not allowed:
+            self._count('rejected')
+        return bool(allowed)
+
+    def balance(self, user_id: str) -> Optional[int]:
+        """Redis中的可用余额（已扣除进行中的预留），未加载时返回None"""
+        value = self.redis.get(self._balance_key(user_id))
+        return int(value) if value is not None else None
+
+    def has_reservation(self, task_id: str) -> bool:
+        """任务是否持有预留"""
+        return bool(self.redis.hexists(self.reservations_key, task_id))
+
+    def commit(self, task_id: str) -> int:
+        """
+        任务完成：确认扣除预留的画笔（重复调用只扣一次）
+
+        Returns:
+            int: 扣除的画笔数量，没有预留时返回0
+        """
+        return int(self._commit(
+            keys=[self.reservations_key, self.deadlines_key, self.reserved_key, self.deltas_key],
+            args=[task_id]
+        ))
+
+    def release(self, *task_ids: str) -> int:
+        """
+        任务失败：释放预留，画笔退回余额
+
+        Returns:
+            int: 释放的预留数
+        """
+        if not task_ids:
+            return 0
+        return int(self._release(
+            keys=[self.reservations_key, self.deadlines_key, self.reserved_key],
+            args=[self.balance_prefix, *task_ids]
+        ))
+
+    def flush(self) -> int:
+        """
+        释放超时的预留，并把确认的扣除批量写回数据库（一次往返），随后校准所有余额镜像
+
+        Returns:
+            int: 落库的用户数
+        """
+        expired = [task_id.decode() for task_id in self.redis.zrangebyscore(self.deadlines_key, '-inf', time.time())]
+        if expired:
+            released = self.release(*expired)
+            self.logger.warning(f"释放{released}个超时未确认的画笔预留")
+
+        flushed = self._flush_deltas()
+        self.reconcile()
+        return flushed
+
+    def _flush_deltas(self) -> int:
+        """把换出的增量批次写回数据库并推进纪元，返回落库的用户数"""
+        raw = self._take_deltas(keys=[self.deltas_key, self.flushing_key])
+        if not raw:
+            return 0
+
+        deltas = []
+        for i in range(0, len(raw), 2):
+            user_id = raw[i].decode() if isinstance(raw[i], bytes) else raw[i]
+            delta = int(raw[i + 1])
+            if delta:
+                deltas.append({'user_id': user_id, 'delta': delta})
+
+        # 落库失败时保留换出的批次，下次优先重试
+        if deltas:
+            self.supabase.rpc('apply_brush_deltas', {'p_deltas': deltas}).execute()
+        self._settle(keys=[self.flushing_key, self.epoch_key])
+        self._count('flushed_users', len(deltas))
+        return len(deltas)
+
+    def reconcile(self) -> int:
+        """
+        按数据库余额校准Redis中的所有余额镜像
+
+        余额可能在账本之外变动（后台充值、退款等），只校准有增量的用户会让这些镜像一直停留在旧值；
+        镜像按SCAN分批取出，每批一次数据库查询，读取期间发生落库的批次跳过，留给下次周期任务
+
+        Returns:
+            int: 校准的镜像数
+        """
+        keys = self.redis.scan_iter(f"{self.balance_prefix}*", count=self.RECONCILE_BATCH)
+        user_ids = [(key.decode() if isinstance(key, bytes) else key)[len(self.balance_prefix):] for key in keys]
+        reconciled = 0
+        for start in range(0, len(user_ids), self.RECONCILE_BATCH):
+            batch = user_ids[start:start + self.RECONCILE_BATCH]
+            epoch = self.redis.get(self.epoch_key)
+            epoch = epoch.decode() if epoch else '0'
+            result = self.supabase.table('users').select('id, brush_count').in_('id', batch).execute()
+            balances = []
+            for row in result.data or []:
+                balances.extend([row['id'], row['brush_count'] or 0])
+            if not balances:
+                continue
+            count = int(self._reconcile(
+                keys=[self.deltas_key, self.flushing_key, self.reserved_key, self.epoch_key],
+                args=[self.balance_prefix, epoch, *balances]
+            ))
+            if count < 0:
+                self.logger.info("校准余额镜像期间发生落库，本批留待下次校准")
+                continue
+            reconciled += count
+        return reconciled
+
+    def _count(self, name: str, amount: int = 1):
+        try:
+            self.redis.hincrby(self.stats_key, name, amount)
+        except redis.exceptions.RedisError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """进行中的预留、待落库用户数与累计计数"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hlen(self.reservations_key)
+        pipe.hlen(self.deltas_key)
+        pipe.hgetall(self.stats_key)
+        reservations, pending_users, counters = pipe.execute()
+        counters = {k.decode() if isinstance(k, bytes) else k: int(v) for k, v in counters.items()}
+        return {
+            'reservations': reservations,
+            'pending_users': pending_users,
+            'rejected': counters.get('rejected', 0),
+            'flushed_users': counters.get('flushed_users', 0)
+        }
+
+
+# 导出主要类
+__all__ = [
+    'BrushLedger'
+]
@@ -0,0 +1,194 @@
+"""
+华图儿AI创意绘画应用 - 创作流水线检查点
+每个阶段完成后把上下文保存到Redis，重试、消息重投或用户重新发起时从第一个未完成的阶段继续；
+百炼提交记录作为幂等键，已提交的生成任务只重新等待结果，不重复计费
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 只在新阶段不早于已保存阶段时写入，迟到的旧阶段不会覆盖更新的检查点
+_SAVE_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'stage_index') or '-1')
+if tonumber(ARGV[1]) < current then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'stage_index', ARGV[1], 'stage', ARGV[2], 'ctx', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+# 认领阶段的提交权：字段不存在时写入占位（带认领者ID）；
+# 占位属于同一认领者（消息重投、Celery重试沿用同一任务ID）时仍视为认领成功，
+# 否则返回已有的值（百炼任务ID，或其他流水线的占位）
+_CLAIM_SUBMISSION_SCRIPT = """
+local value = redis.call('HGET', KEYS[1], ARGV[1])
+if value and value ~= ARGV[2] then
+    return {0, value}
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {1, ARGV[2]}
+"""
+
+
+class StageCheckpoints:
+    """按任务保存的阶段检查点"""
+
+    KEY_PREFIX = 'creation:checkpoint:'
+
+    # 正在提交、尚未拿到百炼任务ID的占位前缀
+    SUBMITTING_PREFIX = 'submitting:'
+
+    # 最终失败标记字段：重试次数用尽后写入，用户重新发起时取走
+    FAILED_FIELD = 'final_failure'
+
+    def __init__(self, redis_client, stages: List[str], ttl: int = 7 * 24 * 3600):
+        """
+        初始化检查点存储
+
+        Args:
+            redis_client: Redis客户端
+            stages: 按执行顺序排列的阶段名
+            ttl: 检查点保留时间（秒）
+        """
+        self.redis = redis_client
+        self.stages = list(stages)
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._save = self.redis.register_script(_SAVE_SCRIPT)
+        self._claim_submission = self.redis.register_script(_CLAIM_SUBMISSION_SCRIPT)
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.KEY_PREFIX}{task_id}"
+
+    def save(self, task_id: str, stage: str, ctx: Dict[str, Any]) -> bool:
+        """
+        记录阶段完成及完成时的上下文
+
+        Args:
+            task_id: 创作任务ID
+            stage: 已完成的阶段名
+            ctx: 阶段输出的上下文（需可JSON序列化）
+
+        Returns:
+            bool: 是否写入；已有更靠后的检查点时返回False
+        """
+        return bool(self._save(
+            keys=[self._key(task_id)],
+            args=[self.stages.index(stage), stage, json.dumps(ctx, ensure_ascii=False), self.ttl]
+        ))
+
+    def load(self, task_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        读取最近完成的阶段
+
+        Returns:
+            Optional[Tuple[str, Dict[str, Any]]]: (阶段名, 上下文)，没有检查点时返回None
+        """
+        stage, ctx = self.redis.hmget(self._key(task_id), 'stage', 'ctx')
+        if stage is None or ctx is None:
+            return None
+        return stage.decode(), json.loads(ctx)
+
+    def completed(self, task_id: str, stage: str) -> Optional[Dict[str, Any]]:
+        """
+        阶段已完成时返回保存的上下文
+
+        Args:
+            task_id: 创作任务ID
+            stage: 阶段名
+
+        Returns:
+            Optional[Dict[str, Any]]: 阶段（或更靠后的阶段）已完成时的上下文，否则None
+        """
+        saved = self.load(task_id)
+        if saved is None or self.stages.index(saved[0]) < self.stages.index(stage):
+            return None
+        return saved[1]
+
+    def resume_point(self, task_id: str) -> Tuple[str, Any]:
+        """
+        第一个未完成的阶段
+
+        Returns:
+            Tuple[str, Any]: (起始阶段名, 起始参数)；没有检查点时从第一个阶段开始，参数为task_id；
+            所有阶段都已完成时阶段名为None
+        """
+        saved = self.load(task_id)
+        if saved is None:
+            return self.stages[0], task_id
+        stage, ctx = saved
+        index = self.stages.index(stage) + 1
+        return (self.stages[index] if index < len(self.stages) else None), ctx
+
+    def _submission_field(self, stage: str) -> str:
+        return f"submission:{stage}"
+
+    def claim_submission(self, task_id: str, stage: str, owner: str) -> Tuple[bool, Optional[str]]:
+        """
+        原子地认领阶段的提交权，认领成功的流水线才能提交百炼任务
+
+        Args:
+            task_id: 创作任务ID
+            stage: 阶段名
+            owner: 认领者ID（当前阶段的Celery任务ID）
+
+        Returns:
+            Tuple[bool, Optional[str]]: (是否认领成功, 已提交的百炼任务ID)；
+            未认领成功且另一条流水线仍在提交时百炼任务ID为None
+        """
+        claimed, value = self._claim_submission(
+            keys=[self._key(task_id)],
+            args=[self._submission_field(stage), f"{self.SUBMITTING_PREFIX}{owner}", self.ttl]
+        )
+        value = value.decode() if isinstance(value, bytes) else value
+        if claimed:
+            return True, None
+        return False, (None if value.startswith(self.SUBMITTING_PREFIX) else value)
+
+    def record_submission(self, task_id: str, stage: str, dashscope_task_id: str):
+        """记录阶段已提交的百炼任务ID（幂等键），替换认领时的占位"""
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(task_id), self._submission_field(stage), dashscope_task_id)
+        pipe.expire(self._key(task_id), self.ttl)
+        pipe.execute()
+
+    def submission(self, task_id: str, stage: str) -> Optional[str]:
+        """阶段已提交的百炼任务ID，未提交或仍在提交时返回None"""
+        value = self.redis.hget(self._key(task_id), self._submission_field(stage))
+        if value is None or value.decode().startswith(self.SUBMITTING_PREFIX):
+            return None
+        return value.decode()
+
+    def clear_submission(self, task_id: str, stage: str):
+        """百炼任务失败或提交失败后清除提交记录（或认领占位），下次重试重新提交"""
+        self.redis.hdel(self._key(task_id), self._submission_field(stage))
+
+    def mark_failed(self, task_id: str):
+        """记录任务已最终失败（自动重试已用尽），允许用户重新发起"""
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(task_id), self.FAILED_FIELD, 1)
+        pipe.expire(self._key(task_id), self.ttl)
+        pipe.execute()
+
+    def take_failed(self, task_id: str) -> bool:
+        """
+        取走最终失败标记（原子操作，同一次失败只有一个重新发起能成功）
+
+        Returns:
+            bool: 任务是否处于最终失败状态
+        """
+        return bool(self.redis.hdel(self._key(task_id), self.FAILED_FIELD))
+
+    def clear(self, task_id: str):
+        """任务完成后删除检查点"""
+        self.redis.delete(self._key(task_id))
+
+
+# 导出主要类
+__all__ = [
+    'StageCheckpoints'
+]
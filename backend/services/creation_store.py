@@ -0,0 +1,354 @@
+"""
+华图儿AI创意绘画应用 - 创作任务状态存储
+合并创作流水线对Supabase的写入：认领与完成各一次往返，中间进度经Redis写回缓冲批量落库；
+流水线同时维护Redis中的任务状态投影，状态查询优先读取投影，未命中时才访问数据库
+"""
+
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+from .progress_events import publish_progress_event
+
+
+# 取出待落库的进度：上次落库失败残留的批次优先重试，否则把当前缓冲整体换出
+_TAKE_PROGRESS_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# 回源填充状态投影：投影已存在时说明流水线写入了更新的状态，不能用数据库中的旧行覆盖
+_FILL_STATUS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+# 局部更新状态投影：投影不存在时不写，避免残缺的投影被当作命中
+_PATCH_STATUS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+
+class CreationTaskStore:
+    """创作任务状态存储"""
+
+    PROGRESS_KEY = 'creation:progress:pending'
+    FLUSHING_KEY = 'creation:progress:flushing'
+    STATUS_KEY_PREFIX = 'creation:status:'
+
+    # 终态，状态投影使用更长的过期时间
+    TERMINAL_STATUSES = ('completed', 'failed')
+
+    def __init__(self, supabase_client, redis_client,
+                 status_ttl: int = 3600, terminal_status_ttl: int = 86400):
+        """
+        初始化任务状态存储
+
+        Args:
+            supabase_client: Supabase客户端
+            redis_client: Redis客户端
+            status_ttl: 进行中任务状态投影的过期时间（秒）
+            terminal_status_ttl: 已完成/失败任务状态投影的过期时间（秒）
+        """
+        self.supabase = supabase_client
+        self.redis = redis_client
+        self.status_ttl = status_ttl
+        self.terminal_status_ttl = terminal_status_ttl
+        self.logger = logging.getLogger(__name__)
+        self._take_progress = self.redis.register_script(_TAKE_PROGRESS_SCRIPT)
+        self._fill_status = self.redis.register_script(_FILL_STATUS_SCRIPT)
+        self._patch_status = self.redis.register_script(_PATCH_STATUS_SCRIPT)
+
+    def _status_key(self, task_id: str) -> str:
+        return f"{self.STATUS_KEY_PREFIX}{task_id}"
+
+    def _status_ttl_for(self, status: Optional[str]) -> int:
+        return self.terminal_status_ttl if status in self.TERMINAL_STATUSES else self.status_ttl
+
+    @staticmethod
+    def _encode_fields(fields: Dict[str, Any]) -> List[str]:
+        # 字段值按JSON编码，保留数字、布尔与空值的类型
+        args = []
+        for name, value in fields.items():
+            args.extend([name, json.dumps(value, ensure_ascii=False)])
+        return args
+
+    def cache_task(self, task: Dict[str, Any], pipe=None):
+        """
+        用完整的任务记录覆盖状态投影
+
+        Args:
+            task: 数据库中的任务记录
+            pipe: 可选的Redis pipeline，与其他写入一起提交
+        """
+        client = pipe if pipe is not None else self.redis.pipeline()
+        key = self._status_key(task['id'])
+        client.delete(key)
+        client.hset(key, mapping={
+            name: json.dumps(value, ensure_ascii=False) for name, value in task.items()
+        })
+        client.expire(key, self._status_ttl_for(task.get('status')))
+        if pipe is None:
+            client.execute()
+
+    def _patch_task(self, task_id: str, fields: Dict[str, Any], pipe=None):
+        self._patch_status(
+            keys=[self._status_key(task_id)],
+            args=[self._status_ttl_for(fields.get('status'))] + self._encode_fields(fields),
+            client=pipe
+        )
+
+    @staticmethod
+    def _decode_status(cached: Dict[Any, Any]) -> Dict[str, Any]:
+        return {
+            (name.decode() if isinstance(name, bytes) else name): json.loads(value)
+            for name, value in cached.items()
+        }
+
+    def get_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取任务状态：优先读取Redis投影，未命中时回源数据库并填充投影
+
+        Args:
+            task_id: 创作任务ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 任务状态，任务不存在时返回None
+        """
+        return self.get_statuses([task_id])[0]
+
+    def get_statuses(self, task_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        批量读取任务状态：一次pipeline读取投影，未命中的任务合并为一次数据库查询
+
+        Args:
+            task_ids: 创作任务ID列表
+
+        Returns:
+            List[Optional[Dict[str, Any]]]: 与task_ids顺序一致的任务状态，不存在的任务为None
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(self._status_key(task_id))
+        cached = pipe.execute()
+
+        statuses = {task_id: self._decode_status(raw) for task_id, raw in zip(task_ids, cached) if raw}
+        missing = [task_id for task_id in task_ids if task_id not in statuses]
+        if missing:
+            statuses.update(self._load_statuses(missing))
+        return [statuses.get(task_id) for task_id in task_ids]
+
+    def _load_statuses(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """回源数据库并填充投影"""
+        result = self.supabase.table('creation_tasks').select('*').in_('id', task_ids).execute()
+        if not result.data:
+            return {}
+
+        pipe = self.redis.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hget(self.PROGRESS_KEY, task_id)
+        pending_progress = dict(zip(task_ids, pipe.execute()))
+
+        tasks = {}
+        pipe = self.redis.pipeline(transaction=False)
+        for task in result.data:
+            # 数据库中的进度周期性落库，进行中的任务以缓冲中的最新进度为准
+            pending = pending_progress.get(task['id'])
+            if task['status'] == 'processing' and pending is not None:
+                task['progress'] = max(task.get('progress') or 0, int(pending))
+
+            self._fill_status(
+                keys=[self._status_key(task['id'])],
+                args=[self._status_ttl_for(task['status'])] + self._encode_fields(task),
+                client=pipe
+            )
+            tasks[task['id']] = task
+        pipe.execute()
+        return tasks
+
+    def insert_tasks(self, tasks: List[Dict[str, Any]], pipe=None) -> List[Dict[str, Any]]:
+        """
+        批量创建任务（一次数据库往返）并写入状态投影
+
+        Args:
+            tasks: 任务记录列表
+            pipe: 可选的Redis pipeline，投影与调用方的其他写入一起提交
+
+        Returns:
+            List[Dict[str, Any]]: 插入后的任务记录
+        """
+        result = self.supabase.table('creation_tasks').insert(tasks).execute()
+        for task in result.data:
+            self.cache_task(task, pipe=pipe)
+        return result.data
+
+    def cached_field(self, task_id: str, field: str) -> Optional[Any]:
+        """
+        只从状态投影读取单个字段，不回源数据库
+
+        Args:
+            task_id: 创作任务ID
+            field: 字段名
+
+        Returns:
+            Optional[Any]: 字段值，投影不存在或没有该字段时返回None
+        """
+        value = self.redis.hget(self._status_key(task_id), field)
+        return json.loads(value) if value is not None else None
+
+    def claim(self, task_id: str, progress: int = 10, step: str = '正在读取草图...') -> Dict[str, Any]:
+        """
+        标记任务为处理中并返回任务记录（一次往返）
+
+        Args:
+            task_id: 创作任务ID
+            progress: 当前进度
+            step: 当前步骤描述
+
+        Returns:
+            Dict[str, Any]: 更新后的任务记录
+        """
+        result = self.supabase.table('creation_tasks').update({
+            'status': 'processing',
+            'progress': progress,
+            'error_message': None
+        }).eq('id', task_id).execute()
+
+        if not result.data:
+            raise Exception("任务不存在")
+
+        task = result.data[0]
+        pipe = self.redis.pipeline()
+        self.cache_task({**task, 'current_step': step}, pipe=pipe)
+        publish_progress_event(pipe, task_id, {'status': 'processing', 'progress': progress, 'step': step})
+        pipe.execute()
+        return task
+
+    def buffer_progress(self, task_id: str, progress: int, step: str = ''):
+        """记录中间进度、更新状态投影并推送事件，数据库中的进度等待周期任务批量落库"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(self.PROGRESS_KEY, task_id, progress)
+        self._patch_task(task_id, {
+            'status': 'processing', 'progress': progress, 'current_step': step, 'error_message': None
+        }, pipe=pipe)
+        publish_progress_event(pipe, task_id, {'status': 'processing', 'progress': progress, 'step': step})
+        pipe.execute()
+
+    def flush_progress(self) -> int:
+        """
+        把缓冲的中间进度批量写入数据库（一次往返）
+
+        Returns:
+            int: 落库的任务数
+        """
+        raw = self._take_progress(keys=[self.PROGRESS_KEY, self.FLUSHING_KEY])
+        if not raw:
+            return 0
+
+        updates = []
+        for i in range(0, len(raw), 2):
+            task_id = raw[i].decode() if isinstance(raw[i], bytes) else raw[i]
+            updates.append({'id': task_id, 'progress': int(raw[i + 1])})
+
+        # 落库失败时保留换出的批次，下次优先重试
+        self.supabase.rpc('flush_creation_progress', {'p_updates': updates}).execute()
+        self.redis.delete(self.FLUSHING_KEY)
+        return len(updates)
+
+    def finalize(self, task_id: str, generated_image_url: str, generated_video_url: str,
+                 steps: List[Dict[str, Any]], brush_count: int) -> Optional[Dict[str, Any]]:
+        """
+        在一个事务中写入完成状态、创作步骤并扣除画笔（一次往返）
+
+        数据库函数对已完成的任务直接返回，worker崩溃后重试不会重复记账。
+
+        Args:
+            task_id: 创作任务ID
+            generated_image_url: 生成的图片URL
+            generated_video_url: 生成的视频URL
+            steps: 创作步骤记录
+            brush_count: 扣除的画笔数量
+
+        Returns:
+            Optional[Dict[str, Any]]: 完成后的任务记录
+        """
+        result = self.supabase.rpc('finalize_creation_task', {
+            'p_task_id': task_id,
+            'p_generated_image_url': generated_image_url,
+            'p_generated_video_url': generated_video_url,
+            'p_steps': steps,
+            'p_brush_count': brush_count
+        }).execute()
+
+        task = result.data[0] if isinstance(result.data, list) and result.data else result.data
+
+        # 已完成的任务不再需要中间进度
+        pipe = self.redis.pipeline()
+        pipe.hdel(self.PROGRESS_KEY, task_id)
+        if task:
+            self.cache_task({**task, 'current_step': '创作完成'}, pipe=pipe)
+        else:
+            pipe.delete(self._status_key(task_id))
+        publish_progress_event(pipe, task_id, {
+            'status': 'completed',
+            'progress': 100,
+            'step': '创作完成',
+            'generated_image_url': generated_image_url,
+            'generated_video_url': generated_video_url
+        })
+        pipe.execute()
+        return task
+
+    def mark_retrying(self, task_id: str, error_message: str, retries: int):
+        """
+        阶段失败但仍会自动重试：只更新状态投影并推送非终态事件，数据库状态保持不变
+
+        Args:
+            task_id: 创作任务ID
+            error_message: 本次失败的错误信息
+            retries: 即将进行的是第几次重试
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        self._patch_task(task_id, {'status': 'retrying', 'error_message': error_message}, pipe=pipe)
+        publish_progress_event(pipe, task_id, {
+            'status': 'retrying',
+            'error_message': error_message,
+            'retries': retries
+        })
+        pipe.execute()
+
+    def mark_failed(self, task_id: str, error_message: str):
+        """更新任务最终失败状态（自动重试已用尽或无法重试）"""
+        result = self.supabase.table('creation_tasks').update({
+            'status': 'failed',
+            'error_message': error_message
+        }).eq('id', task_id).execute()
+
+        pipe = self.redis.pipeline()
+        pipe.hdel(self.PROGRESS_KEY, task_id)
+        if result.data:
+            self.cache_task(result.data[0], pipe=pipe)
+        else:
+            pipe.delete(self._status_key(task_id))
+        publish_progress_event(pipe, task_id, {'status': 'failed', 'error_message': error_message})
+        pipe.execute()
+
+
+# 导出主要类
+__all__ = [
+    'CreationTaskStore'
+]
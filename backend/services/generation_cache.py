@@ -0,0 +1,164 @@
+"""
+华图儿AI创意绘画应用 - 生成结果缓存
+按草图内容、描述、风格和模型寻址，复用相同输入的涂鸦作画结果
+
+种子策略：同一缓存键总是使用 derive_seed(key) 得到的固定种子提交生成，
+因此相同输入的结果可以互相替代，命中缓存与重新生成在语义上等价。
+"""
+
+import os
+import json
+import time
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+
+@dataclass
+class CacheConfig:
+    """缓存配置"""
+    ttl_seconds: int = 43200        # 结果保留时长（百炼结果URL有效期为24小时）
+    max_entries: int = 10000        # 最多保留的缓存条目数
+
+    @classmethod
+    def from_env(cls) -> 'CacheConfig':
+        """从环境变量读取配置"""
+        return cls(
+            ttl_seconds=int(os.getenv('GENERATION_CACHE_TTL', cls.ttl_seconds)),
+            max_entries=int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', cls.max_entries))
+        )
+
+
+def sketch_digest(sketch_data: bytes) -> str:
+    """计算草图内容摘要"""
+    return hashlib.sha256(sketch_data).hexdigest()
+
+
+def generation_cache_key(sketch_sha256: str, prompt: str, style: str, model: str,
+                         parameters: Optional[Dict[str, Any]] = None) -> str:
+    """
+    计算生成结果的缓存键
+
+    Args:
+        sketch_sha256: 草图内容摘要
+        prompt: 文字描述
+        style: 艺术风格
+        model: 模型名称
+        parameters: 其他影响结果的生成参数（如尺寸）
+
+    Returns:
+        str: 十六进制缓存键
+    """
+    canonical = json.dumps({
+        'sketch': sketch_sha256,
+        'prompt': prompt or '',
+        'style': style or '',
+        'model': model,
+        'parameters': parameters or {}
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def derive_seed(cache_key: str) -> int:
+    """由缓存键派生固定种子（百炼要求种子在 [0, 2^31-1] 内）"""
+    return int(cache_key[:8], 16) % (2 ** 31 - 1)
+
+
+# 写入条目并维护LRU索引：先清理已过期的索引项，超出上限时淘汰最久未访问的条目
+_SET_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[3] - ARGV[2])
+local overflow = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[5])
+if overflow > 0 then
+    local evicted = redis.call('ZPOPMIN', KEYS[2], overflow)
+    for i = 1, #evicted, 2 do
+        redis.call('DEL', ARGV[6] .. evicted[i])
+    end
+    return overflow
+end
+return 0
+"""
+
+
+class GenerationCache:
+    """基于Redis的生成结果缓存"""
+
+    ENTRY_PREFIX = 'gencache:entry:'
+    INDEX_KEY = 'gencache:lru'
+    STATS_KEY = 'gencache:stats'
+
+    def __init__(self, redis_client, config: Optional[CacheConfig] = None):
+        self.redis = redis_client
+        self.config = config or CacheConfig.from_env()
+        self._set = self.redis.register_script(_SET_SCRIPT)
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存结果，同时刷新访问时间并记录命中/未命中
+
+        Returns:
+            Optional[Dict[str, Any]]: 缓存的生成结果，未命中时为None
+        """
+        raw = self.redis.get(self.ENTRY_PREFIX + cache_key)
+
+        pipe = self.redis.pipeline(transaction=False)
+        if raw is None:
+            pipe.hincrby(self.STATS_KEY, 'misses', 1)
+        else:
+            pipe.hincrby(self.STATS_KEY, 'hits', 1)
+            pipe.zadd(self.INDEX_KEY, {cache_key: time.time()}, xx=True)
+        pipe.execute()
+
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, cache_key: str, value: Dict[str, Any]) -> int:
+        """
+        写入缓存结果
+
+        Returns:
+            int: 因超出容量被淘汰的条目数
+        """
+        evicted = self._set(
+            keys=[self.ENTRY_PREFIX + cache_key, self.INDEX_KEY],
+            args=[
+                json.dumps(value, ensure_ascii=False),
+                self.config.ttl_seconds,
+                time.time(),
+                cache_key,
+                self.config.max_entries,
+                self.ENTRY_PREFIX
+            ]
+        )
+        if evicted:
+            self.redis.hincrby(self.STATS_KEY, 'evictions', evicted)
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率统计（所有进程共享）"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self.STATS_KEY)
+        pipe.zcard(self.INDEX_KEY)
+        raw_stats, entries = pipe.execute()
+
+        counters = {k.decode() if isinstance(k, bytes) else k: int(v) for k, v in raw_stats.items()}
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'evictions': counters.get('evictions', 0),
+            'entries': entries,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# 导出主要类和函数
+__all__ = [
+    'CacheConfig',
+    'GenerationCache',
+    'derive_seed',
+    'generation_cache_key',
+    'sketch_digest'
+]
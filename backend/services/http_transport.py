@@ -0,0 +1,196 @@
+"""
+华图儿AI创意绘画应用 - HTTP传输层
+为阿里云百炼API客户端提供共享的长连接池、超时和建连重试策略
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+@dataclass
+class TransportConfig:
+    """传输层配置"""
+    pool_connections: int = 10      # 缓存的连接池数量（按主机）
+    pool_maxsize: int = 20          # 每个连接池保持的最大连接数
+    pool_block: bool = False        # 连接池耗尽时是否阻塞等待
+    connect_timeout: float = 5.0    # 建连超时（秒）
+    read_timeout: float = 30.0      # 读取超时（秒）
+    connect_retries: int = 3        # 建连失败重试次数
+    backoff_factor: float = 0.3     # 重试退避系数
+
+    @classmethod
+    def from_env(cls) -> 'TransportConfig':
+        """从环境变量读取配置"""
+        return cls(
+            pool_connections=int(os.getenv('DASHSCOPE_POOL_CONNECTIONS', cls.pool_connections)),
+            pool_maxsize=int(os.getenv('DASHSCOPE_POOL_MAXSIZE', cls.pool_maxsize)),
+            pool_block=os.getenv('DASHSCOPE_POOL_BLOCK', 'false').lower() == 'true',
+            connect_timeout=float(os.getenv('DASHSCOPE_CONNECT_TIMEOUT', cls.connect_timeout)),
+            read_timeout=float(os.getenv('DASHSCOPE_READ_TIMEOUT', cls.read_timeout)),
+            connect_retries=int(os.getenv('DASHSCOPE_CONNECT_RETRIES', cls.connect_retries)),
+            backoff_factor=float(os.getenv('DASHSCOPE_RETRY_BACKOFF', cls.backoff_factor))
+        )
+
+
+class TransportStats:
+    """连接复用统计（进程内）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0          # 从连接池取出连接的次数
+        self.reused = 0             # 复用已建立连接的次数
+
+    def record_checkout(self, reused: bool):
+        with self._lock:
+            self.checkouts += 1
+            if reused:
+                self.reused += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts, reused = self.checkouts, self.reused
+        return {
+            'connection_checkouts': checkouts,
+            'connections_reused': reused,
+            'connections_created': checkouts - reused,
+            'connection_reuse_ratio': round(reused / checkouts, 4) if checkouts else 0.0
+        }
+
+
+_stats = TransportStats()
+
+
+class _CountingPoolMixin:
+    """在取出连接时记录是否复用了已有的TCP/TLS连接"""
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        # 已建立的连接保留socket，新建或已断开的连接需要重新握手
+        _stats.record_checkout(reused=getattr(conn, 'sock', None) is not None)
+        return conn
+
+
+class _CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    """使用计数连接池的HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool
+        }
+
+
+class HTTPTransport:
+    """共享HTTP传输 - 每个进程持有一组长连接池"""
+
+    def __init__(self, config: Optional[TransportConfig] = None):
+        self.config = config or TransportConfig.from_env()
+        self.session = self._build_session()
+
+    def _build_session(self) -> requests.Session:
+        # 只在建连阶段重试：此时请求尚未发出，POST重试也是安全的
+        retry = Retry(
+            total=self.config.connect_retries,
+            connect=self.config.connect_retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=self.config.backoff_factor,
+            raise_on_status=False
+        )
+        adapter = _PooledHTTPAdapter(
+            pool_connections=self.config.pool_connections,
+            pool_maxsize=self.config.pool_maxsize,
+            pool_block=self.config.pool_block,
+            max_retries=retry
+        )
+
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def timeout(self, read_timeout: Optional[float] = None) -> Tuple[float, float]:
+        """构造 (建连超时, 读取超时) 元组"""
+        return (self.config.connect_timeout, read_timeout or self.config.read_timeout)
+
+    def request(self, method: str, url: str, read_timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        """
+        发送HTTP请求
+
+        Args:
+            method: HTTP方法
+            url: 请求地址
+            read_timeout: 覆盖默认的读取超时（秒）
+
+        Returns:
+            requests.Response: 响应对象
+        """
+        kwargs.setdefault('timeout', self.timeout(read_timeout))
+        return self.session.request(method, url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_transports: Dict[int, HTTPTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport() -> HTTPTransport:
+    """
+    获取当前进程的共享传输实例
+
+    Celery prefork 会在 fork 之后复用父进程的模块状态，
+    按进程ID区分实例，避免子进程共享父进程的socket。
+
+    Returns:
+        HTTPTransport: 传输实例
+    """
+    pid = os.getpid()
+    transport = _transports.get(pid)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(pid)
+            if transport is None:
+                transport = HTTPTransport()
+                _transports.clear()
+                _transports[pid] = transport
+    return transport
+
+
+def get_transport_stats() -> Dict[str, Any]:
+    """获取当前进程的连接复用统计"""
+    return _stats.snapshot()
+
+
+# 导出主要类和函数
+__all__ = [
+    'HTTPTransport',
+    'TransportConfig',
+    'TransportStats',
+    'get_transport',
+    'get_transport_stats'
+]
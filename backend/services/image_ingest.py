@@ -0,0 +1,108 @@
+"""
+华图儿AI创意绘画应用 - 作品图片解码
+按分析分辨率解码上传的图片：解码前按文件头尺寸拒绝解压炸弹，JPEG用draft模式在解码器内按1/2~1/8缩小，
+其他格式解码后立即缩小并释放原图，分析器拿到的是一张分析分辨率的RGB图像
+"""
+
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from PIL import Image
+
+# 允许解码的最大像素数（宽×高），超过即视为解压炸弹
+MAX_IMAGE_PIXELS = int(os.getenv('MENTOR_MAX_IMAGE_PIXELS', 50_000_000))
+
+
+class ImageRejectedError(ValueError):
+    """图片无法识别或尺寸超限"""
+    pass
+
+
+def analysis_size(size: Tuple[int, int], max_side: Optional[int]) -> Tuple[int, int]:
+    """
+    计算分析分辨率下的尺寸（保持宽高比，长边不超过max_side）
+
+    Args:
+        size: 原图尺寸 (宽, 高)
+        max_side: 长边上限，None或0表示不缩小
+
+    Returns:
+        Tuple[int, int]: 分析尺寸 (宽, 高)
+    """
+    width, height = size
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+    scale = max(width, height) / max_side
+    return max(1, round(width / scale)), max(1, round(height / scale))
+
+
+@dataclass
+class DecodedImage:
+    """按分析分辨率解码的图片"""
+    image: Image.Image              # 分析分辨率的RGB图像
+    original_size: Tuple[int, int]  # 原图尺寸 (宽, 高)
+    format: Optional[str]           # 文件格式 (JPEG、PNG等)
+
+
+def decode_image(data: bytes, max_side: Optional[int] = None,
+                 max_pixels: int = MAX_IMAGE_PIXELS) -> DecodedImage:
+    """
+    解码图片到分析分辨率
+
+    Args:
+        data: 图片二进制数据
+        max_side: 分析分辨率的长边上限，None或0表示按原图解码
+        max_pixels: 允许的最大像素数
+
+    Returns:
+        DecodedImage: 解码结果
+
+    Raises:
+        ImageRejectedError: 无法识别的图片，或像素数超过max_pixels
+    """
+    try:
+        # 只读取文件头，尚未解码像素
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ImageRejectedError(f"图片尺寸超出限制: {e}")
+    except (OSError, ValueError) as e:
+        raise ImageRejectedError(f"无法识别的图片: {e}")
+
+    original_size = image.size
+    width, height = original_size
+    if width <= 0 or height <= 0:
+        raise ImageRejectedError("图片尺寸无效")
+    if width * height > max_pixels:
+        raise ImageRejectedError(f"图片尺寸超出限制: {width}x{height}，最多{max_pixels}像素")
+
+    target = analysis_size(original_size, max_side)
+    image_format = image.format
+    try:
+        if image_format == 'JPEG' and target != original_size:
+            # 解码器直接输出不小于目标尺寸的最小缩放（1/2、1/4、1/8）
+            image.draft('RGB', target)
+        image.load()
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        if image.size != target:
+            image = image.resize(target, Image.BILINEAR, reducing_gap=2.0)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    except Image.DecompressionBombError as e:
+        raise ImageRejectedError(f"图片尺寸超出限制: {e}")
+    except (OSError, ValueError) as e:
+        raise ImageRejectedError(f"图片解码失败: {e}")
+
+    return DecodedImage(image=image, original_size=original_size, format=image_format)
+
+
+# 导出主要类和函数
+__all__ = [
+    'MAX_IMAGE_PIXELS',
+    'ImageRejectedError',
+    'DecodedImage',
+    'analysis_size',
+    'decode_image'
+]
@@ -0,0 +1,147 @@
+"""
+华图儿AI创意绘画应用 - 流水线I/O并发
+把阶段内互不依赖的数据库、存储和Redis调用放到线程池中同时发出，
+并记录每个调用的耗时，用于对比串行耗时与实际墙钟时间
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """当前进程共享的I/O线程池，fork之后子进程重新创建"""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('CREATION_IO_WORKERS', 8)),
+                    thread_name_prefix='creation-io'
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+class IOTimeline:
+    """
+    单个阶段的I/O时间线
+
+    每个调用记录相对阶段开始的起止时间；breakdown() 给出各调用耗时之和（串行时的耗时）、
+    阶段墙钟时间以及两者之差（并发节省的时间）。
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, start: float, end: float):
+        with self._lock:
+            self.spans[name] = {
+                'start_ms': round((start - self.started) * 1000, 1),
+                'duration_ms': round((end - start) * 1000, 1)
+            }
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """记录一段在当前线程中执行的调用"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.monotonic())
+
+    def _timed(self, name: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+        def run():
+            with self.span(name):
+                return fn()
+        return run
+
+    def run(self, **calls: Callable[[], Any]) -> Dict[str, Any]:
+        """
+        同时执行多个互不依赖的调用
+
+        全部调用结束后才返回；任一调用失败时抛出第一个失败调用（按参数顺序）的异常。
+
+        Args:
+            **calls: 调用名称到无参调用的映射
+
+        Returns:
+            Dict[str, Any]: 调用名称到返回值的映射
+        """
+        executor = _get_executor()
+        futures = {name: executor.submit(self._timed(name, fn)) for name, fn in calls.items()}
+        for future in futures.values():
+            future.exception()
+        return {name: future.result() for name, future in futures.items()}
+
+    def breakdown(self) -> Dict[str, Any]:
+        """
+        阶段耗时明细
+
+        Returns:
+            Dict[str, Any]: wall_ms 阶段墙钟时间、serial_ms 各调用耗时之和、
+            overlap_ms 并发节省的时间、spans 各调用的起止时间
+        """
+        wall = round((time.monotonic() - self.started) * 1000, 1)
+        with self._lock:
+            spans = {name: dict(span) for name, span in self.spans.items()}
+        serial = round(sum(span['duration_ms'] for span in spans.values()), 1)
+        return {
+            'wall_ms': wall,
+            'serial_ms': serial,
+            'overlap_ms': round(max(0.0, serial - wall), 1),
+            'spans': spans
+        }
+
+
+class TimingStats:
+    """流水线各阶段耗时统计（所有进程共享）"""
+
+    STATS_KEY = 'creation:timing:stats'
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+
+    def record(self, stage: str, breakdown: Dict[str, Any]):
+        """累计一次阶段耗时"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(self.STATS_KEY, f"{stage}_runs", 1)
+        pipe.hincrbyfloat(self.STATS_KEY, f"{stage}_wall_ms_total", breakdown['wall_ms'])
+        pipe.hincrbyfloat(self.STATS_KEY, f"{stage}_serial_ms_total", breakdown['serial_ms'])
+        pipe.hincrbyfloat(self.STATS_KEY, f"{stage}_overlap_ms_total", breakdown['overlap_ms'])
+        pipe.execute()
+
+    def stats(self) -> Dict[str, Any]:
+        """各阶段平均墙钟时间与并发节省的时间"""
+        counters = {
+            k.decode() if isinstance(k, bytes) else k: float(v)
+            for k, v in self.redis.hgetall(self.STATS_KEY).items()
+        }
+        stats = {}
+        for key in sorted(counters):
+            if not key.endswith('_runs'):
+                continue
+            stage = key[:-len('_runs')]
+            runs = int(counters[key])
+            stats[f"{stage}_runs"] = runs
+            for name in ('wall_ms', 'serial_ms', 'overlap_ms'):
+                total = counters.get(f"{stage}_{name}_total", 0.0)
+                stats[f"{stage}_{name}_avg"] = round(total / runs, 1) if runs else 0.0
+        return stats
+
+
+# 导出主要类
+__all__ = [
+    'IOTimeline',
+    'TimingStats'
+]
@@ -0,0 +1,79 @@
+"""
+华图儿AI创意绘画应用 - 游标分页
+按 (created_at, id) 做键集分页，游标对客户端不透明，翻到深页时查询代价不随页数增长；
+键集条件在数据库函数 creation_history_page 中用行比较实现，这里只负责游标与函数参数的转换
+"""
+
+import json
+import uuid
+import base64
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+
+class InvalidCursorError(ValueError):
+    """游标格式错误"""
+    pass
+
+
+def encode_cursor(created_at: str, row_id: str) -> str:
+    """
+    把一页最后一行的排序键编码为游标
+
+    Args:
+        created_at: 最后一行的创建时间
+        row_id: 最后一行的ID
+
+    Returns:
+        str: URL安全的不透明游标
+    """
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    解码游标
+
+    Args:
+        cursor: encode_cursor生成的游标
+
+    Returns:
+        Tuple[str, str]: (created_at, id)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"无效的分页游标: {cursor}") from e
+
+    # 游标来自客户端，传给数据库之前只接受合法的时间戳和UUID
+    try:
+        datetime.fromisoformat(created_at)
+        uuid.UUID(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"无效的分页游标: {cursor}") from e
+    return created_at, row_id
+
+
+def keyset_params(cursor: Optional[str]) -> Dict[str, Optional[str]]:
+    """
+    生成 creation_history_page 的游标参数，取排在游标之后的行（按 created_at、id 倒序）
+
+    Args:
+        cursor: 上一页返回的游标，为空时表示第一页
+
+    Returns:
+        Dict[str, Optional[str]]: p_after_created_at 与 p_after_id，第一页时均为None
+    """
+    created_at, row_id = decode_cursor(cursor) if cursor else (None, None)
+    return {'p_after_created_at': created_at, 'p_after_id': row_id}
+
+
+# 导出主要类和函数
+__all__ = [
+    'InvalidCursorError',
+    'encode_cursor',
+    'decode_cursor',
+    'keyset_params'
+]
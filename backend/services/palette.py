@@ -0,0 +1,88 @@
+"""
+华图儿AI创意绘画应用 - 主色提取
+只依赖NumPy的调色板量化：先把像素按每通道5位分桶得到加权的颜色直方图，
+再在桶均值上做确定性初始化的加权K-means，结果稳定且只需几毫秒
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+
+# 分桶精度（每通道位数），32^3个桶足以区分草图中的颜色
+_BIN_BITS = 5
+
+
+def _histogram(pixels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按桶统计像素数与桶内平均颜色"""
+    shift = 8 - _BIN_BITS
+    q = (pixels >> shift).astype(np.int64)
+    bins = (q[:, 0] << (2 * _BIN_BITS)) | (q[:, 1] << _BIN_BITS) | q[:, 2]
+    ids, inverse, counts = np.unique(bins, return_inverse=True, return_counts=True)
+    sums = np.stack([np.bincount(inverse, weights=pixels[:, c], minlength=len(ids)) for c in range(3)], axis=1)
+    return sums / counts[:, None], counts.astype(np.float64)
+
+
+def _initial_centers(colors: np.ndarray, weights: np.ndarray, k: int) -> np.ndarray:
+    """确定性初始化：最大的桶作为第一个中心，之后依次取 权重×到已有中心距离² 最大的桶"""
+    centers = [colors[np.argmax(weights)]]
+    nearest = np.sum((colors - centers[0]) ** 2, axis=1)
+    for _ in range(1, k):
+        index = int(np.argmax(weights * nearest))
+        if nearest[index] == 0:
+            break
+        centers.append(colors[index])
+        nearest = np.minimum(nearest, np.sum((colors - colors[index]) ** 2, axis=1))
+    return np.array(centers)
+
+
+def extract_palette(pixels: np.ndarray, num_colors: int = 5, max_iter: int = 20) -> List[Tuple[int, int, int]]:
+    """
+    提取主要颜色
+
+    Args:
+        pixels: (N, 3) 的uint8 RGB像素，或 (H, W, 3) 的图像数组
+        num_colors: 最多返回的颜色数
+        max_iter: 加权K-means的最大迭代次数
+
+    Returns:
+        List[Tuple[int, int, int]]: 按覆盖像素数从多到少排列的RGB颜色
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    if pixels.size == 0 or num_colors <= 0:
+        return []
+
+    colors, weights = _histogram(pixels)
+    centers = _initial_centers(colors, weights, min(num_colors, len(colors)))
+
+    for _ in range(max_iter):
+        distances = ((colors[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        mass = np.bincount(labels, weights=weights, minlength=len(centers))
+        totals = np.stack([
+            np.bincount(labels, weights=weights * colors[:, c], minlength=len(centers)) for c in range(3)
+        ], axis=1)
+        keep = mass > 0
+        updated = totals[keep] / mass[keep, None]
+        if updated.shape == centers.shape and np.allclose(updated, centers, atol=0.5):
+            centers = updated
+            break
+        centers = updated
+
+    # 按最终归属的像素数排序，颜色数量和顺序都与输入一一对应
+    distances = ((colors[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    mass = np.bincount(distances.argmin(axis=1), weights=weights, minlength=len(centers))
+    order = np.argsort(-mass, kind='stable')
+    return [tuple(int(round(v)) for v in centers[i]) for i in order if mass[i] > 0]
+
+
+def to_hex(color: Tuple[int, int, int]) -> str:
+    """RGB颜色转十六进制"""
+    return "#{:02x}{:02x}{:02x}".format(*color)
+
+
+# 导出主要函数
+__all__ = [
+    'extract_palette',
+    'to_hex'
+]
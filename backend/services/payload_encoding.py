@@ -0,0 +1,121 @@
+"""
+华图儿AI创意绘画应用 - 请求体编码
+把草图以Base64嵌入JSON请求体时不生成完整的Base64字符串和JSON文本，
+而是按发送进度逐块编码，请求体以文件对象交给HTTP客户端流式写入socket
+"""
+
+import io
+import json
+import uuid
+import binascii
+from typing import Any, Dict, Optional, Tuple
+
+
+class Base64JSONBody(io.RawIOBase):
+    """
+    内嵌Base64字段的JSON请求体
+
+    除Base64字段外的JSON文本预先序列化为前缀和后缀，Base64部分在read时按需编码。
+    读取位置与源数据按3字节/4字符对齐，任意偏移都可以独立编码，因此支持seek，
+    连接重试时HTTP客户端可以回绕请求体。长度可预知，请求以Content-Length发送。
+    """
+
+    def __init__(self, payload: Dict[str, Any], field_path: Tuple[str, ...], raw: bytes,
+                 value_prefix: str = ''):
+        """
+        构造请求体
+
+        Args:
+            payload: 请求JSON，field_path指向的字段会被替换为Base64内容
+            field_path: Base64字段在payload中的路径，如 ('input', 'sketch_image')
+            raw: 需要Base64编码的原始字节（不会被复制）
+            value_prefix: 字段值中Base64之前的固定前缀，如 data URI 的 'data:image/png;base64,'
+        """
+        super().__init__()
+        self._raw = memoryview(raw)
+
+        # 用占位符序列化其余字段，再从占位符处切成前缀和后缀
+        placeholder = uuid.uuid4().hex
+        text = json.dumps(_replace_field(payload, field_path, value_prefix + placeholder), ensure_ascii=False)
+        head, tail = text.split(placeholder)
+        self._head = head.encode('utf-8')
+        self._tail = tail.encode('utf-8')
+
+        self._encoded_length = (len(raw) + 2) // 3 * 4
+        self._length = len(self._head) + self._encoded_length + len(self._tail)
+        self._position = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._length
+        self._position = max(0, min(offset, self._length))
+        return self._position
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._length - self._position
+        end = min(self._position + size, self._length)
+
+        parts = []
+        while self._position < end:
+            parts.append(self._read_segment(end))
+        return b''.join(parts)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def _read_segment(self, end: int) -> bytes:
+        position = self._position
+        head_end = len(self._head)
+        body_end = head_end + self._encoded_length
+
+        if position < head_end:
+            chunk = self._head[position:min(end, head_end)]
+        elif position < body_end:
+            chunk = self._encode_range(position - head_end, min(end, body_end) - head_end)
+        else:
+            chunk = self._tail[position - body_end:end - body_end]
+
+        self._position += len(chunk)
+        return chunk
+
+    def _encode_range(self, start: int, stop: int) -> bytes:
+        # 扩展到4字符边界，对应源数据的3字节边界；只有最后一组会带填充
+        group_start = start // 4
+        group_stop = (stop + 3) // 4
+        encoded = binascii.b2a_base64(self._raw[group_start * 3:group_stop * 3], newline=False)
+        offset = start - group_start * 4
+        return encoded[offset:offset + stop - start]
+
+
+def _replace_field(payload: Dict[str, Any], field_path: Tuple[str, ...], value: Any) -> Dict[str, Any]:
+    """沿路径浅复制并替换字段，不修改调用方的payload"""
+    key = field_path[0]
+    replaced = dict(payload)
+    if len(field_path) == 1:
+        replaced[key] = value
+    else:
+        replaced[key] = _replace_field(payload.get(key, {}), field_path[1:], value)
+    return replaced
+
+
+# 导出主要类
+__all__ = [
+    'Base64JSONBody'
+]
@@ -0,0 +1,148 @@
+"""
+华图儿AI创意绘画应用 - 创作进度事件
+流水线通过Redis发布/订阅推送进度，Web进程用一个订阅线程分发给所有SSE连接
+"""
+
+import json
+import queue
+import logging
+import threading
+import time
+from typing import Dict, Any, Set
+
+import redis
+
+
+CHANNEL_PREFIX = 'creation:events:'
+
+# 终态事件，收到后SSE连接可以关闭
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+def progress_channel(task_id: str) -> str:
+    """创作任务的进度频道"""
+    return f"{CHANNEL_PREFIX}{task_id}"
+
+
+def publish_progress_event(redis_client, task_id: str, event: Dict[str, Any]):
+    """
+    发布创作进度事件
+
+    Args:
+        redis_client: Redis客户端（可以是pipeline）
+        task_id: 创作任务ID
+        event: 事件内容（status、progress、step等）
+    """
+    redis_client.publish(progress_channel(task_id), json.dumps({'task_id': task_id, **event}, ensure_ascii=False))
+
+
+class ProgressEventHub:
+    """
+    进程内进度事件分发器
+
+    每个Web进程只持有一个模式订阅连接，按任务ID把事件分发到各SSE连接的队列，
+    等待进度的客户端数量不会增加Redis连接数，也不会访问数据库。
+    """
+
+    def __init__(self, redis_client, queue_size: int = 64, ready_timeout: float = 5.0):
+        """
+        Args:
+            redis_client: Redis客户端
+            queue_size: 每个连接的事件队列长度
+            ready_timeout: 订阅时等待模式订阅确认的最长时间（秒）
+        """
+        self.redis = redis_client
+        self.queue_size = queue_size
+        self.ready_timeout = ready_timeout
+        self.logger = logging.getLogger(__name__)
+        self._subscribers: Dict[str, Set[queue.Queue]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        # 模式订阅已被Redis确认；连接中断时清除，重连确认后再置位
+        self._ready = threading.Event()
+
+    def subscribe(self, task_id: str) -> queue.Queue:
+        """
+        订阅任务进度，返回接收事件的队列
+
+        返回前等待模式订阅确认，调用方随后读取的状态快照之后发布的事件都能收到；
+        Redis不可用导致等待超时时仍返回队列，重连后继续接收事件
+        """
+        self._ensure_listener()
+        events = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(events)
+        if not self._ready.wait(self.ready_timeout):
+            self.logger.warning(f"进度事件订阅未确认，任务 {task_id} 可能错过快照之后的事件")
+        return events
+
+    def unsubscribe(self, task_id: str, events: queue.Queue):
+        """取消订阅"""
+        with self._lock:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is None:
+                return
+            subscribers.discard(events)
+            if not subscribers:
+                del self._subscribers[task_id]
+
+    def subscriber_count(self) -> int:
+        """当前订阅的连接数"""
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def _ensure_listener(self):
+        # 延迟到首次订阅时启动，保证在gunicorn fork之后的进程中运行
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='progress-event-hub', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                for message in pubsub.listen():
+                    if message['type'] == 'psubscribe':
+                        self._ready.set()
+                    elif message['type'] == 'pmessage':
+                        self._dispatch(message)
+            except redis.exceptions.RedisError as e:
+                self._ready.clear()
+                self.logger.error(f"进度事件订阅中断，1秒后重连: {e}")
+                time.sleep(1)
+
+    def _dispatch(self, message: Dict[str, Any]):
+        channel = message['channel']
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        task_id = channel[len(CHANNEL_PREFIX):]
+
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        if not subscribers:
+            return
+
+        event = json.loads(message['data'])
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                # 慢客户端丢弃最旧的中间进度，保证终态事件送达
+                try:
+                    events.get_nowait()
+                    events.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    self.logger.warning(f"任务 {task_id} 的进度队列已满，丢弃事件")
+
+
+# 导出主要类和函数
+__all__ = [
+    'ProgressEventHub',
+    'TERMINAL_STATUSES',
+    'progress_channel',
+    'publish_progress_event'
+]
@@ -0,0 +1,224 @@
+"""
+华图儿AI创意绘画应用 - 百炼调用限流
+基于Redis的分布式令牌桶，所有worker共享同一份百炼配额；
+拿不到令牌时等待补充，而不是先打出请求、被限流后再进入整轮重试
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import redis
+
+
+@dataclass
+class BucketConfig:
+    """令牌桶配置"""
+    rate: float        # 每秒补充的令牌数（QPS）
+    capacity: float    # 桶容量（允许的突发请求数）
+
+
+# 百炼接口分组
+IMAGE_SYNTHESIS = 'image_synthesis'
+IMAGE_TO_VIDEO = 'image2video'
+TASK_POLLING = 'task_polling'
+
+
+@dataclass
+class RateLimitConfig:
+    """限流配置"""
+    buckets: Dict[str, BucketConfig]
+    max_wait: float = 30.0     # 单次请求最长等待令牌的时间（秒）
+
+    @classmethod
+    def from_env(cls) -> 'RateLimitConfig':
+        """从环境变量读取配置"""
+        def bucket(prefix: str, rate: float, capacity: float) -> BucketConfig:
+            return BucketConfig(
+                rate=float(os.getenv(f'DASHSCOPE_{prefix}_QPS', rate)),
+                capacity=float(os.getenv(f'DASHSCOPE_{prefix}_BURST', capacity))
+            )
+
+        return cls(
+            buckets={
+                IMAGE_SYNTHESIS: bucket('IMAGE', 2, 2),
+                IMAGE_TO_VIDEO: bucket('VIDEO', 2, 2),
+                TASK_POLLING: bucket('POLL', 20, 20)
+            },
+            max_wait=float(os.getenv('DASHSCOPE_RATE_LIMIT_MAX_WAIT', cls.max_wait))
+        )
+
+
+class RateLimitTimeout(Exception):
+    """等待令牌超时"""
+    pass
+
+
+# 按Redis服务器时间补充令牌后尝试取出requested个；不足时返回需要等待的毫秒数。
+# requested为0时只补充并返回当前令牌数
+_ACQUIRE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local allowed = 0
+local wait_ms = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    wait_ms = math.ceil((requested - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) * 2 + 1000)
+return {allowed, tostring(tokens), wait_ms}
+"""
+
+
+class DistributedRateLimiter:
+    """Redis令牌桶限流器"""
+
+    def __init__(self, redis_client, config: Optional[RateLimitConfig] = None,
+                 namespace: str = 'ratelimit:dashscope'):
+        self.redis = redis_client
+        self.config = config or RateLimitConfig.from_env()
+        self.namespace = namespace
+        self.stats_key = f"{namespace}:stats"
+        self.logger = logging.getLogger(__name__)
+        self._acquire = self.redis.register_script(_ACQUIRE_SCRIPT)
+
+    def _bucket_key(self, bucket: str) -> str:
+        return f"{self.namespace}:{bucket}"
+
+    def _call(self, bucket: str, requested: int):
+        config = self.config.buckets[bucket]
+        allowed, tokens, wait_ms = self._acquire(
+            keys=[self._bucket_key(bucket)],
+            args=[config.capacity, config.rate, requested]
+        )
+        return bool(allowed), float(tokens), int(wait_ms) / 1000.0
+
+    def acquire(self, bucket: str, max_wait: Optional[float] = None) -> float:
+        """
+        取得一个令牌，不足时等待补充
+
+        Redis不可用时直接放行，限流故障不影响生成本身。
+
+        Args:
+            bucket: 接口分组（image_synthesis、image2video、task_polling）
+            max_wait: 最长等待时间（秒），默认使用配置值
+
+        Returns:
+            float: 实际等待的秒数
+        """
+        max_wait = self.config.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+        deadline = start + max_wait
+
+        while True:
+            try:
+                allowed, _, wait = self._call(bucket, 1)
+            except redis.exceptions.RedisError as e:
+                self.logger.warning(f"限流器不可用，直接放行: {e}")
+                return time.monotonic() - start
+
+            if allowed:
+                waited = time.monotonic() - start
+                self._record(bucket, waited)
+                return waited
+
+            # 多个等待者同时醒来会再次争抢，加入抖动错开
+            sleep_for = wait * (1 + random.random() * 0.5)
+            if time.monotonic() + sleep_for > deadline:
+                self._record(bucket, time.monotonic() - start, timed_out=True)
+                raise RateLimitTimeout(f"等待百炼{bucket}配额超时（{max_wait}秒）")
+            time.sleep(sleep_for)
+
+    def try_acquire(self, bucket: str) -> bool:
+        """
+        不等待地尝试取得一个令牌（用于可有可无的请求，如对冲）
+
+        Returns:
+            bool: 是否取得令牌；Redis不可用时返回False
+        """
+        try:
+            allowed, _, _ = self._call(bucket, 1)
+        except redis.exceptions.RedisError:
+            return False
+        if allowed:
+            self._record(bucket, 0.0)
+        return allowed
+
+    def _record(self, bucket: str, waited: float, timed_out: bool = False):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hincrby(self.stats_key, f"{bucket}_acquired" if not timed_out else f"{bucket}_timeouts", 1)
+            if waited > 0.001:
+                pipe.hincrby(self.stats_key, f"{bucket}_throttled", 1)
+                pipe.hincrbyfloat(self.stats_key, f"{bucket}_wait_seconds_total", round(waited, 3))
+            pipe.execute()
+        except redis.exceptions.RedisError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """各分组当前令牌数与累计等待（所有进程共享）"""
+        counters = {
+            k.decode() if isinstance(k, bytes) else k: float(v)
+            for k, v in self.redis.hgetall(self.stats_key).items()
+        }
+
+        stats = {}
+        for bucket in self.config.buckets:
+            _, tokens, _ = self._call(bucket, 0)
+            acquired = int(counters.get(f"{bucket}_acquired", 0))
+            wait_total = counters.get(f"{bucket}_wait_seconds_total", 0.0)
+            stats[f"{bucket}_tokens"] = round(tokens, 3)
+            stats[f"{bucket}_acquired"] = acquired
+            stats[f"{bucket}_throttled"] = int(counters.get(f"{bucket}_throttled", 0))
+            stats[f"{bucket}_timeouts"] = int(counters.get(f"{bucket}_timeouts", 0))
+            stats[f"{bucket}_wait_seconds_total"] = round(wait_total, 3)
+            stats[f"{bucket}_wait_seconds_avg"] = round(wait_total / acquired, 4) if acquired else 0.0
+        return stats
+
+
+_limiter: Optional[DistributedRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> DistributedRateLimiter:
+    """
+    获取当前进程共享的百炼限流器
+
+    Returns:
+        DistributedRateLimiter: 限流器实例
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = DistributedRateLimiter(
+                    redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+                )
+    return _limiter
+
+
+# 导出主要类和函数
+__all__ = [
+    'BucketConfig',
+    'DistributedRateLimiter',
+    'RateLimitConfig',
+    'RateLimitTimeout',
+    'IMAGE_SYNTHESIS',
+    'IMAGE_TO_VIDEO',
+    'TASK_POLLING',
+    'get_rate_limiter'
+]
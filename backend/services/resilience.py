@@ -0,0 +1,346 @@
+"""
+华图儿AI创意绘画应用 - 百炼调用容错
+按接口熔断：连续失败后快速失败，冷却后放行单个半开探测请求，恢复后关闭；
+廉价的状态查询在超过近期P95延迟时发送对冲请求，取先返回的结果
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Optional
+
+import redis
+import requests
+
+
+@dataclass
+class ResilienceConfig:
+    """容错配置"""
+    failure_threshold: int = 5        # 连续失败多少次后熔断
+    open_seconds: float = 30.0        # 熔断后多久放行半开探测
+    probe_timeout: float = 60.0       # 半开探测请求的最长占用时间（秒），超时后允许新的探测
+    hedge_enabled: bool = True        # 状态查询是否发送对冲请求
+    hedge_quantile: float = 0.95      # 触发对冲的延迟分位
+    hedge_min_delay: float = 0.2      # 对冲等待的下限（秒），避免在延迟很低时加倍请求量
+    hedge_min_samples: int = 20       # 样本不足时不对冲
+    hedge_window: int = 200           # 计算分位数的最近样本数
+    hedge_workers: int = 16           # 对冲线程池大小
+
+    @classmethod
+    def from_env(cls) -> 'ResilienceConfig':
+        """从环境变量读取配置"""
+        return cls(
+            failure_threshold=int(os.getenv('DASHSCOPE_BREAKER_FAILURES', cls.failure_threshold)),
+            open_seconds=float(os.getenv('DASHSCOPE_BREAKER_OPEN_SECONDS', cls.open_seconds)),
+            probe_timeout=float(os.getenv('DASHSCOPE_BREAKER_PROBE_TIMEOUT', cls.probe_timeout)),
+            hedge_enabled=os.getenv('DASHSCOPE_HEDGE_ENABLED', 'true').lower() == 'true',
+            hedge_quantile=float(os.getenv('DASHSCOPE_HEDGE_QUANTILE', cls.hedge_quantile)),
+            hedge_min_delay=float(os.getenv('DASHSCOPE_HEDGE_MIN_DELAY', cls.hedge_min_delay)),
+            hedge_min_samples=int(os.getenv('DASHSCOPE_HEDGE_MIN_SAMPLES', cls.hedge_min_samples)),
+            hedge_window=int(os.getenv('DASHSCOPE_HEDGE_WINDOW', cls.hedge_window)),
+            hedge_workers=int(os.getenv('DASHSCOPE_HEDGE_WORKERS', cls.hedge_workers))
+        )
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，请求未发出"""
+    pass
+
+
+# 熔断状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 状态在指标中的数值
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# 判断是否放行：熔断中冷却结束后转为半开，半开时只放行一个探测请求
+_ALLOW_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'open' then
+    local opened_at = tonumber(redis.call('HGET', KEYS[1], 'opened_at') or '0')
+    if now - opened_at < tonumber(ARGV[1]) then
+        return {0, state}
+    end
+    state = 'half_open'
+    redis.call('HSET', KEYS[1], 'state', state)
+end
+if state == 'half_open' then
+    if redis.call('SET', KEYS[2], '1', 'NX', 'PX', ARGV[2]) then
+        return {1, state}
+    end
+    return {0, state}
+end
+return {1, state}
+"""
+
+# 记录失败：半开探测失败立即重新熔断，关闭状态下累计连续失败
+_FAILURE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if state == 'half_open' or (state == 'closed' and failures >= tonumber(ARGV[1])) then
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now)
+    redis.call('DEL', KEYS[2])
+    return 1
+end
+return 0
+"""
+
+# 记录成功：只有半开探测成功才关闭熔断；关闭状态下清零连续失败；
+# 熔断中返回的是熔断前放行的慢请求，不能据此关闭熔断
+_SUCCESS_SCRIPT = """
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'half_open' then
+    redis.call('HSET', KEYS[1], 'state', 'closed', 'failures', 0)
+    redis.call('DEL', KEYS[2])
+    return 1
+end
+if state == 'closed' then
+    redis.call('HSET', KEYS[1], 'failures', 0)
+end
+return 0
+"""
+
+
+class CircuitBreaker:
+    """
+    基于Redis的按接口熔断器
+
+    状态在所有worker之间共享：一个worker观察到的连续失败会让其他worker一起快速失败，
+    避免每个进程各自等满超时才发现百炼不可用。Redis不可用时放行请求。
+    """
+
+    def __init__(self, redis_client, config: Optional[ResilienceConfig] = None,
+                 namespace: str = 'circuit:dashscope'):
+        self.redis = redis_client
+        self.config = config or ResilienceConfig.from_env()
+        self.namespace = namespace
+        self.stats_key = f"{namespace}:stats"
+        self.logger = logging.getLogger(__name__)
+        self._allow = self.redis.register_script(_ALLOW_SCRIPT)
+        self._failure = self.redis.register_script(_FAILURE_SCRIPT)
+        self._success = self.redis.register_script(_SUCCESS_SCRIPT)
+        self._endpoints = set()
+
+    def _keys(self, endpoint: str):
+        return [f"{self.namespace}:{endpoint}", f"{self.namespace}:{endpoint}:probe"]
+
+    def allow(self, endpoint: str) -> bool:
+        """判断请求是否可以发出"""
+        self._endpoints.add(endpoint)
+        try:
+            allowed, _ = self._allow(
+                keys=self._keys(endpoint),
+                args=[int(self.config.open_seconds * 1000), int(self.config.probe_timeout * 1000)]
+            )
+        except redis.exceptions.RedisError as e:
+            self.logger.warning(f"熔断器不可用，直接放行: {e}")
+            return True
+        if not allowed:
+            self._count(endpoint, 'rejected')
+        return bool(allowed)
+
+    def record_success(self, endpoint: str):
+        """请求成功：半开探测成功时关闭熔断，关闭状态下清零连续失败，熔断中不改变状态"""
+        try:
+            self._success(keys=self._keys(endpoint))
+        except redis.exceptions.RedisError:
+            pass
+
+    def record_failure(self, endpoint: str):
+        """请求失败：累计失败次数，达到阈值或探测失败时熔断"""
+        try:
+            opened = self._failure(keys=self._keys(endpoint), args=[self.config.failure_threshold])
+        except redis.exceptions.RedisError:
+            return
+        self._count(endpoint, 'failures')
+        if opened:
+            self._count(endpoint, 'opened')
+            self.logger.warning(f"百炼接口 {endpoint} 熔断 {self.config.open_seconds} 秒")
+
+    def call(self, endpoint: str, fn: Callable[[], requests.Response]) -> requests.Response:
+        """
+        经熔断器发送请求
+
+        网络异常和5xx响应计为失败；4xx（包括429限流）说明服务仍在正常应答，不计入。
+
+        Args:
+            endpoint: 接口名称
+            fn: 发送请求的调用
+
+        Returns:
+            requests.Response: 响应对象
+        """
+        if not self.allow(endpoint):
+            raise CircuitOpenError(f"百炼接口 {endpoint} 暂时不可用（熔断中）")
+
+        try:
+            response = fn()
+        except requests.exceptions.RequestException:
+            self.record_failure(endpoint)
+            raise
+
+        if response.status_code >= 500:
+            self.record_failure(endpoint)
+        else:
+            self.record_success(endpoint)
+        return response
+
+    def _count(self, endpoint: str, name: str):
+        try:
+            self.redis.hincrby(self.stats_key, f"{endpoint}_{name}", 1)
+        except redis.exceptions.RedisError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        """各接口熔断状态（0关闭、1半开、2熔断）与累计计数"""
+        counters = {
+            k.decode() if isinstance(k, bytes) else k: int(v)
+            for k, v in self.redis.hgetall(self.stats_key).items()
+        }
+        stats = dict(counters)
+        for endpoint in sorted(self._endpoints | {k.rsplit('_', 1)[0] for k in counters}):
+            state = self.redis.hget(self._keys(endpoint)[0], 'state')
+            state = state.decode() if isinstance(state, bytes) else (state or CLOSED)
+            stats[f"{endpoint}_state"] = _STATE_VALUES.get(state, 0)
+        return stats
+
+
+class HedgedCaller:
+    """
+    对冲请求
+
+    主请求超过近期延迟P95仍未返回时再发一份相同请求，先返回者胜出，
+    落后的请求在后台自然结束。只用于幂等的查询接口。
+    """
+
+    def __init__(self, config: Optional[ResilienceConfig] = None):
+        self.config = config or ResilienceConfig.from_env()
+        self._samples = deque(maxlen=self.config.hedge_window)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # fork之后子进程重新创建线程池
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.config.hedge_workers, thread_name_prefix='dashscope-hedge'
+                    )
+                    self._pid = os.getpid()
+        return self._executor
+
+    def hedge_delay(self) -> Optional[float]:
+        """当前触发对冲的等待时间，样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < self.config.hedge_min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.config.hedge_quantile))
+        return max(self.config.hedge_min_delay, ordered[index])
+
+    def _timed(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        def run():
+            start = time.monotonic()
+            result = fn()
+            with self._lock:
+                self._samples.append(time.monotonic() - start)
+            return result
+        return run
+
+    def call(self, fn: Callable[[], Any], allow_hedge: Callable[[], bool] = lambda: True) -> Any:
+        """
+        发送请求，超过P95仍未返回时对冲
+
+        Args:
+            fn: 发送请求的调用（必须幂等）
+            allow_hedge: 发送对冲前的检查，如尝试获取限流令牌
+
+        Returns:
+            Any: 先成功返回的结果
+        """
+        delay = self.hedge_delay() if self.config.hedge_enabled else None
+        if delay is None:
+            return self._timed(fn)()
+
+        executor = self._get_executor()
+        primary = executor.submit(self._timed(fn))
+        done, _ = wait([primary], timeout=delay)
+        if done or not allow_hedge():
+            return primary.result()
+
+        hedge = executor.submit(self._timed(fn))
+        with self._lock:
+            self.hedged += 1
+
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                first_error = first_error or future.exception()
+        raise first_error
+
+    def stats(self) -> Dict[str, Any]:
+        """对冲统计（当前进程）"""
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                'hedged': self.hedged,
+                'hedge_wins': self.hedge_wins,
+                'hedge_delay_seconds': round(delay, 4) if delay is not None else 0.0
+            }
+
+
+_breaker: Optional[CircuitBreaker] = None
+_hedger: Optional[HedgedCaller] = None
+_singleton_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """获取当前进程共享的百炼熔断器"""
+    global _breaker
+    if _breaker is None:
+        with _singleton_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0')))
+    return _breaker
+
+
+def get_hedged_caller() -> HedgedCaller:
+    """获取当前进程共享的状态查询对冲器"""
+    global _hedger
+    if _hedger is None:
+        with _singleton_lock:
+            if _hedger is None:
+                _hedger = HedgedCaller()
+    return _hedger
+
+
+# 导出主要类和函数
+__all__ = [
+    'CircuitBreaker',
+    'CircuitOpenError',
+    'HedgedCaller',
+    'ResilienceConfig',
+    'get_circuit_breaker',
+    'get_hedged_caller'
+]
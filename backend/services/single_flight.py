@@ -0,0 +1,295 @@
+"""
+华图儿AI创意绘画应用 - 单飞请求合并
+相同的生成请求同时到达时只由一个领导者调用百炼，其余跟随者等待领导者的结果；
+挂起的跟随者登记在待检查集合中，领导者失去租约时由周期任务交还重新派发
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import redis
+
+
+@dataclass
+class SingleFlightConfig:
+    """单飞配置"""
+    lease_seconds: int = 1200       # 领导者锁租约，需覆盖一次完整生成（含异步轮询）
+    result_ttl: int = 60            # 完成结果保留时长，覆盖跟随者读取结果的窗口
+    wait_timeout: float = 300.0     # 同步跟随者最长等待时间（秒）
+    follower_recheck: float = 30.0  # 挂起的跟随者检查领导者是否仍持有租约的间隔（秒）
+
+    @classmethod
+    def from_env(cls) -> 'SingleFlightConfig':
+        """从环境变量读取配置"""
+        return cls(
+            lease_seconds=int(os.getenv('SINGLE_FLIGHT_LEASE', cls.lease_seconds)),
+            result_ttl=int(os.getenv('SINGLE_FLIGHT_RESULT_TTL', cls.result_ttl)),
+            wait_timeout=float(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', cls.wait_timeout)),
+            follower_recheck=float(os.getenv('SINGLE_FLIGHT_FOLLOWER_RECHECK', cls.follower_recheck))
+        )
+
+
+class SingleFlightError(Exception):
+    """领导者执行失败"""
+    pass
+
+
+# 加入单飞组：已有结果直接返回；无领导者时成为领导者（同一成员可重入）；
+# 否则登记为跟随者，带续作上下文的跟随者同时登记到待检查集合。
+# 跟随者列表比领导者锁多保留一段宽限期，锁过期后仍能被周期任务取回
+_JOIN_SCRIPT = """
+local result = redis.call('GET', KEYS[2])
+if result then
+    return {'result', result}
+end
+local holder = redis.call('GET', KEYS[1])
+if (not holder) or holder == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+    return {'leader', ARGV[1]}
+end
+if ARGV[3] ~= '' then
+    redis.call('RPUSH', KEYS[3], ARGV[3])
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+    redis.call('ZADD', KEYS[4], 'NX', ARGV[6], ARGV[5])
+end
+return {'follower', holder}
+"""
+
+# 发布结果：写入结果、取出并清空跟随者列表、释放领导者锁并通知同步等待者
+_COMPLETE_SCRIPT = """
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+local waiters = redis.call('LRANGE', KEYS[3], 0, -1)
+redis.call('DEL', KEYS[1], KEYS[3])
+redis.call('ZREM', KEYS[4], ARGV[4])
+redis.call('PUBLISH', ARGV[3], ARGV[1])
+return waiters
+"""
+
+# 领导者失败：不缓存错误，释放锁并交还跟随者，只通知正在同步等待的调用方
+_FAIL_SCRIPT = """
+local waiters = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[1], KEYS[2])
+redis.call('ZREM', KEYS[3], ARGV[3])
+redis.call('PUBLISH', ARGV[2], ARGV[1])
+return waiters
+"""
+
+# 检查挂起的跟随者：领导者仍持有锁时推迟下次检查；锁已过期（领导者崩溃或租约到期）时取出跟随者
+_RECLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('ZADD', KEYS[3], ARGV[2], ARGV[1])
+    return {}
+end
+local waiters = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return waiters
+"""
+
+
+class SingleFlight:
+    """基于Redis的单飞锁"""
+
+    LEADER = 'leader'
+    FOLLOWER = 'follower'
+    RESULT = 'result'
+
+    def __init__(self, redis_client, namespace: str = 'singleflight',
+                 config: Optional[SingleFlightConfig] = None):
+        self.redis = redis_client
+        self.namespace = namespace
+        self.config = config or SingleFlightConfig.from_env()
+        self.logger = logging.getLogger(__name__)
+        self.parked_key = f"{namespace}:parked"
+        self._join = self.redis.register_script(_JOIN_SCRIPT)
+        self._complete = self.redis.register_script(_COMPLETE_SCRIPT)
+        self._fail = self.redis.register_script(_FAIL_SCRIPT)
+        self._reclaim = self.redis.register_script(_RECLAIM_SCRIPT)
+
+    def _keys(self, key: str) -> Tuple[str, str, str]:
+        base = f"{self.namespace}:{key}"
+        return f"{base}:lock", f"{base}:result", f"{base}:waiters"
+
+    def _channel(self, key: str) -> str:
+        return f"{self.namespace}:{key}:done"
+
+    def join(self, key: str, member: str, waiter: Optional[Dict[str, Any]] = None) -> Tuple[str, Any]:
+        """
+        加入单飞组
+
+        Args:
+            key: 请求合并键
+            member: 调用方标识，同一标识重复加入时仍是领导者（用于重试）
+            waiter: 跟随者的续作上下文，领导者完成或失败时一并返回；
+                    领导者失去租约时由 reclaim_orphans 交还
+
+        Returns:
+            Tuple[str, Any]: (角色, 数据)。角色为result时数据是已完成的结果，
+                             leader/follower时数据是当前领导者标识
+        """
+        role, payload = self._join(
+            keys=[*self._keys(key), self.parked_key],
+            args=[
+                member,
+                self.config.lease_seconds,
+                json.dumps(waiter, ensure_ascii=False) if waiter else '',
+                self._waiters_ttl(),
+                key,
+                time.time() + self.config.follower_recheck
+            ]
+        )
+        role = role.decode() if isinstance(role, bytes) else role
+        if role == self.RESULT:
+            return role, json.loads(payload)
+        return role, payload.decode() if isinstance(payload, bytes) else payload
+
+    def complete(self, key: str, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        领导者发布结果并释放锁
+
+        Returns:
+            List[Dict[str, Any]]: 需要续作的跟随者上下文
+        """
+        waiters = self._complete(
+            keys=[*self._keys(key), self.parked_key],
+            args=[json.dumps(result, ensure_ascii=False), self.config.result_ttl, self._channel(key), key]
+        )
+        return [json.loads(w) for w in waiters]
+
+    def fail(self, key: str, error_message: str) -> List[Dict[str, Any]]:
+        """
+        领导者失败：释放锁并交还跟随者，错误只通知正在同步等待的调用方，不作为结果缓存
+
+        Returns:
+            List[Dict[str, Any]]: 挂起的跟随者上下文，由调用方决定如何处理
+        """
+        lock_key, _, waiters_key = self._keys(key)
+        waiters = self._fail(
+            keys=[lock_key, waiters_key, self.parked_key],
+            args=[json.dumps({'error': error_message}, ensure_ascii=False), self._channel(key), key]
+        )
+        return [json.loads(w) for w in waiters]
+
+    def reclaim_orphans(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        取回失去领导者的跟随者（由周期任务调用）
+
+        到期检查的合并键中，领导者仍持有锁的推迟到下次检查；锁已过期且没有发布结果的，
+        取出其跟随者交给调用方重新派发，其中第一个重新加入的成为新的领导者
+
+        Args:
+            now: 当前时间戳，默认取当前时间
+
+        Returns:
+            List[Dict[str, Any]]: 需要重新派发的跟随者上下文
+        """
+        now = now if now is not None else time.time()
+        orphans = []
+        for raw in self.redis.zrangebyscore(self.parked_key, '-inf', now):
+            key = raw.decode() if isinstance(raw, bytes) else raw
+            lock_key, _, waiters_key = self._keys(key)
+            waiters = self._reclaim(
+                keys=[lock_key, waiters_key, self.parked_key],
+                args=[key, now + self.config.follower_recheck]
+            )
+            orphans.extend(json.loads(w) for w in waiters)
+        if orphans:
+            self.logger.warning(f"领导者失去租约，交还{len(orphans)}个挂起的跟随者")
+        return orphans
+
+    def _waiters_ttl(self) -> int:
+        # 跟随者列表多保留两个检查间隔，锁过期后周期任务仍能取回
+        return self.config.lease_seconds + int(self.config.follower_recheck * 2)
+
+    def do(self, key: str, fn: Callable[[], Any],
+           encode: Callable[[Any], Dict[str, Any]],
+           decode: Callable[[Dict[str, Any]], Any]) -> Any:
+        """
+        同步执行：领导者调用fn，跟随者阻塞等待领导者的结果
+
+        Redis不可用时直接调用fn，不影响生成本身。
+
+        Args:
+            key: 请求合并键
+            fn: 实际执行的调用
+            encode: 把fn的返回值编码为可JSON序列化的字典
+            decode: 把结果字典还原为返回值
+
+        Returns:
+            Any: fn的返回值或领导者的结果
+        """
+        member = uuid.uuid4().hex
+        try:
+            role, payload = self.join(key, member)
+        except redis.exceptions.RedisError as e:
+            self.logger.warning(f"单飞锁不可用，直接执行: {e}")
+            return fn()
+
+        if role == self.RESULT:
+            return self._decode_result(payload, decode)
+
+        if role == self.LEADER:
+            return self._lead(key, fn, encode)
+
+        return self._follow(key, member, fn, encode, decode)
+
+    def _lead(self, key: str, fn: Callable[[], Any], encode: Callable[[Any], Dict[str, Any]]) -> Any:
+        try:
+            value = fn()
+        except Exception as e:
+            self.fail(key, str(e))
+            raise
+        self.complete(key, encode(value))
+        return value
+
+    def _follow(self, key: str, member: str, fn: Callable[[], Any],
+                encode: Callable[[Any], Dict[str, Any]],
+                decode: Callable[[Dict[str, Any]], Any]) -> Any:
+        lock_key, result_key, _ = self._keys(key)
+        deadline = time.time() + self.config.wait_timeout
+
+        # 先订阅再检查结果，避免错过领导者在两步之间发布的通知
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self._channel(key))
+        try:
+            while time.time() < deadline:
+                raw = self.redis.get(result_key)
+                if raw is not None:
+                    return self._decode_result(json.loads(raw), decode)
+
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    return self._decode_result(json.loads(message['data']), decode)
+
+                if not self.redis.exists(lock_key):
+                    # 领导者租约过期且没有结果，重新竞争领导权
+                    role, payload = self.join(key, member)
+                    if role == self.RESULT:
+                        return self._decode_result(payload, decode)
+                    if role == self.LEADER:
+                        return self._lead(key, fn, encode)
+        finally:
+            pubsub.close()
+
+        self.logger.warning(f"等待单飞结果超时，自行执行: {key}")
+        return fn()
+
+    @staticmethod
+    def _decode_result(payload: Dict[str, Any], decode: Callable[[Dict[str, Any]], Any]) -> Any:
+        if 'error' in payload and len(payload) == 1:
+            raise SingleFlightError(payload['error'])
+        return decode(payload)
+
+
+# 导出主要类
+__all__ = [
+    'SingleFlight',
+    'SingleFlightConfig',
+    'SingleFlightError'
+]
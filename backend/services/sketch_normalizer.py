@@ -0,0 +1,194 @@
+"""
+华图儿AI创意绘画应用 - 草图预处理
+提交百炼前把草图缩放到模型工作分辨率，去除透明通道，线稿转为1位或灰度图，并以PNG最优压缩重新编码
+"""
+
+import io
+import os
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, Tuple
+
+from PIL import Image, ImageChops, ImageOps
+
+
+@dataclass
+class NormalizeConfig:
+    """草图预处理配置"""
+    max_width: int = 1024            # 模型工作分辨率
+    max_height: int = 1024
+    line_art_ratio: float = 0.97     # 接近纯黑/纯白的像素占比达到该值时视为线稿，转为1位图
+    color_ratio: float = 0.01        # 彩色像素占比超过该值时保留彩色
+    bilevel_threshold: int = 128     # 线稿二值化阈值
+
+    @classmethod
+    def from_size(cls, size: str) -> 'NormalizeConfig':
+        """
+        按模型尺寸参数（如 "1024*1024"）创建配置，阈值从环境变量读取
+
+        Args:
+            size: 百炼接口的size参数
+        """
+        width, height = (int(v) for v in size.split('*'))
+        return cls(
+            max_width=width,
+            max_height=height,
+            line_art_ratio=float(os.getenv('SKETCH_LINE_ART_RATIO', cls.line_art_ratio)),
+            color_ratio=float(os.getenv('SKETCH_COLOR_RATIO', cls.color_ratio)),
+            bilevel_threshold=int(os.getenv('SKETCH_BILEVEL_THRESHOLD', cls.bilevel_threshold))
+        )
+
+
+@dataclass
+class NormalizedSketch:
+    """预处理结果"""
+    data: bytes
+    width: int
+    height: int
+    mode: str                 # 1（线稿）、L（灰度）、P（调色板）或 RGB
+    original_bytes: int
+    original_size: Tuple[int, int]
+
+    @property
+    def normalized_bytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.normalized_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        """记录到任务上下文的摘要（不含图片数据）"""
+        return {
+            'width': self.width,
+            'height': self.height,
+            'mode': self.mode,
+            'original_width': self.original_size[0],
+            'original_height': self.original_size[1],
+            'original_bytes': self.original_bytes,
+            'normalized_bytes': self.normalized_bytes
+        }
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """透明区域铺白底，避免被模型当作黑色背景"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, rgba).convert('RGB')
+    return image.convert('RGB')
+
+
+def _color_fraction(rgb: Image.Image) -> float:
+    """饱和度和明度都明显的像素占比"""
+    _, saturation, value = rgb.convert('HSV').split()
+    colored = ImageChops.multiply(
+        saturation.point(lambda v: 255 if v > 48 else 0),
+        value.point(lambda v: 255 if v > 48 else 0)
+    )
+    return colored.histogram()[255] / (rgb.width * rgb.height)
+
+
+def _encode_png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def normalize_sketch(raw: bytes, config: NormalizeConfig) -> NormalizedSketch:
+    """
+    预处理草图
+
+    Args:
+        raw: 上传的草图原始字节
+        config: 预处理配置
+
+    Returns:
+        NormalizedSketch: 预处理后的PNG及尺寸、体积信息
+    """
+    image = Image.open(io.BytesIO(raw))
+    original_size = image.size
+    source_format = image.format
+    target = (config.max_width, config.max_height)
+
+    # JPEG可以直接按缩小后的尺寸解码
+    if source_format == 'JPEG':
+        image.draft('RGB', target)
+
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    rgb = _flatten(image)
+
+    resized = rgb.width > config.max_width or rgb.height > config.max_height
+    if resized:
+        rgb.thumbnail(target, Image.LANCZOS)
+
+    if _color_fraction(rgb) > config.color_ratio:
+        # 彩色草图：颜色不超过256种时无损转为调色板图
+        normalized = rgb.convert('P', palette=Image.ADAPTIVE, colors=256) if rgb.getcolors(256) else rgb
+    else:
+        gray = rgb.convert('L')
+        histogram = gray.histogram()
+        extremes = sum(histogram[:64]) + sum(histogram[192:])
+        if extremes / (gray.width * gray.height) >= config.line_art_ratio:
+            threshold = config.bilevel_threshold
+            normalized = gray.point(lambda v: 255 if v >= threshold else 0, mode='1')
+        else:
+            normalized = gray
+
+    data = _encode_png(normalized)
+
+    # 原图已是尺寸合适、无透明通道的PNG且更小时保留原图
+    if source_format == 'PNG' and not resized and not has_alpha and len(raw) <= len(data):
+        data = raw
+
+    return NormalizedSketch(
+        data=data,
+        width=normalized.width,
+        height=normalized.height,
+        mode=normalized.mode,
+        original_bytes=len(raw),
+        original_size=original_size
+    )
+
+
+class NormalizationStats:
+    """草图预处理体积统计（所有进程共享）"""
+
+    STATS_KEY = 'sketch:normalize:stats'
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self.logger = logging.getLogger(__name__)
+
+    def record(self, result: NormalizedSketch):
+        """累计一次预处理的前后体积"""
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(self.STATS_KEY, 'sketches', 1)
+        pipe.hincrby(self.STATS_KEY, 'original_bytes', result.original_bytes)
+        pipe.hincrby(self.STATS_KEY, 'normalized_bytes', result.normalized_bytes)
+        pipe.execute()
+
+    def stats(self) -> Dict[str, Any]:
+        """累计体积与压缩比"""
+        counters = {
+            k.decode() if isinstance(k, bytes) else k: int(v)
+            for k, v in self.redis.hgetall(self.STATS_KEY).items()
+        }
+        original = counters.get('original_bytes', 0)
+        normalized = counters.get('normalized_bytes', 0)
+        return {
+            'sketches': counters.get('sketches', 0),
+            'original_bytes': original,
+            'normalized_bytes': normalized,
+            'saved_ratio': round(1 - normalized / original, 4) if original else 0.0
+        }
+
+
+# 导出主要类和函数
+__all__ = [
+    'NormalizeConfig',
+    'NormalizedSketch',
+    'NormalizationStats',
+    'normalize_sketch'
+]
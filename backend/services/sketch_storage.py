@@ -0,0 +1,282 @@
+"""
+华图儿AI创意绘画应用 - 草图存储
+流式解析multipart上传，边读边校验大小与图片类型、计算内容哈希，并把分块直接写入存储，
+Web进程的内存占用与草图大小无关
+"""
+
+import os
+import uuid
+import hashlib
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from .http_transport import HTTPTransport, get_transport
+
+
+@dataclass
+class StorageConfig:
+    """草图存储配置"""
+    backend: str = 'supabase'           # supabase 或 local（本地文件系统替身）
+    bucket: str = 'sketches'
+    local_dir: str = os.path.join(tempfile.gettempdir(), 'huatuer', 'sketches')
+    max_bytes: int = 10 * 1024 * 1024   # 单个草图大小上限
+    chunk_size: int = 64 * 1024         # 读取请求体的分块大小
+    upload_timeout: float = 120.0       # 写入存储的读取超时（秒）
+
+    @classmethod
+    def from_env(cls) -> 'StorageConfig':
+        """从环境变量读取配置"""
+        return cls(
+            backend=os.getenv('SKETCH_STORAGE_BACKEND', cls.backend),
+            bucket=os.getenv('SKETCH_STORAGE_BUCKET', cls.bucket),
+            local_dir=os.getenv('SKETCH_LOCAL_DIR', cls.local_dir),
+            max_bytes=int(os.getenv('SKETCH_MAX_BYTES', cls.max_bytes)),
+            chunk_size=int(os.getenv('SKETCH_UPLOAD_CHUNK', cls.chunk_size)),
+            upload_timeout=float(os.getenv('SKETCH_UPLOAD_TIMEOUT', cls.upload_timeout))
+        )
+
+
+class SketchUploadError(Exception):
+    """上传被拒绝"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# 按文件头识别图片类型，不信任客户端声明的Content-Type和扩展名
+_IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+)
+
+# 识别类型所需的文件头长度（WEBP需要前12字节）
+_SNIFF_BYTES = 12
+
+
+def sniff_image_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """
+    根据文件头识别图片类型
+
+    Args:
+        head: 文件开头的字节
+
+    Returns:
+        Optional[Tuple[str, str]]: (Content-Type, 扩展名)，不支持的类型返回None
+    """
+    for signature, content_type, extension in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type, extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    return None
+
+
+def iter_multipart_file(stream, boundary: bytes, field_name: str = 'file',
+                        chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    从multipart请求体中流式取出指定文件字段的内容
+
+    Args:
+        stream: 请求体流（如 request.stream）
+        boundary: multipart分隔符
+        field_name: 文件字段名
+        chunk_size: 每次读取的字节数
+
+    Yields:
+        bytes: 文件内容分块
+    """
+    # 每次读取后都会取空事件，缓冲区只在单个分块内增长；超长的分段头视为异常请求
+    decoder = MultipartDecoder(boundary, max_form_memory_size=chunk_size * 2)
+    in_file = False
+
+    while True:
+        chunk = stream.read(chunk_size)
+        try:
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, File):
+                    in_file = event.name == field_name
+                elif isinstance(event, Field):
+                    in_file = False
+                elif isinstance(event, Data) and in_file:
+                    if event.data:
+                        yield event.data
+                    if not event.more_data:
+                        return
+                elif isinstance(event, Epilogue):
+                    raise SketchUploadError(f"缺少文件字段: {field_name}")
+                event = decoder.next_event()
+        except (ValueError, RequestEntityTooLarge) as e:
+            raise SketchUploadError(f"multipart请求格式错误: {e}") from e
+
+        if not chunk:
+            raise SketchUploadError("上传数据不完整")
+
+
+class SketchStream:
+    """
+    边读边校验的草图分块流
+
+    构造时只预读识别类型所需的文件头，之后每个分块在交给存储前累计大小、更新哈希，
+    超过上限立即中断上传。
+    """
+
+    def __init__(self, chunks: Iterable[bytes], max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._chunks = iter(chunks)
+
+        # 预读文件头，分块较小时可能需要读取多块
+        self._head = b''
+        for chunk in self._chunks:
+            self._head += chunk
+            if len(self._head) >= _SNIFF_BYTES:
+                break
+
+        if not self._head:
+            raise SketchUploadError("上传的文件为空")
+
+        detected = sniff_image_type(self._head)
+        if detected is None:
+            raise SketchUploadError("仅支持PNG、JPEG或WEBP格式的草图", status_code=415)
+        self.content_type, self.extension = detected
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._accept(self._head)
+        self._head = b''
+        for chunk in self._chunks:
+            yield self._accept(chunk)
+
+    def _accept(self, chunk: bytes) -> bytes:
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise SketchUploadError(f"草图超过大小上限 {self.max_bytes} 字节", status_code=413)
+        self._hash.update(chunk)
+        return chunk
+
+    @property
+    def sha256(self) -> str:
+        """内容哈希（整个流读完后才是完整文件的哈希）"""
+        return self._hash.hexdigest()
+
+
+class LocalSketchStorage:
+    """本地文件系统草图存储（开发与测试用的替身）"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _resolve(self, path: str) -> str:
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if not full_path.startswith(self.root + os.sep):
+            raise SketchUploadError(f"非法的草图路径: {path}")
+        return full_path
+
+    def save(self, path: str, chunks: Iterable[bytes], content_type: str):
+        """
+        分块写入草图，写完后原子替换，失败时不留下半截文件
+
+        Args:
+            path: 存储路径
+            chunks: 文件内容分块
+            content_type: 文件类型
+        """
+        full_path = self._resolve(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        temp_path = f"{full_path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def read(self, path: str) -> bytes:
+        """读取草图内容"""
+        with open(self._resolve(path), 'rb') as f:
+            return f.read()
+
+
+class SupabaseSketchStorage:
+    """Supabase Storage草图存储，分块以chunked编码直接转发给存储服务"""
+
+    def __init__(self, supabase_url: str, service_key: str, bucket: str = 'sketches',
+                 transport: Optional[HTTPTransport] = None, upload_timeout: float = 120.0):
+        self.base_url = f"{supabase_url.rstrip('/')}/storage/v1/object/{bucket}"
+        self.headers = {
+            'Authorization': f'Bearer {service_key}',
+            'apikey': service_key
+        }
+        self.transport = transport or get_transport()
+        self.upload_timeout = upload_timeout
+        self.logger = logging.getLogger(__name__)
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/{quote(path)}"
+
+    def save(self, path: str, chunks: Iterable[bytes], content_type: str):
+        """
+        流式上传草图
+
+        Args:
+            path: 存储路径
+            chunks: 文件内容分块，校验失败时中途抛出的异常会中断上传
+            content_type: 文件类型
+        """
+        response = self.transport.post(
+            self._url(path),
+            headers={**self.headers, 'Content-Type': content_type, 'x-upsert': 'false'},
+            data=iter(chunks),
+            read_timeout=self.upload_timeout
+        )
+        if response.status_code >= 400:
+            raise Exception(f"草图上传失败: {response.status_code} - {response.text}")
+
+    def read(self, path: str) -> bytes:
+        """读取草图内容"""
+        response = self.transport.get(self._url(path), headers=self.headers, read_timeout=self.upload_timeout)
+        if response.status_code >= 400:
+            raise Exception(f"草图下载失败: {response.status_code} - {response.text}")
+        return response.content
+
+
+def create_sketch_storage(config: StorageConfig, supabase_url: str, service_key: str):
+    """
+    按配置创建草图存储
+
+    Args:
+        config: 存储配置
+        supabase_url: Supabase地址
+        service_key: Supabase服务端密钥
+
+    Returns:
+        LocalSketchStorage | SupabaseSketchStorage: 草图存储
+    """
+    if config.backend == 'local':
+        return LocalSketchStorage(config.local_dir)
+    return SupabaseSketchStorage(supabase_url, service_key, config.bucket, upload_timeout=config.upload_timeout)
+
+
+# 导出主要类和函数
+__all__ = [
+    'StorageConfig',
+    'SketchUploadError',
+    'SketchStream',
+    'LocalSketchStorage',
+    'SupabaseSketchStorage',
+    'create_sketch_storage',
+    'iter_multipart_file',
+    'sniff_image_type'
+]
@@ -0,0 +1,252 @@
+"""
+华图儿AI创意绘画应用 - 百炼异步任务轮询服务
+在Redis中登记所有进行中的百炼任务，按批轮询并把结果交回创作流水线
+"""
+
+import os
+import json
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, Any, List, Optional
+
+from .ai_service import AIGenerationResult, TaskStatus
+
+
+@dataclass
+class PollerConfig:
+    """轮询配置"""
+    batch_size: int = 50                # 每批最多轮询的任务数
+    concurrency: int = 8                # 批内并发查询数
+    image_interval: float = 3.0         # 图片任务首次轮询间隔（秒）
+    video_interval: float = 10.0        # 视频任务首次轮询间隔（秒）
+    max_interval: float = 30.0          # 轮询间隔上限（秒）
+    backoff_factor: float = 1.5         # 无进展时的间隔增长系数
+    lease_seconds: float = 60.0         # 认领后其他轮询进程不可见的时长（秒）
+    task_timeout: float = 900.0         # 单个百炼任务的最长等待时间（秒）
+
+    @classmethod
+    def from_env(cls) -> 'PollerConfig':
+        """从环境变量读取配置"""
+        return cls(
+            batch_size=int(os.getenv('DASHSCOPE_POLL_BATCH_SIZE', cls.batch_size)),
+            concurrency=int(os.getenv('DASHSCOPE_POLL_CONCURRENCY', cls.concurrency)),
+            image_interval=float(os.getenv('DASHSCOPE_POLL_IMAGE_INTERVAL', cls.image_interval)),
+            video_interval=float(os.getenv('DASHSCOPE_POLL_VIDEO_INTERVAL', cls.video_interval)),
+            max_interval=float(os.getenv('DASHSCOPE_POLL_MAX_INTERVAL', cls.max_interval)),
+            backoff_factor=float(os.getenv('DASHSCOPE_POLL_BACKOFF', cls.backoff_factor)),
+            lease_seconds=float(os.getenv('DASHSCOPE_POLL_LEASE', cls.lease_seconds)),
+            task_timeout=float(os.getenv('DASHSCOPE_POLL_TIMEOUT', cls.task_timeout))
+        )
+
+
+@dataclass
+class PollEntry:
+    """进行中的百炼任务"""
+    dashscope_task_id: str
+    kind: str                           # image / video
+    callback: Dict[str, Any]            # 完成后交回流水线的上下文
+    interval: float
+    submitted_at: float
+    deadline: float
+    attempts: int = 0
+    last_progress: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, json_str: str) -> 'PollEntry':
+        return cls(**json.loads(json_str))
+
+
+# 原子地认领到期任务：取出到期成员并把分数推迟到租约结束，避免多个轮询进程重复查询
+_CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[1], ARGV[3], id)
+end
+return ids
+"""
+
+
+class DashScopeTaskPoller:
+    """百炼异步任务批量轮询器"""
+
+    DUE_KEY = 'dashscope:poll:due'
+    ENTRIES_KEY = 'dashscope:poll:entries'
+
+    def __init__(self,
+                 redis_client,
+                 fetch_status: Callable[[str], AIGenerationResult],
+                 on_complete: Callable[[PollEntry, AIGenerationResult], None],
+                 config: Optional[PollerConfig] = None):
+        """
+        Args:
+            redis_client: Redis客户端
+            fetch_status: 查询单个百炼任务状态的函数
+            on_complete: 任务结束（成功、失败或超时）时的回调
+            config: 轮询配置
+        """
+        self.redis = redis_client
+        self.fetch_status = fetch_status
+        self.on_complete = on_complete
+        self.config = config or PollerConfig.from_env()
+        self.logger = logging.getLogger(__name__)
+        self._claim = self.redis.register_script(_CLAIM_SCRIPT)
+
+    def track(self, dashscope_task_id: str, kind: str, callback: Dict[str, Any]) -> PollEntry:
+        """
+        登记一个进行中的百炼任务
+
+        Args:
+            dashscope_task_id: 百炼任务ID
+            kind: 任务类型 image / video
+            callback: 完成后交回流水线的上下文（需可JSON序列化）
+
+        Returns:
+            PollEntry: 登记的任务
+        """
+        now = time.time()
+        interval = self.config.video_interval if kind == 'video' else self.config.image_interval
+        entry = PollEntry(
+            dashscope_task_id=dashscope_task_id,
+            kind=kind,
+            callback=callback,
+            interval=interval,
+            submitted_at=now,
+            deadline=now + self.config.task_timeout
+        )
+
+        pipe = self.redis.pipeline()
+        pipe.hset(self.ENTRIES_KEY, dashscope_task_id, entry.to_json())
+        pipe.zadd(self.DUE_KEY, {dashscope_task_id: now + interval})
+        pipe.execute()
+        return entry
+
+    def pending_count(self) -> int:
+        """进行中的任务数"""
+        return self.redis.zcard(self.DUE_KEY)
+
+    def poll_due(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        轮询一批到期任务
+
+        Returns:
+            Dict[str, int]: 本批的完成、失败、继续等待数量
+        """
+        now = now or time.time()
+        counts = {'polled': 0, 'completed': 0, 'failed': 0, 'waiting': 0}
+
+        ids = self._claim(
+            keys=[self.DUE_KEY],
+            args=[now, self.config.batch_size, now + self.config.lease_seconds]
+        )
+        if not ids:
+            return counts
+
+        ids = [i.decode() if isinstance(i, bytes) else i for i in ids]
+        raw_entries = self.redis.hmget(self.ENTRIES_KEY, ids)
+
+        entries = []
+        for task_id, raw in zip(ids, raw_entries):
+            if raw is None:
+                # 条目已被删除，清理残留的调度记录
+                self.redis.zrem(self.DUE_KEY, task_id)
+                continue
+            entries.append(PollEntry.from_json(raw))
+
+        if not entries:
+            return counts
+
+        workers = max(1, min(self.config.concurrency, len(entries)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(self._safe_fetch, [e.dashscope_task_id for e in entries]))
+
+        for entry, result in zip(entries, results):
+            counts['polled'] += 1
+            outcome = self._handle_result(entry, result, now)
+            counts[outcome] += 1
+
+        return counts
+
+    def run(self, max_seconds: float) -> Dict[str, int]:
+        """在限定时间内连续处理到期批次，供周期任务调用"""
+        started = time.time()
+        totals = {'polled': 0, 'completed': 0, 'failed': 0, 'waiting': 0}
+        while time.time() - started < max_seconds:
+            counts = self.poll_due()
+            for key, value in counts.items():
+                totals[key] += value
+            if counts['polled'] < self.config.batch_size:
+                break
+        return totals
+
+    def _safe_fetch(self, dashscope_task_id: str) -> AIGenerationResult:
+        try:
+            return self.fetch_status(dashscope_task_id)
+        except Exception as e:
+            return AIGenerationResult(success=False, error_message=f"状态查询异常: {str(e)}")
+
+    def _handle_result(self, entry: PollEntry, result: AIGenerationResult, now: float) -> str:
+        entry.attempts += 1
+
+        if result.status in (TaskStatus.SUCCESS, TaskStatus.FAILED):
+            return self._finish(entry, result)
+
+        if result.status is None:
+            # 查询本身失败（网络或限流），继续退避重试直到超时
+            entry.errors = (entry.errors + [result.error_message or ''])[-3:]
+
+        if now >= entry.deadline:
+            timeout_result = AIGenerationResult(
+                success=False,
+                task_id=entry.dashscope_task_id,
+                error_message=f"百炼任务超时: 已等待{int(now - entry.submitted_at)}秒",
+                status=TaskStatus.FAILED
+            )
+            return self._finish(entry, timeout_result)
+
+        self._reschedule(entry, result, now)
+        return 'waiting'
+
+    def _reschedule(self, entry: PollEntry, result: AIGenerationResult, now: float):
+        # 有进展时保持当前间隔，否则指数退避
+        if result.progress > entry.last_progress:
+            entry.last_progress = result.progress
+        else:
+            entry.interval = min(entry.interval * self.config.backoff_factor, self.config.max_interval)
+
+        # 加入抖动，打散同一时刻提交的任务
+        delay = entry.interval * random.uniform(0.9, 1.1)
+        next_poll = min(now + delay, entry.deadline)
+
+        pipe = self.redis.pipeline()
+        pipe.hset(self.ENTRIES_KEY, entry.dashscope_task_id, entry.to_json())
+        pipe.zadd(self.DUE_KEY, {entry.dashscope_task_id: next_poll})
+        pipe.execute()
+
+    def _finish(self, entry: PollEntry, result: AIGenerationResult) -> str:
+        try:
+            self.on_complete(entry, result)
+        except Exception as e:
+            # 交回失败时保留条目，租约到期后会被重新认领
+            self.logger.error(f"百炼任务 {entry.dashscope_task_id} 结果交回失败: {e}")
+            return 'waiting'
+
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.DUE_KEY, entry.dashscope_task_id)
+        pipe.hdel(self.ENTRIES_KEY, entry.dashscope_task_id)
+        pipe.execute()
+        return 'completed' if result.success else 'failed'
+
+
+# 导出主要类
+__all__ = [
+    'DashScopeTaskPoller',
+    'PollEntry',
+    'PollerConfig'
+]
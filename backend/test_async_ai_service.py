@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 异步AI服务测试脚本
+在本地启动一个模拟百炼接口的桩服务，不访问真实API
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.ai_service import TaskStatus
+from backend.services.async_ai_service import AsyncClientConfig, AsyncDashScopeAIService
+
+
+class _StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.sketches = []
+        self.polls = {}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    state: _StubState = None
+
+    def _reply(self, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        state = self.state
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with state.lock:
+            state.in_flight += 1
+            state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            state.sketches.append(body['input']['sketch'])
+            task_id = f"task-{len(state.sketches)}"
+        time.sleep(0.05)
+        with state.lock:
+            state.in_flight -= 1
+        self._reply({'output': {'task_id': task_id, 'task_status': 'PENDING'}})
+
+    def do_GET(self):
+        task_id = self.path.rsplit('/', 1)[-1]
+        with self.state.lock:
+            count = self.state.polls[task_id] = self.state.polls.get(task_id, 0) + 1
+        if count < 3:
+            self._reply({'output': {'task_id': task_id, 'task_status': 'RUNNING'}, 'task_metrics': {'progress': count * 30}})
+        else:
+            self._reply({'output': {'task_id': task_id, 'task_status': 'SUCCEEDED',
+                                    'results': [{'url': f'https://example.com/{task_id}.png'}]}})
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub():
+    state = _StubState()
+    handler = type('Handler', (_StubHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def test_async_service_against_stub():
+    """测试异步提交受并发上限约束，并通过wait_for_result取得结果"""
+    print("⚡ 测试异步AI服务...")
+    server, state = _start_stub()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    sketch = b'\x89PNG\r\n\x1a\n' + os.urandom(4096)
+
+    async def scenario():
+        config = AsyncClientConfig(max_concurrency=3)
+        async with AsyncDashScopeAIService('sk-test', config=config, base_url=base_url) as service:
+            submitted = await asyncio.gather(*[
+                service.sketch_to_image(sketch, prompt=f"作品{i}") for i in range(10)
+            ])
+            assert all(r.success and r.task_id for r in submitted)
+
+            return await service.wait_for_result(submitted[0].task_id, interval=0.01)
+
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        server.shutdown()
+
+    print(f"   最大并发: {state.max_in_flight}, 结果: {result.image_url}")
+    assert state.max_in_flight <= 3
+    assert base64.b64decode(state.sketches[0].split(',', 1)[1]) == sketch
+    assert result.status == TaskStatus.SUCCESS
+    assert result.image_url == f'https://example.com/{result.task_id}.png'
+    assert state.polls[result.task_id] == 3
+
+
+if __name__ == "__main__":
+    test_async_service_against_stub()
+    print("✅ 异步AI服务测试完成")
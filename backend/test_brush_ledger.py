@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 画笔账本测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.brush_ledger import BrushLedger
+
+
+class _FakeUsersDB:
+    """只实现账本用到的查询：users表按id读取余额、apply_brush_deltas落库"""
+
+    def __init__(self, balances):
+        self.balances = balances
+        self._filter = None
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self._filter = [value]
+        return self
+
+    def in_(self, column, values):
+        self._filter = list(values)
+        return self
+
+    def rpc(self, name, params):
+        for item in params['p_deltas']:
+            self.balances[item['user_id']] = max(self.balances[item['user_id']] + item['delta'], 0)
+        self._filter = [item['user_id'] for item in params['p_deltas']]
+        return self
+
+    def execute(self):
+        rows = [{'id': user_id, 'brush_count': self.balances[user_id]}
+                for user_id in self._filter if user_id in self.balances]
+        return SimpleNamespace(data=rows)
+
+
+def _ledger(client, namespace: str) -> BrushLedger:
+    # 余额镜像已加载时预留、确认和释放都不访问数据库
+    ledger = BrushLedger(None, client, namespace=namespace)
+    client.set(ledger._balance_key('user-1'), 3)
+    return ledger
+
+
+def test_reserve_commit_release(redis_client, redis_namespace):
+    """测试预留扣减余额，失败释放退回，完成确认记为待落库增量"""
+    print("🖌️ 测试画笔账本...")
+    client = redis_client
+    ledger = _ledger(client, redis_namespace)
+
+    assert ledger.reserve('user-1', ['task-1'])
+    assert ledger.reserve('user-1', ['task-1'])  # 同一任务不重复预留
+    assert ledger.reserve('user-1', ['task-2'])
+    assert ledger.balance('user-1') == 1
+
+    assert ledger.release('task-2') == 1
+    assert ledger.balance('user-1') == 2
+
+    assert ledger.commit('task-1') == 1
+    assert ledger.commit('task-1') == 0  # 重复确认只扣一次
+    assert ledger.balance('user-1') == 2
+    assert int(client.hget(ledger.deltas_key, 'user-1')) == -1
+    assert not client.hexists(ledger.reserved_key, 'user-1')
+    print(f"   统计: {ledger.stats()}")
+
+
+def test_batch_reservation_is_all_or_nothing(redis_client, redis_namespace):
+    """测试余额不够整批时一个都不预留"""
+    ledger = _ledger(redis_client, redis_namespace)
+
+    assert not ledger.reserve('user-1', ['a', 'b', 'c', 'd'])
+    assert ledger.balance('user-1') == 3
+    assert ledger.stats()['reservations'] == 0
+    assert ledger.stats()['rejected'] == 1
+
+    assert ledger.reserve('user-1', ['a', 'b', 'c'])
+    assert ledger.balance('user-1') == 0
+    assert not ledger.reserve('user-1', ['d'])
+
+
+def test_flush_reconciles_balance_changed_outside_ledger(redis_client, redis_namespace):
+    """测试在数据库中直接充值后，周期落库校准镜像，下次预留成功"""
+    print("🖌️ 测试余额镜像校准...")
+    db = _FakeUsersDB({'user-1': 1, 'user-2': 0})
+    ledger = BrushLedger(db, redis_client, namespace=redis_namespace)
+
+    assert ledger.reserve('user-1', ['task-1'])
+    assert ledger.commit('task-1') == 1
+    assert ledger.flush() == 1
+    assert db.balances['user-1'] == 0
+    assert not ledger.reserve('user-1', ['task-2'])
+    assert not ledger.reserve('user-2', ['task-3'])
+
+    # 后台直接在数据库中充值，账本中没有这两个用户的待落库增量
+    db.balances['user-1'] = 5
+    db.balances['user-2'] = 2
+    assert ledger.flush() == 0
+    assert ledger.balance('user-1') == 5
+    assert ledger.balance('user-2') == 2
+    assert ledger.reserve('user-1', ['task-4'])
+    assert ledger.reserve('user-2', ['task-5'])
+    assert ledger.balance('user-1') == 4
+
+    # 进行中的预留在校准时仍从余额中扣除
+    assert ledger.reconcile() == 2
+    assert ledger.balance('user-1') == 4 and ledger.balance('user-2') == 1
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 流水线检查点测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.checkpoints import StageCheckpoints
+
+
+STAGES = ['download', 'image', 'video', 'finalize']
+
+
+def test_resume_from_first_incomplete_stage(redis_client, redis_cleanup):
+    """测试视频阶段失败后从视频阶段继续，图片不重新生成"""
+    print("📌 测试阶段检查点...")
+    client = redis_client
+    checkpoints = StageCheckpoints(client, STAGES, ttl=60)
+    redis_cleanup(checkpoints._key('task-1'))
+
+    assert checkpoints.resume_point('task-1') == ('download', 'task-1')
+
+    checkpoints.save('task-1', 'download', {'task_id': 'task-1', 'sketch_sha256': 'abc'})
+    checkpoints.save('task-1', 'image', {'task_id': 'task-1', 'generated_image_url': 'https://img'})
+    # 迟到的旧阶段不会覆盖更新的检查点
+    assert not checkpoints.save('task-1', 'download', {'task_id': 'task-1'})
+
+    stage, ctx = checkpoints.resume_point('task-1')
+    print(f"   恢复点: {stage} {ctx}")
+    assert stage == 'video'
+    assert ctx['generated_image_url'] == 'https://img'
+    assert checkpoints.completed('task-1', 'download') is not None
+    assert checkpoints.completed('task-1', 'video') is None
+    assert 0 < client.ttl(checkpoints._key('task-1')) <= 60
+
+
+def test_submission_is_idempotency_key(redis_client, redis_cleanup):
+    """测试已提交的百炼任务被记录，失败后清除以便重新提交"""
+    checkpoints = StageCheckpoints(redis_client, STAGES, ttl=60)
+    redis_cleanup(checkpoints._key('task-2'))
+
+    assert checkpoints.submission('task-2', 'video') is None
+    checkpoints.record_submission('task-2', 'video', 'dashscope-1')
+    assert checkpoints.submission('task-2', 'video') == 'dashscope-1'
+    # 提交记录不影响阶段进度
+    assert checkpoints.resume_point('task-2') == ('download', 'task-2')
+
+    checkpoints.clear_submission('task-2', 'video')
+    assert checkpoints.submission('task-2', 'video') is None
+
+
+def test_submission_claimed_atomically(redis_client, redis_cleanup):
+    """测试同一阶段只有一条流水线能认领提交权，同一认领者重投时仍可提交"""
+    checkpoints = StageCheckpoints(redis_client, STAGES, ttl=60)
+    redis_cleanup(checkpoints._key('task-3'))
+
+    assert checkpoints.claim_submission('task-3', 'image', 'celery-a') == (True, None)
+    # 另一条流水线（用户重新发起）不能在提交进行中再次提交
+    assert checkpoints.claim_submission('task-3', 'image', 'celery-b') == (False, None)
+    # 同一Celery任务的消息重投或重试沿用原认领
+    assert checkpoints.claim_submission('task-3', 'image', 'celery-a') == (True, None)
+    assert checkpoints.submission('task-3', 'image') is None
+
+    checkpoints.record_submission('task-3', 'image', 'dashscope-3')
+    assert checkpoints.claim_submission('task-3', 'image', 'celery-a') == (False, 'dashscope-3')
+    assert checkpoints.claim_submission('task-3', 'image', 'celery-b') == (False, 'dashscope-3')
+
+
+def test_final_failure_marker_taken_once(redis_client, redis_cleanup):
+    """测试最终失败标记只能被取走一次，重新发起不会并发启动两条流水线"""
+    checkpoints = StageCheckpoints(redis_client, STAGES, ttl=60)
+    redis_cleanup(checkpoints._key('task-4'))
+
+    # 仍在自动重试的任务没有标记
+    assert not checkpoints.take_failed('task-4')
+    checkpoints.mark_failed('task-4')
+    assert checkpoints.resume_point('task-4') == ('download', 'task-4')
+    assert checkpoints.take_failed('task-4')
+    assert not checkpoints.take_failed('task-4')
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 创作接口测试脚本
+经Flask测试客户端调用批量创作、重新发起和创作历史接口，百炼服务、数据库和Celery投递均被替换
+需要本地Redis服务 (REDIS_URL，默认使用15号库)，未启动时跳过
+"""
+
+import os
+import sys
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+import pytest
+
+# 应用在导入时连接Redis，先指向测试库
+os.environ.setdefault('REDIS_URL', 'redis://localhost:6379/15')
+
+import app as app_module
+from services.pagination import encode_cursor
+
+
+class _FakeTasksDB:
+    """只实现批量创作用到的 creation_tasks 插入，可注入插入失败"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.inserted = []
+        self._rows = None
+
+    def table(self, name):
+        assert name == 'creation_tasks'
+        return self
+
+    def insert(self, rows):
+        self._rows = rows
+        return self
+
+    def execute(self):
+        if self.fail:
+            raise Exception("数据库写入失败")
+        self.inserted.extend(self._rows)
+        return SimpleNamespace(data=self._rows)
+
+
+@pytest.fixture
+def routes(redis_client, redis_cleanup):
+    """替换数据库和百炼服务的测试客户端，user-1 的余额镜像为2个画笔"""
+    db = _FakeTasksDB()
+    ledger = app_module.brush_ledger
+    redis_cleanup(f"{ledger.namespace}:*", 'creation:batch:*', 'task:*',
+                  app_module.creation_store.STATUS_KEY_PREFIX + '*',
+                  app_module.creation_checkpoints.KEY_PREFIX + '*')
+    redis_client.set(ledger._balance_key('user-1'), 2)
+
+    with mock.patch.object(app_module.creation_store, 'supabase', db), \
+            mock.patch.object(ledger, 'supabase', None), \
+            mock.patch.object(app_module, 'dashscope_api', mock.Mock()) as dashscope:
+        yield SimpleNamespace(client=app_module.app.test_client(), db=db, ledger=ledger, dashscope=dashscope)
+
+    # 接口不直接调用百炼，生成只在流水线阶段中进行
+    assert not dashscope.method_calls
+
+
+def _batch(count: int):
+    return {
+        'user_id': 'user-1',
+        'tasks': [{'sketch_image_url': f"sketches/{i}.png", 'voice_description': '小猫'} for i in range(count)]
+    }
+
+
+def test_batch_rejected_and_rolled_back(routes):
+    """测试余额不够整批时返回402不写入任务，插入或投递失败时退回整批预留"""
+    print("🧺 测试批量创作的画笔回滚...")
+    with mock.patch.object(app_module.group, 'apply_async') as dispatch:
+        response = routes.client.post('/api/creation/batch', json=_batch(3))
+        assert response.status_code == 402
+        assert routes.db.inserted == [] and dispatch.call_count == 0
+        assert routes.ledger.balance('user-1') == 2
+
+        routes.db.fail = True
+        response = routes.client.post('/api/creation/batch', json=_batch(2))
+        assert response.status_code == 500
+        assert dispatch.call_count == 0
+        assert routes.ledger.balance('user-1') == 2
+
+        routes.db.fail = False
+        dispatch.side_effect = Exception("broker不可用")
+        response = routes.client.post('/api/creation/batch', json=_batch(2))
+        assert response.status_code == 500
+
+    print(f"   回滚后余额: {routes.ledger.balance('user-1')}")
+    assert routes.ledger.balance('user-1') == 2
+    assert routes.ledger.stats()['reservations'] == 0
+
+
+def test_batch_projections_written_before_dispatch(routes):
+    """测试投递Celery group时状态投影、Celery任务ID和批次列表都已写入"""
+    print("🧺 测试批量创作的投递顺序...")
+    seen = {}
+
+    def dispatch(*args, **kwargs):
+        task_ids = [row['id'] for row in routes.db.inserted]
+        seen['statuses'] = app_module.creation_store.get_statuses(task_ids)
+        seen['celery_ids'] = [app_module.redis_client.get(f"task:{task_id}") for task_id in task_ids]
+        seen['batch'] = app_module.redis_client.lrange(app_module._batch_key(routes.db.inserted[0]['batch_id']), 0, -1)
+
+    with mock.patch.object(app_module.group, 'apply_async', side_effect=dispatch):
+        response = routes.client.post('/api/creation/batch', json=_batch(2))
+
+    body = response.get_json()
+    assert response.status_code == 200, body
+    assert [status['status'] for status in seen['statuses']] == ['pending', 'pending']
+    assert all(seen['celery_ids'])
+    assert [task_id.decode() for task_id in seen['batch']] == body['task_ids']
+    assert routes.ledger.balance('user-1') == 0
+
+
+def test_retry_requires_final_failure(routes):
+    """测试只有自动重试已用尽的失败任务可以重新发起，且同一次失败只能重新发起一次"""
+    print("🧺 测试重新发起失败任务...")
+    store = app_module.creation_store
+    store.cache_task({'id': 'task-retry', 'user_id': 'user-1', 'status': 'failed', 'brush_consumed': 1})
+    store.cache_task({'id': 'task-running', 'user_id': 'user-1', 'status': 'processing', 'brush_consumed': 1})
+    pipeline = mock.Mock()
+    pipeline.return_value.apply_async.return_value = SimpleNamespace(id='celery-retry')
+
+    with mock.patch.object(app_module, 'build_creation_pipeline', pipeline):
+        # 失败状态已推送但仍在自动重试中
+        assert routes.client.post('/api/creation/retry/task-retry').status_code == 409
+        assert routes.client.post('/api/creation/retry/task-running').status_code == 409
+        assert pipeline.call_count == 0
+
+        app_module.creation_checkpoints.mark_failed('task-retry')
+        response = routes.client.post('/api/creation/retry/task-retry')
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['resumed_from'] == 'download'
+
+        # 标记已被取走，重复请求不会再次投递
+        assert routes.client.post('/api/creation/retry/task-retry').status_code == 409
+
+    assert pipeline.call_count == 1
+    assert routes.ledger.has_reservation('task-retry')
+
+
+def test_history_pages_through_keyset_rpc():
+    """测试创作历史经 creation_history_page 分页，请求中不再拼接or过滤条件"""
+    print("🧺 测试创作历史分页请求...")
+    user_id = '3f2b8c1e-0000-4000-8000-0000000000aa'
+    rows = [
+        {'id': f'3f2b8c1e-0000-4000-8000-00000000000{i}', 'title': '', 'thumbnail': None,
+         'status': 'completed', 'created_at': f'2024-05-01T10:00:0{i}+00:00', 'creation_steps': None}
+        for i in (3, 2, 1)
+    ]
+    requests = []
+
+    def send(request, **kwargs):
+        requests.append(request)
+        return httpx.Response(200, json=[dict(row) for row in rows], request=request)
+
+    client = app_module.app.test_client()
+    with mock.patch.object(app_module.supabase.postgrest.session, 'send', side_effect=send):
+        first = client.get(f'/api/creation/history/{user_id}?limit=2').get_json()
+        cursor = encode_cursor(rows[1]['created_at'], rows[1]['id'])
+        assert first['next_cursor'] == cursor and first['has_more']
+        assert 'creation_steps' not in first['tasks'][0]
+
+        client.get(f'/api/creation/history/{user_id}?limit=2&expand=steps&cursor={cursor}')
+        assert client.get(f'/api/creation/history/{user_id}?cursor=bad').status_code == 400
+
+    assert len(requests) == 2
+    for request in requests:
+        assert request.method == 'POST'
+        assert request.url.path.endswith('/rest/v1/rpc/creation_history_page')
+        assert not request.url.query
+    assert json.loads(requests[0].content) == {
+        'p_user_id': user_id, 'p_after_created_at': None, 'p_after_id': None,
+        'p_limit': 3, 'p_include_steps': False
+    }
+    assert json.loads(requests[1].content) == {
+        'p_user_id': user_id, 'p_after_created_at': rows[1]['created_at'], 'p_after_id': rows[1]['id'],
+        'p_limit': 3, 'p_include_steps': True
+    }
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
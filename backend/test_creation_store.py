@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 创作任务状态投影测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.creation_store import CreationTaskStore
+from backend.services.progress_events import TERMINAL_STATUSES, progress_channel
+
+
+def test_status_projection_follows_pipeline(redis_client, redis_cleanup):
+    """测试流水线写入状态投影，状态查询直接命中Redis"""
+    print("🗂️ 测试任务状态投影...")
+    client = redis_client
+    # 命中投影时不会访问数据库
+    store = CreationTaskStore(None, client, status_ttl=60, terminal_status_ttl=600)
+    redis_cleanup(store._status_key('task-1'), store._status_key('task-2'), store.PROGRESS_KEY)
+
+    store.cache_task({'id': 'task-1', 'status': 'pending', 'progress': 0, 'generated_image_url': None})
+    store.buffer_progress('task-1', 40, '正在生成图片...')
+
+    task = store.get_status('task-1')
+    print(f"   投影内容: {task}")
+    assert task['status'] == 'processing'
+    assert task['progress'] == 40
+    assert task['current_step'] == '正在生成图片...'
+    assert task['generated_image_url'] is None
+    assert client.ttl(store._status_key('task-1')) <= 60
+
+    # 投影已过期的任务只更新缓冲进度，不生成残缺投影
+    store.buffer_progress('task-2', 40, '正在生成图片...')
+    assert not client.exists(store._status_key('task-2'))
+
+    store.cache_task({'id': 'task-1', 'status': 'completed', 'progress': 100})
+    assert client.ttl(store._status_key('task-1')) > 60
+
+
+def test_batch_statuses_read_in_one_pipeline(redis_client, redis_cleanup):
+    """测试批量任务的投影写入同一个pipeline，并按请求顺序批量读取"""
+    client = redis_client
+    store = CreationTaskStore(None, client, status_ttl=60, terminal_status_ttl=600)
+    task_ids = [f'batch-task-{i}' for i in range(5)]
+    redis_cleanup(*[store._status_key(task_id) for task_id in task_ids])
+
+    pipe = client.pipeline(transaction=False)
+    for i, task_id in enumerate(task_ids):
+        store.cache_task({'id': task_id, 'status': 'pending', 'progress': i}, pipe=pipe)
+    assert not client.exists(store._status_key(task_ids[0]))
+    pipe.execute()
+
+    statuses = store.get_statuses(list(reversed(task_ids)))
+    assert [task['id'] for task in statuses] == list(reversed(task_ids))
+    assert [task['progress'] for task in statuses] == [4, 3, 2, 1, 0]
+
+
+def test_retrying_publishes_non_terminal_event(redis_client, redis_cleanup):
+    """测试仍会自动重试的失败只推送非终态事件，数据库不写入失败状态"""
+    print("🗂️ 测试重试中状态...")
+    client = redis_client
+    store = CreationTaskStore(None, client, status_ttl=60, terminal_status_ttl=600)
+    key = store._status_key('retry-task')
+    redis_cleanup(key, store.PROGRESS_KEY)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(progress_channel('retry-task'))
+
+    try:
+        store.cache_task({'id': 'retry-task', 'status': 'processing', 'progress': 30, 'error_message': None})
+        # supabase为None：写入数据库会直接报错
+        store.mark_retrying('retry-task', '百炼接口超时', 1)
+
+        task = store.get_status('retry-task')
+        assert task['status'] == 'retrying'
+        assert task['error_message'] == '百炼接口超时'
+        assert client.ttl(key) <= 60
+
+        # 订阅确认被忽略时get_message返回None，继续读取直到拿到事件
+        message = None
+        for _ in range(10):
+            message = pubsub.get_message(timeout=0.5)
+            if message is not None:
+                break
+        event = json.loads(message['data'])
+        print(f"   事件: {event}")
+        assert event['status'] == 'retrying' and event['status'] not in TERMINAL_STATUSES
+
+        # 重试成功后进度更新恢复处理中并清除错误
+        store.buffer_progress('retry-task', 60, '正在生成视频...')
+        task = store.get_status('retry-task')
+        assert task['status'] == 'processing' and task['error_message'] is None
+    finally:
+        pubsub.close()
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
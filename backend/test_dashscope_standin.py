@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 本地百炼替身服务测试脚本
+真实的百炼客户端通过base URL指向替身服务
+"""
+
+import os
+import sys
+import asyncio
+from dataclasses import replace
+
+import httpx
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.benchmarks.dashscope_standin import PROFILES, StandinProfile, parse_latency, start_in_thread
+from backend.services.ai_service import DashScopeAIService, TaskStatus
+from backend.services.async_ai_service import AsyncDashScopeAIService
+from backend.services.rate_limiter import DistributedRateLimiter
+from backend.services.resilience import CircuitBreaker, HedgedCaller, ResilienceConfig
+
+
+def test_latency_specs():
+    """测试延迟分布解析"""
+    import random
+    rng = random.Random(1)
+    assert parse_latency('fixed:0.2')(rng) == 0.2
+    assert 0.1 <= parse_latency('uniform:0.1,0.5')(rng) <= 0.5
+    assert parse_latency('lognormal:0.3,0.4')(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency('normal:1')
+
+
+def test_sync_client_async_tasks(redis_client, redis_cleanup):
+    """测试同步客户端提交异步任务并轮询到结果"""
+    print("🧪 测试百炼替身服务...")
+    client = redis_client
+    redis_cleanup('test:standin:*')
+    server, base_url = start_in_thread(replace(PROFILES['fast'], task_mode='async'))
+    try:
+        config = ResilienceConfig(hedge_enabled=False)
+        service = DashScopeAIService(
+            'sk-test',
+            rate_limiter=DistributedRateLimiter(client, namespace='test:standin:ratelimit'),
+            circuit_breaker=CircuitBreaker(client, config, namespace='test:standin:circuit'),
+            hedger=HedgedCaller(config),
+            base_url=base_url
+        )
+
+        submitted = service.sketch_to_image(b'\x89PNG fake sketch', "小猫", "anime")
+        assert submitted.success and submitted.task_id
+
+        status = service.get_task_status(submitted.task_id)
+        while status.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+            status = service.get_task_status(submitted.task_id)
+        print(f"   结果: {status.image_url}")
+        assert status.status == TaskStatus.SUCCESS
+        assert status.image_url.endswith(f"{submitted.task_id}.png")
+    finally:
+        server.shutdown()
+
+
+def test_sync_mode_and_injected_failures():
+    """测试同步模式直接返回结果，限流返回429，错误注入返回500"""
+    profile = StandinProfile(task_mode='sync', image_duration='fixed:0.05', video_duration='fixed:0.05')
+    server, base_url = start_in_thread(profile)
+    throttled, throttled_url = start_in_thread(replace(profile, video_qps=1))
+    broken, broken_url = start_in_thread(replace(profile, error_rate=1.0))
+
+    async def scenario():
+        async with AsyncDashScopeAIService('sk-test', base_url=base_url, client=httpx.AsyncClient()) as service:
+            video = await service.image_to_video("http://example.com/a.png")
+            assert video.success and video.video_url
+
+        async with AsyncDashScopeAIService('sk-test', base_url=throttled_url, client=httpx.AsyncClient()) as service:
+            results = await asyncio.gather(*[service.image_to_video("http://example.com/a.png") for _ in range(3)])
+            assert any('429' in (r.error_message or '') for r in results)
+
+        async with AsyncDashScopeAIService('sk-test', base_url=broken_url, client=httpx.AsyncClient()) as service:
+            result = await service.sketch_to_image(b'sketch')
+            assert not result.success and '500' in result.error_message
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        for srv in (server, throttled, broken):
+            srv.shutdown()
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 生成结果缓存测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+import base64
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.ai_service import _build_sketch_request
+from backend.services.generation_cache import (
+    CacheConfig, GenerationCache, derive_seed, generation_cache_key, sketch_digest
+)
+
+
+def test_cache_key_and_seed():
+    """测试缓存键只由生成输入决定"""
+    digest = sketch_digest(b'sketch-bytes')
+    key = generation_cache_key(digest, '一只猫', 'anime', 'wanx-sketch-to-image-lite', {'size': '1024*1024'})
+
+    assert key == generation_cache_key(digest, '一只猫', 'anime', 'wanx-sketch-to-image-lite', {'size': '1024*1024'})
+    assert key != generation_cache_key(digest, '一只狗', 'anime', 'wanx-sketch-to-image-lite', {'size': '1024*1024'})
+    assert derive_seed(key) == derive_seed(key)
+    assert 0 <= derive_seed(key) < 2 ** 31
+
+
+def test_sketch_key_independent_of_input_encoding():
+    """测试草图以原始字节、Base64文本或data URL传入时缓存键和种子相同，且与任务流水线的摘要一致"""
+    sketch = b'\x89PNG fake sketch'
+    text = base64.b64encode(sketch).decode('ascii')
+
+    from_bytes = _build_sketch_request(sketch, '一只猫', 'anime', None)
+    from_text = _build_sketch_request(text, '一只猫', 'anime', None)
+    from_data_url = _build_sketch_request(f"data:image/png;base64,{text}", '一只猫', 'anime', None)
+
+    assert from_bytes[:2] == from_text[:2] == from_data_url[:2]
+    assert from_bytes[0] == generation_cache_key(
+        sketch_digest(sketch), '一只猫', 'anime', 'wanx-sketch-to-image-lite', {'size': '1024*1024'}
+    )
+    assert from_data_url[2]['input']['sketch'] == f"data:image/png;base64,{text}"
+
+
+def test_cache_hits_and_eviction(redis_client, redis_cleanup):
+    """测试命中统计和容量淘汰"""
+    print("🗂️ 测试生成结果缓存...")
+    redis_cleanup(GenerationCache.INDEX_KEY, GenerationCache.STATS_KEY, GenerationCache.ENTRY_PREFIX + '*')
+    cache = GenerationCache(redis_client, CacheConfig(ttl_seconds=60, max_entries=2))
+
+    assert cache.get('a') is None
+    cache.set('a', {'image_url': 'https://example.com/a.png'})
+    cache.set('b', {'image_url': 'https://example.com/b.png'})
+    assert cache.get('a') == {'image_url': 'https://example.com/a.png'}
+
+    # 'b' 最久未访问，写入 'c' 时被淘汰
+    assert cache.set('c', {'image_url': 'https://example.com/c.png'}) == 1
+    assert cache.get('b') is None
+
+    stats = cache.stats()
+    print(f"   缓存统计: {stats}")
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 2
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - HTTP传输层测试脚本
+验证长连接池复用和超时配置
+"""
+
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.http_transport import HTTPTransport, TransportConfig, get_transport_stats
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    """返回固定JSON的本地服务"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'ok': True}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _EchoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_connection_reuse():
+    """测试连续请求复用同一条连接"""
+    print("🔌 测试连接复用...")
+    server = _start_server()
+    transport = HTTPTransport(TransportConfig(pool_maxsize=2))
+
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/tasks/demo"
+        before = get_transport_stats()
+
+        for _ in range(5):
+            response = transport.get(url)
+            assert response.json() == {'ok': True}
+
+        after = get_transport_stats()
+        created = after['connections_created'] - before['connections_created']
+        reused = after['connections_reused'] - before['connections_reused']
+        print(f"   新建连接: {created}, 复用连接: {reused}")
+
+        assert created == 1
+        assert reused == 4
+    finally:
+        transport.close()
+        server.shutdown()
+
+
+def test_timeout_tuple():
+    """测试超时配置"""
+    transport = HTTPTransport(TransportConfig(connect_timeout=2, read_timeout=15))
+    assert transport.timeout() == (2, 15)
+    assert transport.timeout(read_timeout=10) == (2, 10)
+
+
+if __name__ == "__main__":
+    test_connection_reuse()
+    test_timeout_tuple()
+    print("✅ HTTP传输层测试完成")
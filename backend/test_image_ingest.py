@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 作品图片解码测试脚本
+"""
+
+import io
+import os
+import sys
+from unittest import mock
+
+import numpy as np
+import pytest
+from PIL import Image, ImageFile
+from PIL.JpegImagePlugin import JpegImageFile
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.ai_mentor_service import AIArtMentorService
+from backend.services.image_ingest import ImageRejectedError, decode_image
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def _photo(size) -> Image.Image:
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=2)
+    return Image.fromarray(pixels.astype(np.uint8))
+
+
+def test_jpeg_decoded_at_analysis_resolution():
+    """测试大尺寸JPEG在解码器内缩小，输出分析分辨率的RGB图像"""
+    print("🖼️ 测试JPEG按分析分辨率解码...")
+    data = _encode(_photo((4000, 3000)), 'JPEG')
+
+    with mock.patch.object(JpegImageFile, 'draft', autospec=True, side_effect=JpegImageFile.draft) as draft:
+        decoded = decode_image(data, max_side=1024)
+
+    print(f"   原图: {decoded.original_size}, 解码: {decoded.image.size}")
+    assert draft.call_count == 1
+    assert decoded.original_size == (4000, 3000)
+    assert decoded.image.size == (1024, 768)
+    assert decoded.format == 'JPEG'
+    assert decoded.image.mode == 'RGB'
+
+
+def test_png_converted_and_reduced():
+    """测试RGBA PNG解码后缩小并转为RGB，小图保持原尺寸"""
+    print("🖼️ 测试PNG解码...")
+    data = _encode(Image.new('RGBA', (1600, 400), (10, 200, 30, 255)), 'PNG')
+    decoded = decode_image(data, max_side=800)
+    assert decoded.image.mode == 'RGB'
+    assert decoded.image.size == (800, 200)
+    assert decoded.image.getpixel((400, 100)) == (10, 200, 30)
+
+    small = decode_image(_encode(Image.new('P', (300, 200)), 'PNG'), max_side=800)
+    assert small.image.size == (300, 200) and small.image.mode == 'RGB'
+
+
+def test_oversized_and_invalid_images_rejected_before_decoding():
+    """测试像素数超限的图片在解码前被拒绝，无法识别的数据同样被拒绝"""
+    print("🖼️ 测试解压炸弹拒绝...")
+    data = _encode(Image.new('L', (3000, 3000)), 'PNG')
+
+    with mock.patch.object(ImageFile.ImageFile, 'load') as load:
+        with pytest.raises(ImageRejectedError):
+            decode_image(data, max_side=1024, max_pixels=1_000_000)
+    assert load.call_count == 0
+
+    with pytest.raises(ImageRejectedError):
+        decode_image(b'not an image', max_side=1024)
+
+    # 导师分析不把超限图片当作普通失败返回默认结果
+    service = AIArtMentorService('sk-test', max_image_pixels=1_000_000)
+    with pytest.raises(ImageRejectedError):
+        service.analyze_drawing(data)
+
+
+if __name__ == "__main__":
+    test_jpeg_decoded_at_analysis_resolution()
+    test_png_converted_and_reduced()
+    test_oversized_and_invalid_images_rejected_before_decoding()
+    print("✅ 作品图片解码测试完成")
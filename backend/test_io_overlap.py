@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 流水线I/O并发测试脚本
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.io_overlap import IOTimeline
+
+
+def _io(seconds: float, value):
+    def call():
+        time.sleep(seconds)
+        return value
+    return call
+
+
+def test_independent_calls_overlap():
+    """测试互不依赖的调用同时进行，耗时明细反映并发节省的时间"""
+    print("⏱️ 测试阶段I/O并发...")
+    timeline = IOTimeline()
+    results = timeline.run(claim=_io(0.2, 'task'), sketch_read=_io(0.2, b'png'), track=_io(0.1, None))
+    with timeline.span('normalize'):
+        time.sleep(0.05)
+
+    breakdown = timeline.breakdown()
+    print(f"   明细: {breakdown}")
+    assert results == {'claim': 'task', 'sketch_read': b'png', 'track': None}
+    assert breakdown['serial_ms'] >= 550
+    assert breakdown['wall_ms'] < 400
+    assert breakdown['overlap_ms'] >= 200
+    assert breakdown['spans']['normalize']['start_ms'] >= 200
+
+
+def test_failure_waits_for_other_calls():
+    """测试任一调用失败时等其余调用结束后再抛出异常"""
+    timeline = IOTimeline()
+    finished = []
+
+    def failing():
+        raise ValueError("任务不存在")
+
+    def slow():
+        time.sleep(0.1)
+        finished.append(True)
+
+    with pytest.raises(ValueError):
+        timeline.run(claim=failing, track=slow)
+    assert finished == [True]
+
+
+if __name__ == "__main__":
+    test_independent_calls_overlap()
+    test_failure_waits_for_other_calls()
+    print("✅ 阶段I/O并发测试完成")
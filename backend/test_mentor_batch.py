@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 绘画批量分析测试脚本
+"""
+
+import io
+import os
+import sys
+
+from PIL import Image, ImageDraw
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.ai_mentor_service import AIArtMentorService
+
+
+def _drawing(seed: int) -> bytes:
+    image = Image.new('RGB', (800, 600), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((seed * 50, 40, seed * 50 + 300, 400), fill=(200, seed * 30, 40))
+    draw.line((0, 590, 790, seed * 60), fill=(20, 20, 20), width=5)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _shared_segments():
+    # POSIX共享内存在Linux上映射为/dev/shm下的psm_*文件
+    if not os.path.isdir('/dev/shm'):
+        return set()
+    return {name for name in os.listdir('/dev/shm') if name.startswith('psm_')}
+
+
+def test_batch_matches_single_analysis():
+    """测试进程池批量分析与逐张分析结果一致，无法识别的图片结果为None"""
+    print("🧵 测试批量分析...")
+    service = AIArtMentorService('sk-test')
+    images = [_drawing(seed) for seed in range(6)] + [b'not an image']
+    before = _shared_segments()
+
+    results = dict(service.analyze_drawings_batch(iter(images), workers=2))
+
+    print(f"   完成: {sorted(results)}")
+    assert sorted(results) == list(range(7))
+    assert results[6] is None
+    for index in range(6):
+        assert results[index] == service.analyze_drawing(images[index])
+    # 所有共享内存在结果返回后释放
+    assert _shared_segments() == before
+
+
+def test_batch_stops_early_and_releases_memory():
+    """测试调用方提前停止迭代时取消剩余任务并释放共享内存"""
+    print("🧵 测试批量分析提前停止...")
+    service = AIArtMentorService('sk-test')
+    before = _shared_segments()
+
+    results = service.analyze_drawings_batch((_drawing(seed % 6) for seed in range(20)), workers=2)
+    first = next(results)
+    results.close()
+
+    assert first[1] is not None
+    assert _shared_segments() == before
+
+
+if __name__ == "__main__":
+    test_batch_matches_single_analysis()
+    test_batch_stops_early_and_releases_memory()
+    print("✅ 绘画批量分析测试完成")
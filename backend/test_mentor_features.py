@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 绘画分析特征共享测试脚本
+"""
+
+import io
+import os
+import sys
+import random
+from unittest import mock
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services import ai_mentor_service
+from backend.services.ai_mentor_service import AIArtMentorService, DrawingFeatures
+
+
+def _drawing() -> bytes:
+    image = Image.new('RGBA', (400, 300), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 40, 200, 180), fill=(230, 60, 40, 255))
+    draw.line((0, 290, 390, 10), fill=(20, 20, 20, 255), width=4)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_features_computed_once_per_image():
+    """测试一次分析中边缘检测和主色提取各只执行一次"""
+    print("🎨 测试绘画分析特征共享...")
+    service = AIArtMentorService('sk-test')
+
+    with mock.patch.object(ai_mentor_service.cv2, 'Canny', wraps=cv2.Canny) as canny, \
+            mock.patch.object(ai_mentor_service, 'extract_palette', wraps=ai_mentor_service.extract_palette) as palette:
+        analysis = service.analyze_drawing(_drawing())
+
+    print(f"   分析结果: {analysis}")
+    assert canny.call_count == 1
+    assert palette.call_count == 1
+    # RGBA作品正常分析，没有退回默认结果
+    assert analysis.detected_objects != ["未知物体"]
+    assert len(analysis.dominant_colors) >= 2
+
+
+def test_composition_uses_moments_at_analysis_resolution():
+    """测试构图重心与逐像素加权一致，大图按分析分辨率处理"""
+    print("🎨 测试构图分析的分析分辨率...")
+    image = Image.new('RGB', (3000, 2000), (0, 0, 0))
+    ImageDraw.Draw(image).ellipse((1800, 300, 2600, 1100), fill=(250, 250, 250))
+    service = AIArtMentorService('sk-test', analysis_max_side=512)
+
+    features = DrawingFeatures(image, 512)
+    assert max(features.gray.shape) == 512
+    assert features.hsv.shape[:2] == features.gray.shape
+    assert abs(features.scale - 3000 / 512) < 1e-9
+
+    # 与原先的 np.indices 加权重心公式结果一致
+    gray = features.gray
+    y_indices, x_indices = np.indices(gray.shape)
+    h, w = gray.shape
+    center_x = np.sum(x_indices * gray) / np.sum(gray)
+    center_y = np.sum(y_indices * gray) / np.sum(gray)
+    expected = max(0, min(1, 1 - abs(abs(center_x - w/2) / (w/2) - 0.33) - abs(abs(center_y - h/2) / (h/2) - 0.33)))
+    reduced = service._analyze_composition(features)
+    assert abs(reduced - expected) < 1e-9
+
+    # 缩小分析与原图分析的评分基本一致
+    full = service._analyze_composition(DrawingFeatures(image))
+    print(f"   原图: {full:.4f}, 分析分辨率: {reduced:.4f}")
+    assert abs(full - reduced) < 0.01
+
+
+def test_complexity_matches_full_resolution():
+    """测试边缘密度按缩小倍数换算，各分析分辨率的复杂度与原图一致"""
+    print("🎨 测试复杂度的分辨率无关性...")
+    rng = random.Random(3)
+    image = Image.new('RGB', (4096, 3072), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y, r = rng.randrange(4096), rng.randrange(3072), rng.randrange(200, 680)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    for _ in range(8):
+        draw.line((rng.randrange(4096), rng.randrange(3072), rng.randrange(4096), rng.randrange(3072)),
+                  fill=(20, 20, 20), width=24)
+    service = AIArtMentorService('sk-test')
+
+    full = service._analyze_complexity(DrawingFeatures(image))
+    for max_side in (2048, 1024, 512):
+        reduced = service._analyze_complexity(DrawingFeatures(image, max_side))
+        print(f"   原图: {full:.4f}, {max_side}px: {reduced:.4f}")
+        assert abs(reduced - full) / full < 0.15
+
+
+if __name__ == "__main__":
+    test_features_computed_once_per_image()
+    test_composition_uses_moments_at_analysis_resolution()
+    test_complexity_matches_full_resolution()
+    print("✅ 绘画分析特征共享测试完成")
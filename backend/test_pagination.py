@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 游标分页测试脚本
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.pagination import InvalidCursorError, decode_cursor, encode_cursor, keyset_params
+
+
+def test_cursor_round_trip():
+    """测试游标编码、解码和分页函数参数"""
+    print("📄 测试游标分页...")
+    created_at = '2024-05-01T10:00:00.123456+00:00'
+    row_id = '3f2b8c1e-0000-4000-8000-000000000001'
+
+    cursor = encode_cursor(created_at, row_id)
+    assert decode_cursor(cursor) == (created_at, row_id)
+    assert keyset_params(None) == {'p_after_created_at': None, 'p_after_id': None}
+    assert keyset_params(cursor) == {'p_after_created_at': created_at, 'p_after_id': row_id}
+
+
+def test_rejects_tampered_cursor():
+    """测试拒绝无法解析或试图注入过滤条件的游标"""
+    for cursor in ['not-a-cursor', encode_cursor('2024-05-01")', 'x'), encode_cursor('2024-05-01', 'id),or(')]:
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(cursor)
+
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    test_rejects_tampered_cursor()
+    print("✅ 游标分页测试完成")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 主色提取测试脚本
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.palette import extract_palette, to_hex
+
+
+def test_palette_recovers_flat_colors_by_coverage():
+    """测试色块图按覆盖面积返回各色块颜色，结果稳定"""
+    print("🎨 测试主色提取...")
+    image = np.full((150, 150, 3), 255, dtype=np.uint8)
+    image[:70, :] = (230, 60, 40)
+    image[70:100, :100] = (40, 120, 230)
+    image[110:120, :] = (20, 20, 20)
+    rng = np.random.default_rng(0)
+    noisy = np.clip(image.astype(int) + rng.integers(-6, 7, image.shape), 0, 255).astype(np.uint8)
+
+    palette = extract_palette(noisy, 4)
+    print(f"   调色板: {[to_hex(c) for c in palette]}")
+    assert len(palette) == 4
+    expected = [(230, 60, 40), (40, 120, 230), (20, 20, 20), (255, 255, 255)]
+    for color in expected:
+        assert min(np.abs(np.subtract(color, c)).max() for c in palette) <= 8
+    # 覆盖面积最大的红色排在最前
+    assert np.abs(np.subtract(palette[0], (230, 60, 40))).max() <= 4
+    assert extract_palette(noisy, 4) == palette
+
+
+def test_palette_with_fewer_colors_than_requested():
+    """测试颜色数少于请求数时只返回实际颜色"""
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    image[5:] = (255, 255, 255)
+    assert sorted(extract_palette(image, 5)) == [(0, 0, 0), (255, 255, 255)]
+    assert extract_palette(np.zeros((0, 3), dtype=np.uint8), 5) == []
+
+
+if __name__ == "__main__":
+    test_palette_recovers_flat_colors_by_coverage()
+    test_palette_with_fewer_colors_than_requested()
+    print("✅ 主色提取测试完成")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 流式请求体编码测试脚本
+"""
+
+import os
+import sys
+import json
+import base64
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.payload_encoding import Base64JSONBody
+
+
+def _payload():
+    return {
+        "model": "wanx-sketch-to-image-lite",
+        "input": {"prompt": "一只小猫", "style": "anime"},
+        "parameters": {"size": "1024*1024", "n": 1}
+    }
+
+
+def test_body_matches_json_dumps():
+    """测试流式请求体与一次性序列化的结果逐字节一致"""
+    print("🧵 测试流式请求体编码...")
+    for size in (0, 1, 2, 3, 1000, 65537):
+        raw = os.urandom(size)
+        body = Base64JSONBody(_payload(), ('input', 'sketch'), raw, value_prefix='data:image/png;base64,')
+
+        expected = _payload()
+        expected['input']['sketch'] = 'data:image/png;base64,' + base64.b64encode(raw).decode('ascii')
+        expected = json.dumps(expected, ensure_ascii=False).encode('utf-8')
+
+        # 以不对齐的块大小读取，覆盖跨越前缀、Base64和后缀边界的情况
+        chunks = []
+        while True:
+            chunk = body.read(1021)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        assert len(body) == len(expected)
+        assert b''.join(chunks) == expected
+
+        # 回绕后可以从任意位置重新读取
+        body.seek(len(expected) // 3)
+        assert body.read() == expected[len(expected) // 3:]
+
+    print("   各尺寸请求体均一致")
+
+
+if __name__ == "__main__":
+    test_body_matches_json_dumps()
+    print("✅ 流式请求体编码测试完成")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 创作进度事件测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.progress_events import ProgressEventHub, publish_progress_event
+
+
+def test_hub_dispatches_by_task(redis_client):
+    """测试事件只分发给对应任务的订阅者"""
+    print("📡 测试创作进度事件分发...")
+    client = redis_client
+    hub = ProgressEventHub(client)
+
+    # 订阅返回时模式订阅已确认，随后发布的事件不会丢失
+    first = hub.subscribe('task-1')
+    second = hub.subscribe('task-2')
+
+    publish_progress_event(client, 'task-1', {'status': 'processing', 'progress': 40})
+    publish_progress_event(client, 'task-1', {'status': 'completed', 'progress': 100})
+
+    assert first.get(timeout=2) == {'task_id': 'task-1', 'status': 'processing', 'progress': 40}
+    assert first.get(timeout=2)['status'] == 'completed'
+    assert second.empty()
+
+    hub.unsubscribe('task-1', first)
+    hub.unsubscribe('task-2', second)
+    assert hub.subscriber_count() == 0
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
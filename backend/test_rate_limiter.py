@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 百炼限流测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.rate_limiter import (
+    BucketConfig, DistributedRateLimiter, RateLimitConfig, RateLimitTimeout
+)
+
+
+def test_limiter_spreads_concurrent_callers(redis_client, redis_namespace):
+    """测试并发调用方共享令牌桶，超出突发量后按速率放行"""
+    print("🚦 测试分布式令牌桶...")
+    limiter = DistributedRateLimiter(
+        redis_client,
+        RateLimitConfig(buckets={'image_synthesis': BucketConfig(rate=10, capacity=2)}, max_wait=5),
+        namespace=redis_namespace
+    )
+
+    granted = []
+
+    def worker():
+        limiter.acquire('image_synthesis')
+        granted.append(time.monotonic())
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    elapsed = max(granted) - start
+    stats = limiter.stats()
+    print(f"   6个请求耗时 {elapsed:.2f}s, 统计: {stats}")
+    # 突发2个，其余4个按10 QPS补充，至少需要0.4秒
+    assert elapsed >= 0.35
+    assert stats['image_synthesis_acquired'] == 6
+    assert stats['image_synthesis_throttled'] >= 4
+
+    with pytest.raises(RateLimitTimeout):
+        for _ in range(5):
+            limiter.acquire('image_synthesis', max_wait=0)
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
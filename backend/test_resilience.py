@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 百炼调用容错测试脚本
+熔断器需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+import requests
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.resilience import CircuitBreaker, CircuitOpenError, HedgedCaller, ResilienceConfig
+
+
+def test_breaker_opens_and_recovers_with_probe(redis_client, redis_namespace):
+    """测试连续失败后熔断、冷却后单个探测请求恢复"""
+    print("🔌 测试熔断器...")
+    breaker = CircuitBreaker(redis_client, ResilienceConfig(failure_threshold=3, open_seconds=0.3),
+                             namespace=redis_namespace)
+
+    def timeout():
+        raise requests.exceptions.ReadTimeout("模拟超时")
+
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            breaker.call('image_synthesis', timeout)
+
+    # 熔断期间不发出请求
+    with pytest.raises(CircuitOpenError):
+        breaker.call('image_synthesis', timeout)
+
+    time.sleep(0.35)
+    # 半开时只放行一个探测请求
+    assert breaker.allow('image_synthesis')
+    assert not breaker.allow('image_synthesis')
+    breaker.record_success('image_synthesis')
+
+    assert breaker.allow('image_synthesis')
+    stats = breaker.stats()
+    print(f"   统计: {stats}")
+    assert stats['image_synthesis_state'] == 0
+    assert stats['image_synthesis_opened'] == 1
+    assert stats['image_synthesis_rejected'] >= 2
+
+
+def test_late_success_does_not_close_open_breaker(redis_client, redis_namespace):
+    """测试熔断前放行的慢请求返回成功时不会跳过半开探测直接关闭熔断"""
+    breaker = CircuitBreaker(redis_client, ResilienceConfig(failure_threshold=2, open_seconds=30),
+                             namespace=redis_namespace)
+
+    # 关闭状态下成功清零连续失败
+    breaker.record_failure('video_synthesis')
+    breaker.record_success('video_synthesis')
+    breaker.record_failure('video_synthesis')
+    assert breaker.allow('video_synthesis')
+
+    breaker.record_failure('video_synthesis')
+    assert not breaker.allow('video_synthesis')
+    breaker.record_success('video_synthesis')
+    assert not breaker.allow('video_synthesis')
+    assert breaker.stats()['video_synthesis_state'] == 2
+
+
+def test_hedge_returns_faster_duplicate():
+    """测试主请求超过P95时对冲请求先返回"""
+    print("🪁 测试对冲请求...")
+    hedger = HedgedCaller(ResilienceConfig(hedge_min_samples=5, hedge_min_delay=0.01))
+    calls = []
+    lock = threading.Lock()
+
+    def fetch():
+        with lock:
+            calls.append(1)
+            slow = len(calls) == 6
+        time.sleep(1.0 if slow else 0.02)
+        return 'ok'
+
+    # 积累延迟样本
+    for _ in range(5):
+        assert hedger.call(fetch) == 'ok'
+
+    start = time.monotonic()
+    assert hedger.call(fetch) == 'ok'
+    elapsed = time.monotonic() - start
+
+    print(f"   慢请求被对冲，耗时 {elapsed:.2f}s, 统计: {hedger.stats()}")
+    assert elapsed < 0.5
+    assert hedger.stats()['hedge_wins'] == 1
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 单飞请求合并测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.single_flight import SingleFlight, SingleFlightConfig
+
+
+def test_join_leader_and_followers(redis_client, redis_namespace):
+    """测试领导者重入和跟随者续作上下文"""
+    flight = SingleFlight(redis_client, namespace=redis_namespace, config=SingleFlightConfig(result_ttl=5))
+
+    assert flight.join('k', 'task-1')[0] == SingleFlight.LEADER
+    # 领导者重试时仍是领导者
+    assert flight.join('k', 'task-1')[0] == SingleFlight.LEADER
+    assert flight.join('k', 'task-2', waiter={'ctx': {'task_id': 'task-2'}}) == (SingleFlight.FOLLOWER, 'task-1')
+
+    waiters = flight.complete('k', {'image_url': 'https://example.com/a.png'})
+    assert waiters == [{'ctx': {'task_id': 'task-2'}}]
+    assert flight.join('k', 'task-3') == (SingleFlight.RESULT, {'image_url': 'https://example.com/a.png'})
+
+
+def test_leader_failure_is_not_cached(redis_client, redis_namespace):
+    """测试领导者失败时交还跟随者并释放锁，后续请求重新成为领导者而不是拿到缓存的错误"""
+    flight = SingleFlight(redis_client, namespace=redis_namespace, config=SingleFlightConfig(result_ttl=5))
+
+    assert flight.join('k', 'task-1')[0] == SingleFlight.LEADER
+    assert flight.join('k', 'task-2', waiter={'ctx': {'task_id': 'task-2'}})[0] == SingleFlight.FOLLOWER
+
+    assert flight.fail('k', '百炼接口超时') == [{'ctx': {'task_id': 'task-2'}}]
+    assert flight.join('k', 'task-3') == (SingleFlight.LEADER, 'task-3')
+    assert redis_client.zcard(flight.parked_key) == 0
+
+
+def test_orphaned_followers_reclaimed_after_lease_loss(redis_client, redis_namespace):
+    """测试领导者仍持有租约时跟随者继续等待，锁过期后跟随者被交还并可重新竞争领导权"""
+    print("🛫 测试孤儿跟随者回收...")
+    flight = SingleFlight(redis_client, namespace=redis_namespace,
+                          config=SingleFlightConfig(result_ttl=5, follower_recheck=10))
+    lock_key = flight._keys('k')[0]
+
+    assert flight.join('k', 'task-1')[0] == SingleFlight.LEADER
+    flight.join('k', 'task-2', waiter={'ctx': {'task_id': 'task-2'}})
+    flight.join('k', 'task-3', waiter={'ctx': {'task_id': 'task-3'}})
+
+    # 未到检查时间不处理；到期但领导者仍持有锁时推迟下次检查
+    assert flight.reclaim_orphans(now=time.time()) == []
+    assert flight.reclaim_orphans(now=time.time() + 11) == []
+    assert redis_client.zscore(flight.parked_key, 'k') > time.time() + 11
+
+    # 领导者崩溃，租约到期
+    redis_client.delete(lock_key)
+    orphans = flight.reclaim_orphans(now=time.time() + 30)
+    print(f"   交还的跟随者: {orphans}")
+    assert orphans == [{'ctx': {'task_id': 'task-2'}}, {'ctx': {'task_id': 'task-3'}}]
+    assert flight.reclaim_orphans(now=time.time() + 60) == []
+
+    assert flight.join('k', 'task-2')[0] == SingleFlight.LEADER
+    assert flight.join('k', 'task-3', waiter={'ctx': {'task_id': 'task-3'}}) == (SingleFlight.FOLLOWER, 'task-2')
+
+
+def test_do_coalesces_concurrent_calls(redis_client, redis_namespace):
+    """测试并发的相同调用只执行一次"""
+    print("🛫 测试单飞请求合并...")
+    flight = SingleFlight(redis_client, namespace=redis_namespace, config=SingleFlightConfig(result_ttl=5))
+
+    calls = []
+
+    def generate():
+        calls.append(1)
+        time.sleep(0.5)
+        return 'https://example.com/result.png'
+
+    results = []
+
+    def worker():
+        results.append(flight.do('k', generate, encode=lambda v: {'url': v}, decode=lambda d: d['url']))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"   实际执行次数: {len(calls)}, 返回结果数: {len(results)}")
+    assert len(calls) == 1
+    assert results == ['https://example.com/result.png'] * 5
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
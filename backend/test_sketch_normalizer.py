@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 草图预处理测试脚本
+"""
+
+import io
+import os
+import sys
+
+from PIL import Image, ImageDraw
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.sketch_normalizer import NormalizeConfig, normalize_sketch
+
+
+def _png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_large_rgba_line_art_becomes_bilevel():
+    """测试4K透明背景线稿缩放到工作分辨率并转为1位图"""
+    print("✏️ 测试草图预处理...")
+    image = Image.new('RGBA', (3840, 2160), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((800, 300, 3000, 1900), outline=(0, 0, 0, 255), width=24)
+    draw.line((0, 0, 3840, 2160), fill=(20, 20, 20, 255), width=16)
+    raw = _png(image)
+
+    result = normalize_sketch(raw, NormalizeConfig.from_size('1024*1024'))
+    print(f"   {result.original_size} {result.original_bytes}B -> "
+          f"{(result.width, result.height)} {result.normalized_bytes}B ({result.mode})")
+
+    assert (result.width, result.height) == (1024, 576)
+    assert result.mode == '1'
+    assert result.saved_bytes > 0
+
+    # 透明背景铺白底，而不是被当作黑色
+    decoded = Image.open(io.BytesIO(result.data)).convert('L')
+    assert decoded.getpixel((1000, 20)) == 255
+
+
+def test_colored_sketch_keeps_color_without_upscaling():
+    """测试彩色草图保留颜色，小图不放大"""
+    image = Image.new('RGB', (600, 400), (255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((50, 50, 350, 300), fill=(230, 60, 40))
+    draw.ellipse((300, 100, 550, 350), fill=(40, 120, 230))
+
+    result = normalize_sketch(_png(image), NormalizeConfig.from_size('1024*1024'))
+
+    assert (result.width, result.height) == (600, 400)
+    assert result.mode in ('P', 'RGB')
+    decoded = Image.open(io.BytesIO(result.data)).convert('RGB')
+    assert decoded.getpixel((100, 100)) == (230, 60, 40)
+
+
+if __name__ == "__main__":
+    test_large_rgba_line_art_becomes_bilevel()
+    test_colored_sketch_keeps_color_without_upscaling()
+    print("✅ 草图预处理测试完成")
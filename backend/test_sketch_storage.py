@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 草图流式上传测试脚本
+"""
+
+import io
+import os
+import sys
+import hashlib
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.sketch_storage import (
+    LocalSketchStorage, SketchStream, SketchUploadError, iter_multipart_file
+)
+
+BOUNDARY = b'----huatuer-test-boundary'
+
+
+def _multipart_body(content: bytes, field_name: str = 'file') -> io.BytesIO:
+    body = (
+        b'--' + BOUNDARY + b'\r\n'
+        b'Content-Disposition: form-data; name="title"\r\n\r\n'
+        b'my sketch\r\n'
+        b'--' + BOUNDARY + b'\r\n'
+        b'Content-Disposition: form-data; name="' + field_name.encode() + b'"; filename="sketch.png"\r\n'
+        b'Content-Type: application/octet-stream\r\n\r\n'
+        + content + b'\r\n'
+        b'--' + BOUNDARY + b'--\r\n'
+    )
+    return io.BytesIO(body)
+
+
+def test_streams_sketch_to_local_storage(tmp_path):
+    """测试分块解析、类型识别、哈希计算并写入本地存储"""
+    print("📤 测试草图流式上传...")
+    content = b'\x89PNG\r\n\x1a\n' + os.urandom(200 * 1024)
+
+    # 分块远小于文件，验证跨分块解析
+    chunks = iter_multipart_file(_multipart_body(content), BOUNDARY, chunk_size=4096)
+    sketch = SketchStream(chunks, max_bytes=1024 * 1024)
+    assert sketch.content_type == 'image/png'
+
+    storage = LocalSketchStorage(str(tmp_path))
+    storage.save('user-1/a.png', sketch, sketch.content_type)
+
+    print(f"   大小: {sketch.size}, 哈希: {sketch.sha256[:16]}...")
+    assert sketch.size == len(content)
+    assert sketch.sha256 == hashlib.sha256(content).hexdigest()
+    assert storage.read('user-1/a.png') == content
+
+
+def test_rejects_oversized_and_unknown_files(tmp_path):
+    """测试超限与非图片文件被拒绝，且不留下半截文件"""
+    storage = LocalSketchStorage(str(tmp_path))
+
+    oversized = b'\xff\xd8\xff' + b'\x00' * 50000
+    sketch = SketchStream(iter_multipart_file(_multipart_body(oversized), BOUNDARY, chunk_size=4096), max_bytes=10000)
+    with pytest.raises(SketchUploadError) as excinfo:
+        storage.save('user-1/big.jpg', sketch, sketch.content_type)
+    assert excinfo.value.status_code == 413
+    assert not os.listdir(tmp_path / 'user-1')
+
+    with pytest.raises(SketchUploadError) as excinfo:
+        SketchStream(iter_multipart_file(_multipart_body(b'%PDF-1.7 ...'), BOUNDARY), max_bytes=10000)
+    assert excinfo.value.status_code == 415
+
+    with pytest.raises(SketchUploadError):
+        storage.read('../outside.png')
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    test_streams_sketch_to_local_storage(Path(tempfile.mkdtemp()))
+    test_rejects_oversized_and_unknown_files(Path(tempfile.mkdtemp()))
+    print("✅ 草图流式上传测试完成")
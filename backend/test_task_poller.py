@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+华图儿AI创意绘画应用 - 百炼任务轮询测试脚本
+需要本地Redis服务 (REDIS_URL)，未启动时跳过
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.ai_service import AIGenerationResult, TaskStatus
+from backend.services.task_poller import DashScopeTaskPoller, PollerConfig
+
+
+def test_poller_batches_and_backoff(redis_client, redis_cleanup):
+    """测试批量轮询、完成回调和无进展退避"""
+    print("⏱️ 测试百炼任务轮询...")
+    client = redis_client
+    redis_cleanup(DashScopeTaskPoller.DUE_KEY, DashScopeTaskPoller.ENTRIES_KEY)
+
+    statuses = {
+        'ds-done': AIGenerationResult(success=True, image_url='https://example.com/a.png',
+                                      progress=100, status=TaskStatus.SUCCESS),
+        'ds-running': AIGenerationResult(success=True, progress=0, status=TaskStatus.RUNNING),
+        'ds-failed': AIGenerationResult(success=False, error_message='bad sketch', status=TaskStatus.FAILED)
+    }
+    finished = []
+
+    poller = DashScopeTaskPoller(
+        client,
+        fetch_status=lambda task_id: statuses[task_id],
+        on_complete=lambda entry, result: finished.append((entry.callback['task_id'], result.success)),
+        config=PollerConfig(image_interval=2.0, backoff_factor=2.0)
+    )
+
+    for task_id in statuses:
+        poller.track(task_id, 'image', {'task_id': f"creation-{task_id}"})
+
+    # 未到期时不轮询
+    assert poller.poll_due(now=time.time())['polled'] == 0
+
+    counts = poller.poll_due(now=time.time() + 5)
+    print(f"   本批结果: {counts}")
+    assert counts == {'polled': 3, 'completed': 1, 'failed': 1, 'waiting': 1}
+    assert sorted(finished) == [('creation-ds-done', True), ('creation-ds-failed', False)]
+
+    # 仍在运行的任务留在队列中，间隔按退避系数增长
+    assert poller.pending_count() == 1
+    entry = client.hget(DashScopeTaskPoller.ENTRIES_KEY, 'ds-running')
+    assert b'"interval": 4.0' in entry
+
+
+if __name__ == "__main__":
+    # Redis夹具定义在conftest.py中，经pytest运行
+    sys.exit(pytest.main([__file__, '-q', '-s']))
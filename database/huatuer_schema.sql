@@ -25,6 +25,7 @@ CREATE TABLE users (
 CREATE TABLE creation_tasks (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    batch_id UUID, -- 批量提交的批次ID，单个提交为空
     title VARCHAR(200),
     description TEXT,
     sketch_image_url TEXT, -- 原始草图URL
@@ -109,7 +110,9 @@ INSERT INTO system_configs (config_key, config_value, description) VALUES
 
 -- 创建索引
 CREATE INDEX idx_users_email ON users(email);
-CREATE INDEX idx_creation_tasks_user_id ON creation_tasks(user_id);
+-- 创作历史按 (created_at, id) 游标分页，同时覆盖按用户过滤
+CREATE INDEX idx_creation_tasks_user_created ON creation_tasks(user_id, created_at DESC, id DESC);
+CREATE INDEX idx_creation_tasks_batch_id ON creation_tasks(batch_id) WHERE batch_id IS NOT NULL;
 CREATE INDEX idx_creation_tasks_status ON creation_tasks(status);
 CREATE INDEX idx_creation_tasks_created_at ON creation_tasks(created_at DESC);
 CREATE INDEX idx_creation_steps_task_id ON creation_steps(task_id);
@@ -136,6 +139,121 @@ CREATE TRIGGER update_creation_tasks_updated_at BEFORE UPDATE ON creation_tasks
 CREATE TRIGGER update_system_configs_updated_at BEFORE UPDATE ON system_configs
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- 完成创作任务：在一个事务内写入完成状态、创作步骤并扣除画笔
+-- 已完成的任务直接返回当前记录，worker崩溃后重试不会重复记账
+CREATE OR REPLACE FUNCTION finalize_creation_task(
+    p_task_id UUID,
+    p_generated_image_url TEXT,
+    p_generated_video_url TEXT,
+    p_steps JSONB DEFAULT '[]'::JSONB,
+    p_brush_count INTEGER DEFAULT 1
+)
+RETURNS creation_tasks AS $$
+DECLARE
+    v_task creation_tasks;
+BEGIN
+    UPDATE creation_tasks
+    SET status = 'completed',
+        progress = 100,
+        generated_image_url = p_generated_image_url,
+        generated_video_url = p_generated_video_url,
+        error_message = NULL,
+        completed_at = NOW()
+    WHERE id = p_task_id AND status <> 'completed'
+    RETURNING * INTO v_task;
+
+    IF NOT FOUND THEN
+        SELECT * INTO v_task FROM creation_tasks WHERE id = p_task_id;
+        RETURN v_task;
+    END IF;
+
+    INSERT INTO creation_steps (task_id, step_type, step_name, step_data, duration_seconds)
+    SELECT p_task_id,
+           step->>'step_type',
+           step->>'step_name',
+           step->'step_data',
+           (step->>'duration_seconds')::INTEGER
+    FROM jsonb_array_elements(p_steps) AS step;
+
+    IF p_brush_count > 0 THEN
+        UPDATE users
+        SET brush_count = GREATEST(brush_count - p_brush_count, 0)
+        WHERE id = v_task.user_id;
+    END IF;
+
+    RETURN v_task;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 批量写回中间进度：只推进处理中任务的进度，不覆盖已完成或失败的任务
+CREATE OR REPLACE FUNCTION flush_creation_progress(p_updates JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    UPDATE creation_tasks AS t
+    SET progress = u.progress
+    FROM jsonb_to_recordset(p_updates) AS u(id UUID, progress INTEGER)
+    WHERE t.id = u.id
+      AND t.status = 'processing'
+      AND t.progress < u.progress;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 批量写回画笔账本的增量，返回写回后的余额（Redis镜像由账本随后统一按数据库余额校准）
+CREATE OR REPLACE FUNCTION apply_brush_deltas(p_deltas JSONB)
+RETURNS TABLE(id UUID, brush_count INTEGER) AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE users AS u
+    SET brush_count = GREATEST(u.brush_count + d.delta, 0)
+    FROM jsonb_to_recordset(p_deltas) AS d(user_id UUID, delta INTEGER)
+    WHERE u.id = d.user_id
+    RETURNING u.id, u.brush_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- 创作历史分页：按 (created_at, id) 倒序取游标之后的一页，行比较走 idx_creation_tasks_user_created 索引；
+-- 第一页不传游标。只返回列表需要的轻量列，p_include_steps 为真时附带创作步骤
+CREATE OR REPLACE FUNCTION creation_history_page(
+    p_user_id UUID,
+    p_after_created_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_include_steps BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE(
+    id UUID,
+    title VARCHAR(200),
+    thumbnail TEXT,
+    status VARCHAR(20),
+    created_at TIMESTAMP WITH TIME ZONE,
+    creation_steps JSONB
+) AS $$
+    SELECT t.id,
+           t.title,
+           t.generated_image_url,
+           t.status,
+           t.created_at,
+           CASE WHEN p_include_steps THEN COALESCE(
+               (SELECT jsonb_agg(to_jsonb(s) ORDER BY s.completed_at)
+                FROM creation_steps AS s
+                WHERE s.task_id = t.id),
+               '[]'::JSONB
+           ) END
+    FROM creation_tasks AS t
+    WHERE t.user_id = p_user_id
+      AND (t.created_at, t.id) < (
+          COALESCE(p_after_created_at, 'infinity'::TIMESTAMP WITH TIME ZONE),
+          COALESCE(p_after_id, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::UUID)
+      )
+    ORDER BY t.created_at DESC, t.id DESC
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
 -- RLS (Row Level Security) 安全策略
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE creation_tasks ENABLE ROW LEVEL SECURITY;